@@ -0,0 +1,143 @@
+'''Connection-pooled http session with keep-alive, gzip and retries, shared by the api clients.'''
+
+import email.utils
+import datetime
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Response status codes worth retrying.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ApiSession():
+    '''
+    Pooled requests session used for all api calls of a client.
+
+    :Explained:
+        -Pooled: Keeps up to pool_maxsize keep-alive connections per host, reused between calls.
+        -Retries: Retries connection errors and RETRY_STATUS_CODES with exponential backoff and jitter,
+         waiting as told by the Retry-After header when the response has one.
+        -Stats: Counts requests, retries and new vs reused connections for this session.
+    '''
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, max_retries=5, backoff_factor=0.5, backoff_max=60, max_retry_after=300, retry_status_codes=RETRY_STATUS_CODES, timeout=120, headers=None):
+
+        # Retry and timeout settings.
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.retry_status_codes = tuple(retry_status_codes)
+        self.timeout = timeout
+
+        # Create session with pooled adapters, retries are handled in .get().
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        # Always ask for compressed keep-alive responses.
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+        if headers is not None:
+            self.session.headers.update(headers)
+
+        # Counters, updated from multiple threads.
+        self._lock = threading.Lock()
+        self._counts = {'requests': 0, 'retries': 0, 'errors': 0}
+
+    def get(self, url, headers=None, **kwargs):
+        '''Makes get request, retrying transient errors, returns response.'''
+
+        # Use session timeout unless spesified.
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+
+            # Make request, retry connection errors.
+            try:
+                response = self.session.get(url, headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._count('errors')
+                if attempt >= self.max_retries:
+                    raise
+                wait = self._backoff_seconds(attempt)
+
+            # Return response unless it is retryable.
+            else:
+                self._count('requests')
+                if response.status_code not in self.retry_status_codes or attempt >= self.max_retries:
+                    return response
+
+                # Wait as told by server, if not waiting longer than max_retry_after.
+                wait = self._retry_after_seconds(response)
+                if wait is None:
+                    wait = self._backoff_seconds(attempt)
+                elif wait > self.max_retry_after:
+                    return response
+
+            # Wait before next attempt.
+            attempt += 1
+            self._count('retries')
+            time.sleep(wait)
+
+    def _count(self, key, n=1):
+        '''Increment counter.'''
+        with self._lock:
+            self._counts[key] += n
+
+    def _backoff_seconds(self, attempt):
+        '''Exponential backoff with jitter, half fixed and half random.'''
+        backoff = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    def _retry_after_seconds(self, response):
+        '''Returns seconds from response Retry-After header, as seconds or http-date, None if missing.'''
+
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is None:
+            return None
+
+        # Retry-After as seconds.
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            None
+
+        # Retry-After as http-date.
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    def get_stats(self):
+        '''Returns dict of request, retry and new vs reused connection counts.'''
+
+        # Sum connection counts over this session's connection pools.
+        new_connections = 0
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            pool_requests += pool.num_requests
+
+        with self._lock:
+            stats = dict(self._counts)
+        stats['new_connections'] = new_connections
+        stats['reused_connections'] = max(0, pool_requests - new_connections)
+
+        return stats
+
+    def close(self):
+        '''Closes all pooled connections.'''
+        self.session.close()
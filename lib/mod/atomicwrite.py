@@ -0,0 +1,40 @@
+'''Atomic file writes, readers never see a half written file.'''
+
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_path(filepath, prefix=None):
+    '''
+    Yields temporary path in directory of filepath, replacing filepath with it when block completes.
+    Temporary file is removed if block raises. Directory of filepath is created if missing.
+    '''
+
+    # Temporary file in same directory, so replace is atomic.
+    dirpath = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(dirpath, exist_ok=True)
+    if prefix is None:
+        prefix = f'.{os.path.basename(filepath)}-'
+    fd, tmppath = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=dirpath)
+    os.close(fd)
+
+    # Write, then replace.
+    try:
+        yield tmppath
+        os.replace(tmppath, filepath)
+    except BaseException:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+
+
+@contextlib.contextmanager
+def atomic_open(filepath, mode='w', encoding=None, prefix=None):
+    '''Yields file opened in mode for writing, replacing filepath when block completes, see atomic_path().'''
+    if encoding is None and 'b' not in mode:
+        encoding = 'utf-8'
+    with atomic_path(filepath, prefix=prefix) as tmppath:
+        with open(tmppath, mode, encoding=encoding) as f:
+            yield f
@@ -0,0 +1,103 @@
+'''Memoized close-matcher of strings against fixed candidates, with a trigram index shortlisting candidates.'''
+
+import difflib
+import functools
+import heapq
+
+
+class CloseMatcher():
+    '''
+    Finds close matches of queries in a fixed list of candidates, as difflib.get_close_matches.
+
+    :Explained:
+        -Normalized once: Candidates are normalized (default lowered) when created, queries when matched.
+        -Shortlisted: Candidates sharing trigrams with query are scored first, other candidates are only
+         fully scored if their quick ratio bounds reach the n-th best shortlisted ratio. Results equal difflib.
+        -Memoized: Results are cached by (query, n, cutoff) in a LRU cache of cache_size.
+
+    Matches are returned as normalized candidates, .original(match) returns the original candidate.
+    '''
+
+    def __init__(self, candidates, normalize=str.lower, cache_size=1024):
+
+        # Original and normalized candidates, in order.
+        self.normalize = normalize
+        self.candidates = list(candidates)
+        self.normalized = [normalize(str(c)) for c in self.candidates]
+
+        # Index of first original candidate of each normalized candidate.
+        self._original_idx = {}
+        for idx, n in enumerate(self.normalized):
+            self._original_idx.setdefault(n, idx)
+
+        # Trigram inverted index of normalized candidates.
+        self._index = {}
+        for idx, n in enumerate(self.normalized):
+            for gram in _trigrams(n):
+                self._index.setdefault(gram, set()).add(idx)
+
+        # Cached matching.
+        self._cached_matches = functools.lru_cache(maxsize=cache_size)(self._get_close_matches)
+
+    def get_close_matches(self, query, n=1, cutoff=0.6):
+        '''Returns list of up to n normalized candidates with similarity ratio of at least cutoff to query, best first.'''
+        return list(self._cached_matches(query, n, cutoff))
+
+    def original(self, match):
+        '''Returns original candidate of normalized match.'''
+        return self.candidates[self._original_idx[match]]
+
+    def index(self, match):
+        '''Returns index of normalized match in candidates.'''
+        return self._original_idx[match]
+
+    def cache_info(self):
+        '''Returns LRU cache hits, misses and size.'''
+        return self._cached_matches.cache_info()
+
+    def _get_close_matches(self, query, n, cutoff):
+        '''Returns tuple of close matches, scoring shortlist and all candidates if needed.'''
+
+        # Check inputs as difflib.
+        if not n > 0:
+            raise ValueError("n must be > 0: %r" % (n,))
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError("cutoff must be in [0.0, 1.0]: %r" % (cutoff,))
+
+        query = self.normalize(str(query))
+
+        # Shortlist candidates sharing trigrams with query.
+        shortlist = set()
+        for gram in _trigrams(query):
+            shortlist.update(self._index.get(gram, ()))
+
+        # Score shortlist.
+        result = self._score(query, sorted(shortlist), cutoff)
+
+        # Score other candidates, with cutoff raised to n-th best shortlisted ratio.
+        if len(shortlist) < len(self.normalized):
+            best = heapq.nlargest(n, result)
+            rest_cutoff = max(cutoff, best[-1][0]) if len(best) >= n else cutoff
+            rest = [idx for idx in range(len(self.normalized)) if idx not in shortlist]
+            result.extend(self._score(query, rest, rest_cutoff))
+
+        # Best n matches, as difflib.
+        return tuple(x for score, x in heapq.nlargest(n, result))
+
+    def _score(self, query, idxs, cutoff):
+        '''Returns list of (ratio, candidate) of candidates with ratio at least cutoff.'''
+        result = []
+        s = difflib.SequenceMatcher()
+        s.set_seq2(query)
+        for idx in idxs:
+            x = self.normalized[idx]
+            s.set_seq1(x)
+            if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff and s.ratio() >= cutoff:
+                result.append((s.ratio(), x))
+        return result
+
+
+def _trigrams(s):
+    '''Returns set of trigrams of string padded with spaces.'''
+    s = f'  {s} '
+    return {s[i:i + 3] for i in range(len(s) - 2)}
@@ -0,0 +1,156 @@
+'''Typed parquet export of DataFrames by schema, partitioned by dataset, area and month, and memory-mapped readers.'''
+
+import os
+import uuid
+from urllib.parse import quote
+import pandas as pd
+from lib.mod.atomicwrite import atomic_path
+
+
+# Partition columns of exported files, in directory order.
+PARTITION_COLUMNS = ('dataset', 'area', 'month')
+
+
+def dictionary_type(index_bits=8):
+    '''Returns arrow dictionary type of strings with int8, int16 or int32 codes.'''
+    import pyarrow as pa
+    return pa.dictionary({8: pa.int8(), 16: pa.int16(), 32: pa.int32()}[index_bits], pa.string())
+
+
+def _dictionary_index_type(index_type, n_uniques):
+    '''Returns index_type, widened to int16 or int32 if n_uniques codes do not fit it.'''
+    import pyarrow as pa
+    for bits, wider_type in ((8, pa.int8()), (16, pa.int16()), (32, pa.int32())):
+        if bits >= index_type.bit_width and n_uniques <= 2 ** (bits - 1):
+            return wider_type if bits > index_type.bit_width else index_type
+    return pa.int64()
+
+
+def to_typed_table(df, schema):
+    '''
+    Returns arrow table of df columns cast to schema, columns missing in df as nulls, other columns dropped.
+
+    :Explained:
+        -Floats: Values are parsed as numbers, and cast to schema float type, as float32.
+        -Dictionaries: Strings are dictionary encoded with schema index type, as int8 codes.
+         Index type is widened to int16 or int32 if there are more unique strings than codes, as field type of returned table.
+        -Timestamps: Times are parsed as UTC, naive times are taken as UTC.
+    '''
+    import pyarrow as pa
+
+    arrays = []
+    fields = []
+    for field in schema:
+
+        # Missing column as nulls.
+        if field.name not in df.columns:
+            arrays.append(pa.nulls(len(df), type=field.type))
+            fields.append(field)
+            continue
+        values = df[field.name]
+
+        # Dictionary encoded strings.
+        if pa.types.is_dictionary(field.type):
+            codes, uniques = pd.factorize(values.astype(object).where(values.notna(), None), use_na_sentinel=True)
+            dictionary = pa.array([str(u) for u in uniques], type=pa.string())
+            indices = pa.array(codes, mask=codes < 0, type=_dictionary_index_type(field.type.index_type, len(uniques)))
+            arrays.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+
+        # Timestamps as UTC.
+        elif pa.types.is_timestamp(field.type):
+            arrays.append(pa.array(pd.to_datetime(values, utc=True), type=field.type))
+
+        # Numbers.
+        elif pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            numbers = pd.to_numeric(values, errors='coerce')
+            if pa.types.is_integer(field.type):
+                arrays.append(pa.array(numbers.astype('Int64'), type=field.type, from_pandas=True))
+            else:
+                arrays.append(pa.array(numbers.astype('float64'), from_pandas=True).cast(field.type))
+
+        # Other types.
+        else:
+            arrays.append(pa.array(values.astype(object).where(values.notna(), None), type=field.type, from_pandas=True))
+
+        # Field of array, dictionary index type may be widened.
+        fields.append(field.with_type(arrays[-1].type))
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=schema.metadata))
+
+
+def write_partitioned(df, rootpath, schema, compression='zstd'):
+    '''
+    Writes df as typed parquet files in rootpath/dataset=../area=../month=YYYY-MM/part-...parquet.
+
+    :Inputs:
+        -df: Data with 'dataset', 'area' and 'timestamp' columns, other columns cast to schema.
+        -schema: Arrow schema of file columns, without partition columns.
+
+    :Outputs:
+        -paths: List of written files.
+    '''
+    import pyarrow.parquet as pq
+
+    if df is None or len(df) == 0:
+        return []
+
+    # Partition values, month of UTC timestamps.
+    df = df.reset_index(drop=True)
+    months = pd.to_datetime(df['timestamp'], utc=True).dt.strftime('%Y-%m').fillna('none')
+    datasets = df['dataset'].astype(str) if 'dataset' in df.columns else pd.Series('none', index=df.index)
+    areas = df['area'].astype(object).where(df['area'].notna(), 'none').astype(str) if 'area' in df.columns else pd.Series('none', index=df.index)
+
+    # Write one file per partition, atomically.
+    paths = []
+    for (dataset, area, month), idx in df.groupby([datasets.values, areas.values, months.values], sort=True).indices.items():
+        dirpath = os.path.join(rootpath, f'dataset={quote(dataset, safe="")}', f'area={quote(area, safe="")}', f'month={month}')
+        path = os.path.join(dirpath, f'part-{uuid.uuid4().hex}.parquet')
+        with atomic_path(path) as tmppath:
+            pq.write_table(to_typed_table(df.iloc[idx], schema), tmppath, compression=compression)
+        paths.append(path)
+
+    return paths
+
+
+def read_partitioned(rootpath, dataset=None, area=None, start=None, end=None, columns=None, memory_map=True):
+    '''
+    Reads exported parquet files, memory-mapped, filtered by partitions and timestamps.
+
+    :Inputs:
+        -dataset, area: Partition value or list of values, None for all.
+        -start, end: Timestamps in [start, end), naive times taken as UTC.
+        -columns: Columns to read, None for all.
+
+    :Outputs:
+        -df: Data with dictionary encoded and partition columns as categoricals.
+    '''
+    import pyarrow.dataset as ds
+    import pyarrow.fs as fs
+
+    # Dataset of hive partitioned files, memory-mapped.
+    filesystem = fs.LocalFileSystem(use_mmap=memory_map)
+    data = ds.dataset(rootpath, format='parquet', partitioning='hive', filesystem=filesystem, exclude_invalid_files=True)
+
+    # Filter partitions and timestamps.
+    expression = None
+    for name, value in [('dataset', dataset), ('area', area)]:
+        if value is None:
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        e = ds.field(name).isin([str(v) for v in values])
+        expression = e if expression is None else expression & e
+    for op, t in [('ge', start), ('lt', end)]:
+        if t is None:
+            continue
+        t = pd.Timestamp(t)
+        t = t.tz_localize('UTC') if t.tzinfo is None else t.tz_convert('UTC')
+        e = ds.field('timestamp') >= t if op == 'ge' else ds.field('timestamp') < t
+        expression = e if expression is None else expression & e
+
+    # Read, partition columns as categoricals.
+    df = data.to_table(columns=columns, filter=expression).to_pandas()
+    for column in PARTITION_COLUMNS:
+        if column in df.columns and df[column].dtype == object:
+            df[column] = df[column].astype('category')
+
+    return df
@@ -0,0 +1,214 @@
+'''Blocking token-bucket rate limiter, shared across threads and optionally across processes on one host.'''
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Import os spesific file locking.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class TokenBucket():
+    '''
+    Token bucket pacing api calls, refilled with rate tokens per second up to capacity.
+
+    :Explained:
+        -Blocking: .acquire() waits until a token is available instead of raising.
+        -Smoothing: Bursts are limited to capacity calls, then calls are paced at rate.
+        -Shared: If statepath, bucket state is kept in a locked file, shared by all processes using the same path.
+        -Metrics: .get_budget(), .get_wait_time() and .get_stats() shows current budget and waiting.
+
+    Max calls in any period of t seconds is capacity + rate * t.
+    '''
+
+    def __init__(self, rate, capacity, statepath=None):
+
+        # Refill rate in tokens per second and max tokens in bucket.
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+        # File for sharing bucket state between processes, None for in-process bucket.
+        self.statepath = statepath
+        self.lockpath = None if statepath is None else f'{statepath}.lock'
+
+        # In-process state, used when not sharing state between processes.
+        self._tokens = self.capacity
+        self._updated = time.time()
+
+        # Lock for threads in this process.
+        self._lock = threading.Lock()
+
+        # Counters for metrics.
+        self._acquired = 0
+        self._waits = 0
+        self._waited_seconds = 0.0
+
+    @classmethod
+    def shared(cls, name, rate, capacity, dirpath=None):
+        '''Creates bucket with state shared by all processes on this host using same name.'''
+        if dirpath is None:
+            dirpath = tempfile.gettempdir()
+        return cls(rate=rate, capacity=capacity, statepath=os.path.join(dirpath, f'nordic-t-ratelimit-{name}.json'))
+
+    def acquire(self, n=1, block=True, timeout=None):
+        '''Takes n tokens, waiting until available if block. Returns True if taken, False if not taken in time.'''
+
+        # Store start time of waiting.
+        start = time.time()
+        waited = False
+
+        while True:
+
+            # Take tokens if available, else get time until available.
+            with self._locked_state() as state:
+                self._refill(state)
+                if state['tokens'] >= n:
+                    state['tokens'] -= n
+                    wait = 0.0
+                else:
+                    wait = (n - state['tokens']) / self.rate
+
+            # If tokens was taken, update counters and return.
+            if wait <= 0:
+                with self._lock:
+                    self._acquired += n
+                    if waited:
+                        self._waits += 1
+                        self._waited_seconds += time.time() - start
+                return True
+
+            # If not blocking or waiting past timeout, return without tokens.
+            if not block:
+                return False
+            if timeout is not None:
+                remaining = timeout - (time.time() - start)
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+
+            # Wait for refill, other threads or processes may take the tokens first.
+            waited = True
+            time.sleep(wait)
+
+    def get_budget(self):
+        '''Returns number of tokens currently available.'''
+        with self._locked_state() as state:
+            self._refill(state)
+            return state['tokens']
+
+    def get_wait_time(self, n=1):
+        '''Returns seconds until n tokens are available.'''
+        tokens = self.get_budget()
+        return max(0.0, (n - tokens) / self.rate)
+
+    def get_stats(self):
+        '''Returns dict of current budget, wait time and acquired and waiting counts in this process.'''
+        budget = self.get_budget()
+        with self._lock:
+            return {
+                'budget': budget,
+                'wait_time': max(0.0, (1 - budget) / self.rate),
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'waited_seconds': self._waited_seconds,
+            }
+
+    def _refill(self, state):
+        '''Adds tokens for time passed since last update.'''
+        now = time.time()
+        elapsed = max(0.0, now - state['updated'])
+        state['tokens'] = min(self.capacity, state['tokens'] + elapsed * self.rate)
+        state['updated'] = now
+
+    def _locked_state(self):
+        '''Context manager giving bucket state dict, locked for threads and, if shared, processes.'''
+        return _LockedState(self)
+
+
+class _LockedState():
+    '''Context manager reading and writing bucket state under lock.'''
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.lockfile = None
+        self.state = None
+
+    def __enter__(self):
+        bucket = self.bucket
+        bucket._lock.acquire()
+
+        # In-process state.
+        if bucket.statepath is None:
+            self.state = {'tokens': bucket._tokens, 'updated': bucket._updated}
+            return self.state
+
+        # Lock state file for other processes.
+        try:
+            self.lockfile = open(bucket.lockpath, 'a+')
+            _lock_file(self.lockfile)
+        except BaseException:
+            if self.lockfile is not None:
+                self.lockfile.close()
+            bucket._lock.release()
+            raise
+
+        # Read shared state, new or unreadable state starts as full bucket.
+        try:
+            with open(bucket.statepath, 'r') as f:
+                state = json.load(f)
+            self.state = {'tokens': float(state['tokens']), 'updated': float(state['updated'])}
+        except (OSError, ValueError, KeyError, TypeError):
+            self.state = {'tokens': bucket.capacity, 'updated': time.time()}
+
+        return self.state
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        bucket = self.bucket
+        try:
+            # Store in-process state.
+            if bucket.statepath is None:
+                bucket._tokens = self.state['tokens']
+                bucket._updated = self.state['updated']
+
+            # Write shared state and unlock file.
+            else:
+                try:
+                    with open(bucket.statepath, 'w') as f:
+                        json.dump(self.state, f)
+                finally:
+                    _unlock_file(self.lockfile)
+                    self.lockfile.close()
+        finally:
+            bucket._lock.release()
+        return False
+
+
+def _lock_file(f):
+    '''Blocking exclusive lock on open file.'''
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+
+def _unlock_file(f):
+    '''Unlocks file locked by _lock_file.'''
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
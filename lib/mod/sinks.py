@@ -0,0 +1,213 @@
+'''Sink writers appending DataFrames to csv or parquet files, for writing results in bounded memory.'''
+
+import os
+import tempfile
+import pandas as pd
+
+
+class CsvSink():
+    '''
+    Appends DataFrames to csv file, header written with first DataFrame.
+
+    :Explained:
+        -Columns: Columns of first DataFrame are the file columns, later DataFrames are aligned to them.
+         Columns not in first DataFrame are dropped, with a warning.
+        -Index: If index, DataFrame index is written as first columns, as timestamps of long format data.
+    '''
+
+    def __init__(self, filepath, index=True, **to_csv_kwargs):
+
+        # File and csv options.
+        self.filepath = filepath
+        self.index = index
+        self.to_csv_kwargs = to_csv_kwargs
+
+        # Columns of file, set by first DataFrame, and dropped columns not in file.
+        self.columns = None
+        self.dropped = set()
+        self.rows = 0
+        self.closed = False
+
+        # Ensure directory exists.
+        dirpath = os.path.dirname(os.path.abspath(filepath))
+        os.makedirs(dirpath, exist_ok=True)
+
+    def write(self, df):
+        '''Appends df to file.'''
+        if df is None or len(df) == 0:
+            return
+
+        # Align columns to file columns.
+        if self.columns is None:
+            self.columns = list(df.columns)
+            mode, header = 'w', True
+        else:
+            _warn_dropped_columns(self, df.columns, self.columns)
+            df = df.reindex(columns=self.columns)
+            mode, header = 'a', False
+
+        df.to_csv(self.filepath, mode=mode, header=header, index=self.index, **self.to_csv_kwargs)
+        self.rows += len(df)
+
+    def close(self):
+        '''Closes sink.'''
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetSink():
+    '''
+    Appends DataFrames as row groups to parquet file, schema set by first DataFrame or by schema.
+
+    :Explained:
+        -Schema: Later DataFrames are aligned and cast to schema, missing columns as nulls.
+         Columns not in schema are dropped, with a warning.
+        -Promotion: If a later DataFrame column does not fit the schema, as floats in integer column or values in all null column,
+         the column type is promoted (null to type, integer to float, else to string) and written row groups are rewritten once.
+         Casts are safe, values are never silently truncated.
+        -Categoricals: Categorical columns are written as dictionary encoded strings, categories may differ between DataFrames.
+        -Index: If index, DataFrame index is written as columns, as timestamps of long format data.
+    '''
+
+    def __init__(self, filepath, index=True, compression='snappy', schema=None):
+
+        # Import pyarrow when used, optional dependency.
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._pq = pq
+
+        # File and parquet options.
+        self.filepath = filepath
+        self.index = index
+        self.compression = compression
+
+        # Writer and schema, created by first DataFrame if schema not spesified, and dropped columns not in schema.
+        self.schema = schema
+        self.dropped = set()
+        self._writer = None
+        self._writepath = filepath
+        self.rows = 0
+        self.closed = False
+
+        # Ensure directory exists.
+        dirpath = os.path.dirname(os.path.abspath(filepath))
+        os.makedirs(dirpath, exist_ok=True)
+
+    def write(self, df):
+        '''Appends df to file as row group.'''
+        if df is None or len(df) == 0:
+            return
+
+        # Index as columns.
+        if self.index:
+            df = df.reset_index()
+
+        # Categoricals as strings, cells of lists as strings.
+        df = df.copy()
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object).where(df[column].notna(), None)
+            if df[column].dtype == object:
+                df[column] = [None if x is None or (isinstance(x, float) and x != x) else (x if isinstance(x, (str, bytes)) else str(x)) for x in df[column]]
+
+        # Schema of first DataFrame, if not spesified.
+        if self.schema is None:
+            self.schema = self._pa.Table.from_pandas(df, preserve_index=False).schema.remove_metadata()
+
+        # Align DataFrame to schema, with types of its values.
+        _warn_dropped_columns(self, df.columns, self.schema.names)
+        df = df.reindex(columns=self.schema.names)
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+
+        # Promote schema if values do not fit it, all null columns fit any type.
+        value_types = [self._pa.null() if column.null_count == len(column) else column.type for column in table.columns]
+        schema = self._pa.schema([field.with_type(_promote_type(self._pa, field.type, value_type)) for field, value_type in zip(self.schema, value_types)])
+        if not schema.equals(self.schema):
+            self._promote_schema(schema)
+
+        # Create writer, strings dictionary encoded.
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._writepath, self.schema, compression=self.compression, use_dictionary=True)
+
+        # Cast columns to schema, all null columns as nulls of schema type.
+        columns = [self._pa.nulls(len(table), type=field.type) if value_type == self._pa.null() else column.cast(field.type, safe=True) for field, column, value_type in zip(self.schema, table.columns, value_types)]
+        self._writer.write_table(self._pa.Table.from_arrays(columns, schema=self.schema))
+        self.rows += len(df)
+
+    def close(self):
+        '''Closes file, file is readable when closed.'''
+        if self._writer is not None and not self.closed:
+            self._writer.close()
+            if self._writepath != self.filepath:
+                os.replace(self._writepath, self.filepath)
+        self.closed = True
+
+    def _promote_schema(self, schema):
+        '''Sets promoted schema, rewriting written row groups cast to it in new file, replacing file when closed.'''
+        if self._writer is None:
+            self.schema = schema
+            return
+        self._writer.close()
+
+        # New file in same directory, replace is atomic when closed.
+        fd, writepath = tempfile.mkstemp(prefix=f'.{os.path.basename(self.filepath)}-', suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.filepath)))
+        os.close(fd)
+
+        # Rewrite row groups one at a time, in bounded memory.
+        promoted = {field.name: str(field.type) for field, file_field in zip(schema, self.schema) if not field.type.equals(file_field.type)}
+        print(f'WARNING: Column types of {self.filepath} are promoted to {promoted}, written rows are rewritten.')
+        self._writer = self._pq.ParquetWriter(writepath, schema, compression=self.compression, use_dictionary=True)
+        with open(self._writepath, 'rb') as f:
+            parquetfile = self._pq.ParquetFile(f)
+            for i in range(parquetfile.num_row_groups):
+                self._writer.write_table(parquetfile.read_row_group(i).cast(schema, safe=True))
+
+        self.schema = schema
+
+        # Remove previous file, unless it is the file replaced when closed.
+        if self._writepath != self.filepath:
+            os.remove(self._writepath)
+        self._writepath = writepath
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _warn_dropped_columns(sink, columns, file_columns):
+    '''Prints warning of columns not in file columns, once per column of sink.'''
+    file_columns = set(file_columns)
+    dropped = [column for column in columns if column not in file_columns and column not in sink.dropped]
+    if len(dropped) > 0:
+        print(f'WARNING: Columns {dropped} are not in columns of {sink.filepath}, set by first DataFrame, and are dropped.')
+        sink.dropped.update(dropped)
+
+
+def _promote_type(pa, file_type, value_type):
+    '''Returns type of file column fitting values of file_type and value_type.'''
+    if file_type.equals(value_type) or pa.types.is_null(value_type):
+        return file_type
+    if pa.types.is_null(file_type):
+        return value_type
+    if pa.types.is_integer(file_type) and pa.types.is_integer(value_type):
+        return pa.int64()
+    if (pa.types.is_integer(file_type) or pa.types.is_floating(file_type)) and (pa.types.is_integer(value_type) or pa.types.is_floating(value_type)):
+        return pa.float64()
+    return pa.string()
+
+
+def open_sink(sink, **kwargs):
+    '''Returns sink of sink or filepath, parquet sink for .parquet and .pq files, else csv sink.'''
+    if not isinstance(sink, str):
+        return sink
+    if os.path.splitext(sink)[-1].lower() in ('.parquet', '.pq'):
+        return ParquetSink(sink, **kwargs)
+    return CsvSink(sink, **kwargs)
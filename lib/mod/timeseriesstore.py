@@ -0,0 +1,243 @@
+'''Local time-series store of parquet files partitioned by key and month, with a coverage index for gap detection.'''
+
+import contextlib
+import glob
+import json
+import os
+import shutil
+import threading
+import uuid
+import pandas as pd
+from lib.mod.atomicwrite import atomic_path, atomic_open
+
+# Import os spesific file locking.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Timeformat of intervals in coverage index.
+COVERAGE_TIMEFORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def to_utc_timestamp(t):
+    '''Returns time as tz-aware UTC pandas Timestamp, naive times are taken as UTC.'''
+    t = pd.Timestamp(t)
+    if t.tzinfo is None:
+        return t.tz_localize('UTC')
+    return t.tz_convert('UTC')
+
+
+def merge_intervals(intervals):
+    '''Returns sorted list of (start, end) intervals with overlapping and adjacent intervals merged.'''
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def find_gaps(start, end, intervals):
+    '''Returns list of (start, end) parts of [start, end) not covered by intervals.'''
+    gaps = []
+    cursor = start
+    for i_start, i_end in merge_intervals(intervals):
+        if i_end <= cursor:
+            continue
+        if i_start >= end:
+            break
+        if i_start > cursor:
+            gaps.append((cursor, i_start))
+        cursor = max(cursor, i_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class TimeSeriesStore():
+    '''
+    Store of time-series DataFrames by key, as parquet files in {dirpath}/key={key}/month={YYYY-MM}/.
+
+    :Explained:
+        -Coverage: Stored intervals are recorded per key in coverage.json, also if the interval had no data.
+        -Gaps: .find_gaps(key, start, end) returns the intervals not yet stored.
+        -Atomic: Parts are written to temporary files and renamed, coverage is updated after data is written.
+        -Reading: .read(key, start, end) reads only overlapping months, dropping duplicates of time_column.
+
+    Times are tz-aware UTC, naive times are taken as UTC.
+    '''
+
+    def __init__(self, dirpath, time_column='start_time'):
+
+        # Store directory and coverage index file.
+        self.dirpath = dirpath
+        self.time_column = time_column
+        self.coverage_path = os.path.join(dirpath, 'coverage.json')
+        os.makedirs(dirpath, exist_ok=True)
+
+        # Lock for threads in this process, coverage file is also locked for other processes.
+        self._lock = threading.RLock()
+
+    ################################################################
+    ############## Coverage.
+    ################################################################
+
+    def get_coverage(self, key):
+        '''Returns list of stored (start, end) intervals of key.'''
+        with self._lock:
+            coverage = self._read_coverage()
+        return [(pd.Timestamp(s, tz='UTC'), pd.Timestamp(e, tz='UTC')) for s, e in coverage.get(str(key), [])]
+
+    def find_gaps(self, key, start, end):
+        '''Returns list of (start, end) intervals within [start, end) not stored for key.'''
+        return find_gaps(to_utc_timestamp(start), to_utc_timestamp(end), self.get_coverage(key))
+
+    def add_coverage(self, key, start, end):
+        '''Records [start, end) as stored for key.'''
+        with self._locked_coverage() as coverage:
+            intervals = [(pd.Timestamp(s, tz='UTC'), pd.Timestamp(e, tz='UTC')) for s, e in coverage.get(str(key), [])]
+            intervals.append((to_utc_timestamp(start), to_utc_timestamp(end)))
+            coverage[str(key)] = [[s.strftime(COVERAGE_TIMEFORMAT), e.strftime(COVERAGE_TIMEFORMAT)] for s, e in merge_intervals(intervals)]
+
+    def keys(self):
+        '''Returns list of keys with coverage.'''
+        with self._lock:
+            return list(self._read_coverage().keys())
+
+    ################################################################
+    ############## Data.
+    ################################################################
+
+    def append(self, key, df, start, end):
+        '''
+        Appends df of key, covering [start, end), partitioned by month of time_column.
+
+        :Inputs:
+            -key: Series key, as variable id.
+            -df: Rows of interval, may be empty if interval has no data.
+            -start, end: Interval covered by df, recorded in coverage.
+        '''
+
+        # Write data parts.
+        self.write(key, df)
+
+        # Record covered interval after data is written.
+        self.add_coverage(key, start, end)
+
+    def write(self, key, df):
+        '''Writes rows of key, one part per month of time_column, without recording coverage.'''
+        if df is None or len(df) == 0:
+            return
+        df = df.copy()
+        df[self.time_column] = pd.to_datetime(df[self.time_column], utc=True)
+        months = df[self.time_column].dt.strftime('%Y-%m')
+        for month, part in df.groupby(months.values, sort=True):
+            self._write_part(key, month, part.reset_index(drop=True))
+
+    def read(self, key, start=None, end=None, subset=None):
+        '''
+        Returns stored rows of key with time_column in [start, end), sorted and without duplicates.
+
+        :Inputs:
+            -subset: Columns identifying rows when dropping duplicates, keeping last written.
+             Default [time_column], False to keep duplicates.
+        '''
+
+        # Find month partitions overlapping interval.
+        paths = []
+        start = None if start is None else to_utc_timestamp(start)
+        end = None if end is None else to_utc_timestamp(end)
+        for monthpath in sorted(glob.glob(os.path.join(self._key_dirpath(key), 'month=*'))):
+            month = pd.Timestamp(os.path.basename(monthpath).split('=', 1)[-1] + '-01', tz='UTC')
+            if start is not None and month + pd.DateOffset(months=1) <= start:
+                continue
+            if end is not None and month >= end:
+                continue
+            paths.extend(sorted(glob.glob(os.path.join(monthpath, '*.parquet'))))
+
+        # If nothing stored, return empty df.
+        if len(paths) == 0:
+            return pd.DataFrame()
+
+        # Read parts, filter interval and drop duplicates, keeping last written.
+        df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= df[self.time_column] >= start
+        if end is not None:
+            mask &= df[self.time_column] < end
+        df = df[mask]
+        if subset is not False:
+            df = df.drop_duplicates(subset=[self.time_column] if subset is None else subset, keep='last')
+
+        return df.sort_values(self.time_column, kind='stable').reset_index(drop=True)
+
+    def compact(self, key):
+        '''Rewrites each month of key into one part without duplicates.'''
+        with self._lock:
+            for monthpath in sorted(glob.glob(os.path.join(self._key_dirpath(key), 'month=*'))):
+                paths = sorted(glob.glob(os.path.join(monthpath, '*.parquet')))
+                if len(paths) < 2:
+                    continue
+                df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+                df = df.drop_duplicates(subset=[self.time_column], keep='last').sort_values(self.time_column, kind='stable')
+                self._write_part(key, os.path.basename(monthpath).split('=', 1)[-1], df.reset_index(drop=True))
+                for path in paths:
+                    os.remove(path)
+
+    def delete(self, key):
+        '''Removes stored data and coverage of key.'''
+        with self._locked_coverage() as coverage:
+            coverage.pop(str(key), None)
+            shutil.rmtree(self._key_dirpath(key), ignore_errors=True)
+
+    ################################################################
+    ############## Backend functions.
+    ################################################################
+
+    def _key_dirpath(self, key):
+        '''Returns directory of key partitions.'''
+        return os.path.join(self.dirpath, f'key={key}')
+
+    def _write_part(self, key, month, df):
+        '''Writes df as new part file of key and month, atomically.'''
+        dirpath = os.path.join(self._key_dirpath(key), f'month={month}')
+        name = f'part-{pd.Timestamp.utcnow().strftime("%Y%m%d%H%M%S%f")}-{uuid.uuid4().hex[:8]}.parquet'
+        with atomic_path(os.path.join(dirpath, name), prefix='.part-') as tmppath:
+            df.to_parquet(tmppath, index=False)
+
+    def _read_coverage(self):
+        '''Reads coverage index, empty if missing or unreadable.'''
+        try:
+            with open(self.coverage_path, 'r', encoding='utf-8') as f:
+                coverage = json.load(f)
+            return coverage if isinstance(coverage, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_coverage(self, coverage):
+        '''Writes coverage index atomically.'''
+        with atomic_open(self.coverage_path, 'w', prefix='.coverage-') as f:
+            json.dump(coverage, f, indent=1, sort_keys=True)
+
+    @contextlib.contextmanager
+    def _locked_coverage(self):
+        '''Context manager giving coverage dict, written on exit, locked for threads and processes.'''
+        with self._lock:
+            with open(f'{self.coverage_path}.lock', 'a+') as lockfile:
+                if fcntl is not None:
+                    fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+                try:
+                    coverage = self._read_coverage()
+                    yield coverage
+                    self._write_coverage(coverage)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
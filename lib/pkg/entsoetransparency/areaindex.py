@@ -0,0 +1,119 @@
+'''Offline index of entso-e areas geometries, loaded from the bundled areas dataset.'''
+
+import pathlib
+import threading
+import numpy as np
+import pandas as pd
+
+
+# Path to bundled areas dataset, created by src/create_areas_dataset.py.
+AREAS_FILEPATH = pathlib.Path(__file__).parent.joinpath('data', 'processed', 'areas.feather')
+
+# Max distance in degrees between area borders counted as touching, hand drawn borders may have gaps.
+ADJACENCY_DISTANCE = 0.05
+
+# Max share of smaller area overlapping other area, larger overlaps are nested areas, as bidding zone in country.
+ADJACENCY_MAX_OVERLAP = 0.1
+
+
+class AreaIndex():
+    '''
+    Entso-e areas polygons, codes and representative points with a spatial index.
+    Dataset, index and the geometry libraries are loaded on first use.
+    '''
+
+    def __init__(self, filepath=AREAS_FILEPATH):
+        self.filepath = filepath
+        self._gdf = None
+        self._tree = None
+        self._lock = threading.RLock()
+
+    @property
+    def gdf(self):
+        '''Areas as GeoDataFrame with columns Meaning, Code, geometry and coords.'''
+        if self._gdf is None:
+            with self._lock:
+                if self._gdf is None:
+                    self._gdf = self._read_areas()
+        return self._gdf
+
+    @property
+    def tree(self):
+        '''STRtree spatial index on areas geometries, ordered as gdf rows.'''
+        if self._tree is None:
+            with self._lock:
+                if self._tree is None:
+                    from shapely.strtree import STRtree
+                    self._tree = STRtree(self.gdf['geometry'].values)
+        return self._tree
+
+    def border_pairs(self):
+        '''Returns list of (code, code) pairs of areas sharing a border, as touching or near areas in spatial index, not nested.'''
+
+        import shapely
+        gdf = self.gdf
+        geometry = gdf['geometry'].values
+        codes = gdf['Code'].values
+
+        # Pairs of areas within distance of each other.
+        left_idx, right_idx = self.tree.query(geometry, predicate='dwithin', distance=ADJACENCY_DISTANCE)
+        pairs = (left_idx < right_idx) & (codes[left_idx] != codes[right_idx])
+        left_idx, right_idx = left_idx[pairs], right_idx[pairs]
+
+        # Exclude nested areas, overlapping more than a border.
+        overlap = shapely.area(shapely.intersection(geometry[left_idx], geometry[right_idx]))
+        smaller = np.minimum(shapely.area(geometry[left_idx]), shapely.area(geometry[right_idx]))
+        border = overlap <= ADJACENCY_MAX_OVERLAP * smaller
+
+        return list(dict.fromkeys(zip(codes[left_idx[border]], codes[right_idx[border]])))
+
+    def _read_areas(self):
+        '''Reads bundled areas dataset into GeoDataFrame.'''
+
+        # Import geometry libraries.
+        import geopandas as gpd
+        import shapely
+
+        # Read compact dataset.
+        df = pd.read_feather(self.filepath)
+
+        # Decode wkb geometries in one vectorized call.
+        geometry = shapely.from_wkb(df['geometry_wkb'].values)
+
+        # Create GeoDataFrame, with representative point coords as (x, y) tuple.
+        gdf = gpd.GeoDataFrame(
+            {
+                'Meaning': df['Meaning'].values,
+                'Code': df['Code'].values,
+                'coords': list(zip(df['coords_x'].values, df['coords_y'].values)),
+            },
+            geometry=geometry,
+            crs='EPSG:4326'
+            )
+
+        return gdf[['Meaning', 'Code', 'geometry', 'coords']]
+
+    def locate_points(self, lons, lats):
+        '''
+        Finds areas containing points.
+
+        :Inputs:
+            -lons, lats: Sequences of point longitudes and latitudes.
+
+        :Outputs:
+            -df: One row per (point, containing area) with columns point_idx, Code and Meaning.
+        '''
+
+        # Create points and query index for areas containing them.
+        import shapely
+        points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        point_idx, area_idx = self.tree.query(points, predicate='within')
+
+        # Create result from matched indexes.
+        df = pd.DataFrame({
+            'point_idx': point_idx,
+            'Code': self.gdf['Code'].values[area_idx],
+            'Meaning': self.gdf['Meaning'].values[area_idx],
+        })
+
+        return df.sort_values(['point_idx', 'Meaning'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,354 @@
+'''Border graph of entso-e areas, from areas geometries, known hvdc links and cable endpoints in transmission grid datasets.'''
+
+import json
+import os
+import pathlib
+import threading
+import numpy as np
+import pandas as pd
+from lib.mod.atomicwrite import atomic_open
+from lib.pkg.entsoetransparency.areaindex import AreaIndex
+from lib.pkg.entsoetransparency.staticscache import default_cache_dirpath
+
+
+# Cached graph layout version, bump when edges or endpoints layout changes.
+BORDER_GRAPH_VERSION = 2
+
+# Directory of external transmission grid datasets.
+EXTERNAL_DATA_DIRPATH = pathlib.Path(__file__).parents[3].joinpath('data', 'external')
+
+# Transmission grid datasets with cable endpoints, and area codes of the owning tso.
+# Features of cable_column matching cable_pattern are hvdc cables or cable stations, other line features are checked for crossing borders.
+CABLE_DATASETS = (
+    {
+        'filepath': EXTERNAL_DATA_DIRPATH.joinpath('fingrid', 'fingrid-navici_lines_20210727.geojson'),
+        'owners': ('10YFI-1--------U',),
+        'name_column': 'voimajohto',
+        'cable_column': 'jannite',
+        'cable_pattern': 'DC',
+    },
+    {
+        'filepath': EXTERNAL_DATA_DIRPATH.joinpath('energinet', 'energinet-gis_stations_20210802.geojson'),
+        'owners': ('10YDK-1--------W', '10YDK-2--------M'),
+        'name_column': 'Description',
+        'cable_column': 'Description',
+        'cable_pattern': 'HVDC',
+    },
+    )
+
+# Known hvdc interconnectors between areas not sharing a land border, as pairs of area codes.
+KNOWN_HVDC_LINKS = (
+    ('10YNO-2--------T', '10YDK-1--------W'),  # NO2 - DK1, Skagerrak
+    ('10YNO-2--------T', '10YNL----------L'),  # NO2 - NL, NorNed
+    ('10YNO-2--------T', '10Y1001A1001A82H'),  # NO2 - DE-LU, NordLink
+    ('10YNO-2--------T', '10YGB----------A'),  # NO2 - GB, North Sea Link
+    ('10Y1001A1001A46L', '10YDK-1--------W'),  # SE3 - DK1, Konti-Skan
+    ('10Y1001A1001A46L', '10YFI-1--------U'),  # SE3 - FI, Fenno-Skan
+    ('10Y1001A1001A47J', '10Y1001A1001A82H'),  # SE4 - DE-LU, Baltic Cable
+    ('10Y1001A1001A47J', '10YPL-AREA-----S'),  # SE4 - PL, SwePol
+    ('10Y1001A1001A47J', '10YLT-1001A0008Q'),  # SE4 - LT, NordBalt
+    ('10YFI-1--------U', '10Y1001A1001A39I'),  # FI - EE, Estlink
+    ('10YDK-1--------W', '10YNL----------L'),  # DK1 - NL, COBRAcable
+    ('10YDK-2--------M', '10Y1001A1001A82H'),  # DK2 - DE-LU, Kontek
+    ('10YDK-1--------W', '10YDK-2--------M'),  # DK1 - DK2, Great Belt
+    ('10YDK-2--------M', '10Y1001A1001A47J'),  # DK2 - SE4, Oresund
+    ('10YFI-1--------U', '10Y1001A1001A49F'),  # FI - RU, Vyborg
+    )
+
+# Max distance in degrees from cable endpoint to nearest area, if not within any area, as offshore cable stations.
+# Line ends are never snapped, lines with an end outside all areas are not edges.
+CABLE_ENDPOINT_MAX_DISTANCE = 0.5
+
+# Shared graph of default areas and datasets, see get_border_graph().
+_BORDER_GRAPH = None
+_BORDER_GRAPH_LOCK = threading.Lock()
+
+
+def default_border_graph_filepath():
+    '''Returns default path to the cached border graph file.'''
+    return os.path.join(default_cache_dirpath(), 'border_graph.json')
+
+
+def get_border_graph():
+    '''Returns border graph of bundled areas and external datasets, shared in this process and cached on disk.'''
+    global _BORDER_GRAPH
+    with _BORDER_GRAPH_LOCK:
+        if _BORDER_GRAPH is None:
+            _BORDER_GRAPH = BorderGraph()
+    return _BORDER_GRAPH
+
+
+class BorderGraph():
+    '''
+    Graph of entso-e areas exchanging power, for planning requests and drawing exchange maps.
+
+    :Explained:
+        -Borders: Areas sharing a border in areas geometries, see AreaIndex.border_pairs().
+        -Hvdc: Known hvdc links, see KNOWN_HVDC_LINKS.
+        -Lines: Lines in CABLE_DATASETS with ends within different areas.
+        -Cables: Hvdc cable endpoints in CABLE_DATASETS located outside the areas of the owning tso.
+         Endpoints not within any area are snapped to the nearest area, flagged as snapped in .endpoints.
+        -Cached: Edges and cable endpoints are cached in json file, rebuilt when areas or datasets files change.
+    '''
+
+    def __init__(self, area_index=None, filepath=None, cable_datasets=CABLE_DATASETS):
+        self.area_index = area_index if area_index is not None else AreaIndex()
+        self.filepath = filepath if filepath is not None else default_border_graph_filepath()
+        self.cable_datasets = cable_datasets
+        self._edges = None
+        self._endpoints = None
+        self._adjacency = None
+        self._lock = threading.RLock()
+
+    @property
+    def edges(self):
+        '''Undirected edges as DataFrame with columns from_code, to_code, sources and names.'''
+        self._load()
+        return self._edges
+
+    @property
+    def endpoints(self):
+        '''Cable endpoints as DataFrame with columns code, name, x, y, source and snapped, snapped if not within area code.'''
+        self._load()
+        return self._endpoints
+
+    @property
+    def adjacency(self):
+        '''Dict of area code and set of neighbouring area codes.'''
+        self._load()
+        return self._adjacency
+
+    def neighbours(self, code):
+        '''Returns set of area codes neighbouring area code, None if topology of area is not known, as areas without geometry.'''
+        return self.adjacency.get(code)
+
+    def pairs(self, codes=None):
+        '''Returns list of directed (from, to) pairs of neighbouring areas, of all areas or of areas in codes.'''
+        codes = set(codes) if codes is not None else None
+        pairs = []
+        for a, b in zip(self.edges['from_code'], self.edges['to_code']):
+            if codes is None or a in codes or b in codes:
+                pairs.extend([(a, b), (b, a)])
+        return pairs
+
+    def to_gdf(self):
+        '''
+        Returns edges as GeoDataFrame of lines, for drawing exchange maps.
+        Cable edges are drawn between cable endpoints if found, other edges between area representative points.
+        '''
+        import geopandas as gpd
+        import shapely
+
+        # Area representative points, names and geometries by code.
+        areas = self.area_index.gdf.set_index('Code')
+        coords = areas['coords'].to_dict()
+        meanings = areas['Meaning'].to_dict()
+        geometries = areas['geometry'].to_dict()
+        endpoints = self.endpoints
+
+        lines = []
+        for a, b, sources in zip(self.edges['from_code'], self.edges['to_code'], self.edges['sources']):
+            pa, pb = coords.get(a), coords.get(b)
+
+            # Cable edges from endpoints nearest the other area.
+            if 'hvdc' in sources or 'cable' in sources:
+                pa = self._nearest_endpoint(endpoints, a, geometries.get(b), pa)
+                pb = self._nearest_endpoint(endpoints, b, geometries.get(a), pb)
+            lines.append(shapely.LineString([pa, pb]) if pa is not None and pb is not None else None)
+
+        gdf = gpd.GeoDataFrame(self.edges.copy(), geometry=lines, crs='EPSG:4326')
+        gdf.insert(2, 'from_meaning', gdf['from_code'].map(meanings))
+        gdf.insert(3, 'to_meaning', gdf['to_code'].map(meanings))
+        return gdf
+
+    def refresh(self):
+        '''Rebuilds graph from areas and datasets, and writes cache file.'''
+        with self._lock:
+            self._set(*self._build())
+            try:
+                self._write_cache()
+            except OSError:
+                None
+
+    def _load(self):
+        '''Loads graph once, from cache file if not stale, else builds it.'''
+        if self._edges is not None:
+            return
+        with self._lock:
+            if self._edges is not None:
+                return
+            cached = self._read_cache()
+            if cached is not None:
+                self._set(*cached)
+            else:
+                self.refresh()
+
+    def _set(self, edges, endpoints):
+        '''Sets edges, endpoints and adjacency.'''
+        adjacency = {code: set() for code in self.area_index.gdf['Code'].values}
+        for a, b in zip(edges['from_code'], edges['to_code']):
+            adjacency.setdefault(a, set()).add(b)
+            adjacency.setdefault(b, set()).add(a)
+        self._endpoints = endpoints
+        self._adjacency = adjacency
+        self._edges = edges
+
+    def _build(self):
+        '''Builds edges and cable endpoints, raises ValueError if areas have duplicated codes.'''
+
+        # Each area code once, a code of two areas would merge their borders.
+        gdf = self.area_index.gdf
+        duplicated = gdf.loc[gdf['Code'].duplicated(keep=False), ['Meaning', 'Code']]
+        if len(duplicated) > 0:
+            raise ValueError(f'Duplicated area codes in areas:\n{duplicated}')
+
+        # Edges as sorted pair and sources and names.
+        edges = {}
+        def add(a, b, source, name=None):
+            key = tuple(sorted((a, b)))
+            edge = edges.setdefault(key, (set(), set()))
+            edge[0].add(source)
+            if name:
+                edge[1].add(name)
+
+        # Borders in areas geometries.
+        for a, b in self.area_index.border_pairs():
+            add(a, b, 'border')
+
+        # Known hvdc links.
+        for a, b in KNOWN_HVDC_LINKS:
+            add(a, b, 'hvdc')
+
+        # Lines and cables in datasets.
+        endpoints = []
+        for dataset in self.cable_datasets:
+            if not os.path.exists(dataset['filepath']):
+                continue
+            dataset_edges, dataset_endpoints = self._read_cable_dataset(dataset)
+            for a, b, source, name in dataset_edges:
+                add(a, b, source, name)
+            endpoints.extend(dataset_endpoints)
+
+        edges_df = pd.DataFrame(
+            [(a, b, '+'.join(sorted(sources)), '; '.join(sorted(names))) for (a, b), (sources, names) in sorted(edges.items())],
+            columns=['from_code', 'to_code', 'sources', 'names']
+            )
+        endpoints_df = pd.DataFrame(endpoints, columns=['code', 'name', 'x', 'y', 'source', 'snapped'])
+
+        return edges_df, endpoints_df
+
+    def _read_cable_dataset(self, dataset):
+        '''
+        Reads lines and cable endpoints of dataset.
+
+        :Outputs:
+            -edges: List of (code, code, source, name), source 'line' for lines crossing borders and 'cable' for cables ending outside owner areas.
+            -endpoints: List of (code, name, x, y, source, snapped) of cable endpoints.
+        '''
+        import geopandas as gpd
+        import shapely
+
+        gdf = gpd.read_file(dataset['filepath'])
+        names = gdf[dataset['name_column']].fillna('').astype(str).values
+        cables = gdf[dataset['cable_column']].fillna('').astype(str).str.contains(dataset['cable_pattern'], case=False).values
+        source = pathlib.Path(dataset['filepath']).stem
+        owners = dataset['owners']
+
+        edges = []
+        endpoints = []
+        for name in pd.unique(names):
+            idx = np.flatnonzero(names == name)
+            geometry = gdf.geometry.values[idx]
+
+            # Ends of line as farthest pair of parts ends, single point for stations.
+            points = np.vstack([shapely.get_coordinates(shapely.get_point(geometry, i)) for i in (0, -1)]) if shapely.get_type_id(geometry[0]) == 1 else shapely.get_coordinates(geometry)
+            distances = ((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=-1)
+            i, j = np.unravel_index(distances.argmax(), distances.shape)
+            ends = points[[i, j]] if i != j else points[[i]]
+
+            # Cable endpoints, snapped to nearest area if not within any, edge to nearest owner area if located outside owner areas.
+            if cables[idx].any():
+                for x, y in ends:
+                    codes, snapped = self._locate_point(x, y, snap=True)
+                    if len(codes) == 0:
+                        continue
+                    endpoints.append((codes[0], name, float(x), float(y), source, snapped))
+                    if not set(codes) & set(owners):
+                        owner = min(owners, key=lambda o: self._area_distance(o, x, y))
+                        edges.append((owner, codes[0], 'cable', name))
+
+            # Lines with ends within different areas, ends outside all areas are not snapped.
+            elif len(ends) == 2:
+                a_codes, b_codes = [set(self._locate_point(x, y, snap=False)[0]) for x, y in ends]
+                for a in a_codes - b_codes:
+                    for b in b_codes - a_codes:
+                        edges.append((a, b, 'line', name))
+
+        return edges, endpoints
+
+    def _locate_point(self, x, y, snap=True):
+        '''
+        Returns (codes, snapped) of areas containing point, smallest area first.
+        If snap and point is not within any area, codes of nearest area within CABLE_ENDPOINT_MAX_DISTANCE, and snapped True.
+        '''
+        import shapely
+        point = shapely.Point(x, y)
+        gdf = self.area_index.gdf
+        idx = self.area_index.tree.query(point, predicate='within')
+        snapped = False
+        if len(idx) == 0 and snap:
+            idx = self.area_index.tree.query_nearest(point, max_distance=CABLE_ENDPOINT_MAX_DISTANCE)
+            snapped = True
+        idx = idx[np.argsort(shapely.area(gdf['geometry'].values[idx]), kind='stable')]
+        return list(dict.fromkeys(gdf['Code'].values[idx])), snapped
+
+    def _area_distance(self, code, x, y):
+        '''Returns distance in degrees from point to area code, inf if area is not known.'''
+        import shapely
+        gdf = self.area_index.gdf
+        geometry = gdf['geometry'].values[gdf['Code'].values == code]
+        return float(shapely.distance(geometry, shapely.Point(x, y)).min()) if len(geometry) > 0 else float('inf')
+
+    def _nearest_endpoint(self, endpoints, code, geometry, default):
+        '''Returns (x, y) of cable endpoint in area code nearest geometry, default if none.'''
+        import shapely
+        points = endpoints[endpoints['code'] == code]
+        if len(points) == 0 or geometry is None:
+            return default
+        distances = shapely.distance(shapely.points(points[['x', 'y']].values), geometry)
+        k = int(np.argmin(distances))
+        return (points['x'].values[k], points['y'].values[k])
+
+    def _signature(self):
+        '''Returns version and size and modification time of areas and datasets files, cache is stale if changed.'''
+        signature = {'version': BORDER_GRAPH_VERSION}
+        for filepath in [self.area_index.filepath] + [dataset['filepath'] for dataset in self.cable_datasets]:
+            try:
+                stat = os.stat(filepath)
+                signature[str(filepath)] = [stat.st_size, int(stat.st_mtime)]
+            except OSError:
+                signature[str(filepath)] = None
+        return signature
+
+    def _read_cache(self):
+        '''Reads cached edges and endpoints, None if missing, unreadable or stale.'''
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('signature') != self._signature():
+                return None
+            edges = pd.DataFrame(cached['edges'], columns=['from_code', 'to_code', 'sources', 'names'])
+            endpoints = pd.DataFrame(cached['endpoints'], columns=['code', 'name', 'x', 'y', 'source', 'snapped'])
+            return edges, endpoints
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return None
+
+    def _write_cache(self):
+        '''Writes edges and endpoints to cache file atomically.'''
+        cached = {
+            'signature': self._signature(),
+            'edges': self._edges.values.tolist(),
+            'endpoints': self._endpoints.values.tolist(),
+            }
+        with atomic_open(self.filepath, 'w', prefix='.border_graph-') as f:
+            json.dump(cached, f, indent=1, ensure_ascii=False)
@@ -0,0 +1,120 @@
+'''Local store of entso-e transparency points, keyed by (dataset, in_domain, out_domain, resolution), with coverage index of requested timeperiods.'''
+
+import datetime
+import glob
+import hashlib
+import os
+import re
+import pandas as pd
+from lib.mod.timeseriesstore import TimeSeriesStore
+from lib.pkg.entsoetransparency.staticscache import default_cache_dirpath
+
+
+# Data older than this is settled, and requested timeperiods are marked as covered.
+DATA_STORE_SETTLED_AFTER = datetime.timedelta(days=7)
+
+# Columns not identifying a point when dropping duplicates, as they may differ between requests of the same data.
+DATA_STORE_VOLATILE_COLUMNS = ('parameters', 'createddatetime', 'type', 'start', 'end', 'success', 'reason')
+
+# Reason texts of bad responses meaning the timeperiod has no data, and is covered.
+DATA_STORE_EMPTY_REASONS = ('No matching data found',)
+
+
+def default_data_store_dirpath():
+    '''Returns default path to the data store directory.'''
+    return os.path.join(default_cache_dirpath(), 'store')
+
+
+class EntsoeDataStore(TimeSeriesStore):
+    '''
+    Store of long format responses, as parquet parts by (dataset, in_domain, out_domain, resolution) and month.
+
+    :Explained:
+        -Coverage: Requested timeperiods are recorded by (dataset, in_domain, out_domain), as responses holds all resolutions.
+        -Partitions: Points are stored by (dataset, in_domain, out_domain, resolution) and month of timestamp.
+        -Settled: Only timeperiods older than settled_after are marked as covered, newer data is re-requested.
+        -Duplicates: Points are identified by timestamp and TimeSeries data, keeping last stored values.
+    '''
+
+    def __init__(self, dirpath=None, settled_after=DATA_STORE_SETTLED_AFTER):
+
+        # Initialise store, points are stored by timestamp.
+        super().__init__(dirpath if dirpath is not None else default_data_store_dirpath(), time_column='timestamp')
+        self.settled_after = settled_after
+
+    def coverage_key(self, dataset, in_code, out_code):
+        '''Returns coverage key of requests.'''
+        return f'{dataset}|{in_code or ""}|{out_code or ""}'
+
+    def partition_key(self, dataset, in_code, out_code, resolution=None):
+        '''Returns directory safe key of points partition, as readable part and hash of coverage key, and resolution.'''
+        key = self.coverage_key(dataset, in_code, out_code)
+        readable = re.sub(r'[^0-9A-Za-z.\-]+', '_', key).strip('_')[:80]
+        prefix = f'{readable}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]}'
+        if resolution is None:
+            return prefix
+        return f'{prefix}.{re.sub(r"[^0-9A-Za-z]+", "_", str(resolution)) or "none"}'
+
+    def find_request_gaps(self, dataset, in_code, out_code, start, end):
+        '''Returns list of (start, end) timeperiods not covered for requests, times as "%Y%m%d%H%M" strings in UTC.'''
+        gaps = self.find_gaps(self.coverage_key(dataset, in_code, out_code), _parse_timestr(start), _parse_timestr(end))
+        return [(s.strftime('%Y%m%d%H%M'), e.strftime('%Y%m%d%H%M')) for s, e in gaps]
+
+    def append_points(self, dataset, in_code, out_code, df, start, end, covered=True):
+        '''
+        Stores long format response points of request, and marks settled part of requested timeperiod as covered.
+
+        :Inputs:
+            -df: Good response rows of request, with 'timestamp' and 'resolution' columns.
+            -start, end: Requested timeperiod, as "%Y%m%d%H%M" strings in UTC.
+            -covered: If False, points are stored but the timeperiod is not marked as covered.
+        '''
+
+        # Write points by resolution.
+        if df is not None and len(df) > 0:
+            df = df[df['timestamp'].notna()].drop(columns=[c for c in ['success', 'reason'] if c in df.columns])
+            resolutions = df['resolution'].astype(str) if 'resolution' in df.columns else pd.Series('', index=df.index)
+            for resolution, part in df.groupby(resolutions.values, sort=True):
+                key = self.partition_key(dataset, in_code, out_code, resolution)
+                self.write(key, part.reset_index(drop=True))
+
+        # Mark settled part of timeperiod as covered.
+        if covered:
+            start = _parse_timestr(start)
+            settled = pd.Timestamp.utcnow().floor('H') - self.settled_after
+            end = min(_parse_timestr(end), settled)
+            if end > start:
+                self.add_coverage(self.coverage_key(dataset, in_code, out_code), start, end)
+
+    def read_points(self, dataset, in_code, out_code, start=None, end=None):
+        '''Returns stored points of requests in [start, end), all resolutions, sorted by timestamp.'''
+
+        # Read all resolution partitions.
+        df_list = []
+        start = None if start is None else _parse_timestr(start)
+        end = None if end is None else _parse_timestr(end)
+        prefix = self.partition_key(dataset, in_code, out_code)
+        for keypath in sorted(glob.glob(os.path.join(self.dirpath, f'key={prefix}.*'))):
+            key = os.path.basename(keypath).split('=', 1)[-1]
+            df = self.read(key, start, end, subset=False)
+            if len(df) > 0:
+                df_list.append(df)
+
+        # If nothing stored, return empty df.
+        if len(df_list) == 0:
+            return pd.DataFrame()
+        df = pd.concat(df_list, ignore_index=True)
+
+        # Drop duplicated points, identified by timestamp and TimeSeries data.
+        subset = [c for c in df.columns if c not in DATA_STORE_VOLATILE_COLUMNS and not pd.api.types.is_numeric_dtype(df[c])]
+        df = df.drop_duplicates(subset=subset, keep='last')
+
+        return df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def _parse_timestr(t):
+    '''Returns "%Y%m%d%H%M" string or datetime as UTC pandas Timestamp.'''
+    if isinstance(t, str):
+        t = datetime.datetime.strptime(t, '%Y%m%d%H%M')
+    t = pd.Timestamp(t)
+    return t.tz_localize('UTC') if t.tzinfo is None else t.tz_convert('UTC')
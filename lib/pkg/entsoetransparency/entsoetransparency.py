@@ -2,19 +2,36 @@
 
 from datetime import datetime, timedelta
 import datetime
-import difflib, io
+import io
 import requests
 import pandas as pd
 import bs4
 from bs4 import NavigableString
 import json
-import geopandas as gpd
 import pandas as pd
 import numpy as np
-from ratelimit import limits
+from concurrent.futures import ThreadPoolExecutor
 import unicodedata
 import re
+import threading
 import zipfile
+from collections import deque
+from lib.pkg.entsoetransparency.staticscache import get_statics_snapshot, STATICS_GUIDE_URL, STATICS_SNAPSHOT_TTL, STATICS_CLIENT_PARSER
+from lib.pkg.entsoetransparency.bordergraph import get_border_graph
+from lib.pkg.entsoetransparency.responsecache import ResponseCache
+from lib.pkg.entsoetransparency.datastore import EntsoeDataStore, DATA_STORE_EMPTY_REASONS
+from lib.pkg.entsoetransparency.requestplanner import RequestPlanner
+from lib.pkg.entsoetransparency.zippipeline import open_zip, parse_zip_content
+from lib.pkg.entsoetransparency.parquetschemas import export_parquet, read_parquet
+from lib.pkg.entsoetransparency.xmlparser import parse_response_xml, parse_response_xml_long, parse_nested_xml
+from lxml import etree
+from lib.mod.apisession import ApiSession
+from lib.mod.ratelimiter import TokenBucket
+from lib.mod.closematcher import CloseMatcher
+from lib.mod.sinks import open_sink
+
+# Key of nan values when comparing rows, equal for all nan.
+NAN_KEY = object()
 
 
 
@@ -25,9 +42,22 @@ class EntsoeTransparencyClient():
 
     :Explained:
         -Always up-to-date: Retrieves api-static parameters from webscraping url html api-guide web page.
+        -Cached statics: Scraped api-statics is cached on disk and only re-scraped when stale or refreshed.
+        -Lazy init: If lazy, statics and areas are first loaded when used, optionally preloaded in background.
+        -Pooled session: Requests share keep-alive connections and retry transient errors, see .session.get_stats().
+        -Concurrent requests: Requests of a .get_data() call are made on max_workers threads, within api rate limits.
+        -Rate limited: Calls are paced by a token bucket shared by all clients on this host, see .ratelimiter.get_stats().
+        -Cached responses: If response_cache, good responses are cached on disk, see .response_cache.get_stats().
+        -Synced store: .get_data(sync=True) requests only timeperiods missing in the local .data_store, serving all from the store.
         -Matched requests: Finds best "close-match" in available parameters from user inputs to .get_data() request.
         -Fixed requests: If possible, fixes and re-runs request if initial request gave bad response.
-        -Unzip zip: Unzips zipped document response, and includes in dataframe.
+        -Planned requests: Timeperiods are split into the max timeperiods allowed per dataset, learned from bad responses, see .request_planner.
+        -Unzip zip: Unzips zipped document response, and includes in dataframe. Many documents are parsed in a process pool.
+        -Streaming parser: Responses are parsed with lxml iterparse into columns, building each dataframe once.
+        -Long format: .get_data(long_format=True) returns one row per point, indexed by point timestamps.
+        -Streaming: .iter_data() yields each response as parsed, optionally written to csv or parquet sink, in bounded memory.
+        -Typed parquet: .to_parquet() writes long format data with one schema per dataset family, read back with .read_parquet().
+        -Border graph: Unspesified to areas are expanded to neighbouring areas only, see .get_border_graph().
     
     
     '''
@@ -35,25 +65,178 @@ class EntsoeTransparencyClient():
     #####################
     # Init functions
     #####################
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, statics_filepath=None, statics_ttl=STATICS_SNAPSHOT_TTL, refresh_statics=False, lazy=False, background=False, session=None, max_workers=8, ratelimiter=None, response_cache=None, data_store=None, request_planner=None):
         self.api_key = api_key
         self.api_url = f'https://transparency.entsoe.eu/api?'
 
-        # Getting API guide requests and parameters from
-        # Webscraping html api-guide url.
-        self.datasets, self.parameters = self._get_statics_datasets_parameters()
-        
-        self.areas = self._get_entsoe_areas()
+        # Pooled http session used for all requests, may be shared with other clients.
+        self.session = session if session is not None else ApiSession()
+
+        # Max number of concurrent requests in get_data.
+        self.max_workers = max_workers
+
+        # Rate limiter pacing calls below max 400 calls pr minute (or 10min ban),
+        # shared by all threads and processes on this host.
+        # Max calls in any minute is capacity + rate * 60 = 10 + 380 calls.
+        if ratelimiter is None:
+            ratelimiter = TokenBucket.shared('entsoetransparency', rate=380/60, capacity=10)
+        self.ratelimiter = ratelimiter
+
+        # Cache of api responses, if True in default cache directory, None for no caching.
+        if response_cache is True:
+            response_cache = ResponseCache()
+        self.response_cache = response_cache if response_cache is not False else None
+
+        # Planner of request timeperiods, with max timeperiods per dataset learned and persisted on this host.
+        self.request_planner = request_planner if request_planner is not None else RequestPlanner()
+
+        # Local store of synced data, if None in default store directory when first used.
+        self._data_store = data_store if data_store is not True else None
+
+        # Statics snapshot cache file and seconds before revalidating it.
+        self.statics_filepath = statics_filepath
+        self.statics_ttl = statics_ttl
+        self._refresh_statics = refresh_statics
+
+        # Statics and areas are loaded on first access to .datasets, .parameters and .areas.
+        self._datasets = None
+        self._parameters = None
+        self._areas = None
+        self._statics_lock = threading.RLock()
+        self._areas_lock = threading.RLock()
+        self._preload_thread = None
+
+        # Code to meaning lookups and close-matchers, built from statics on first use.
+        self._parameters_lookups = None
+        self._tag_lookups = {}
+        self._matchers = {}
+
+        # Areas geometries are loaded from bundled dataset, shared with graph of neighbouring areas of all clients.
+        self.area_index = get_border_graph().area_index
+
+        # Graph of neighbouring areas, loaded from cache file or built from areas geometries when first used.
+        self._border_graph = None
+
+        # Stats of last expanded (from, to) pairs and of last built requests, with requests avoided by area topology.
+        self.from_to_stats = {}
+        self.requests_stats = {}
+
+        # If background, start loading statics and areas in background thread.
+        if background:
+            self.preload(wait=False)
+
+        # Elif not lazy, getting API guide requests and parameters from cached statics snapshot,
+        # webscraping html api-guide url if snapshot is missing or stale.
+        elif not lazy:
+            self._load_statics()
 
 
         return None
 
+    @property
+    def datasets(self):
+        '''Available api datasets, loaded from statics on first access.'''
+        if self._datasets is None:
+            self._load_statics()
+        return self._datasets
+
+    @datasets.setter
+    def datasets(self, datasets):
+        self._datasets = datasets
+        self._reset_lookups()
+
+    @property
+    def parameters(self):
+        '''Available api parameters, loaded from statics on first access.'''
+        if self._parameters is None:
+            self._load_statics()
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, parameters):
+        self._parameters = parameters
+        self._reset_lookups()
+
+    @property
+    def areas(self):
+        '''Entso-e areas GeoDataFrame, loaded on first access.'''
+        if self._areas is None:
+            with self._areas_lock:
+                if self._areas is None:
+                    self._areas = self._get_entsoe_areas()
+        return self._areas
+
+    @areas.setter
+    def areas(self, areas):
+        self._areas = areas
+
+    @property
+    def data_store(self):
+        '''Local store of synced data, opened in default store directory when first used.'''
+        with self._statics_lock:
+            if self._data_store is None:
+                self._data_store = EntsoeDataStore()
+            elif isinstance(self._data_store, str):
+                self._data_store = EntsoeDataStore(self._data_store)
+        return self._data_store
+
+    @data_store.setter
+    def data_store(self, data_store):
+        self._data_store = data_store
+
+    @property
+    def border_graph(self):
+        '''Graph of neighbouring areas shared by all clients, see bordergraph.get_border_graph(), loaded on first access.'''
+        with self._areas_lock:
+            if self._border_graph is None:
+                self._border_graph = get_border_graph()
+        return self._border_graph
+
+    @border_graph.setter
+    def border_graph(self, border_graph):
+        self._border_graph = border_graph
+
+    def _load_statics(self):
+        '''Loads datasets and parameters once, also when accessed from multiple threads.'''
+        with self._statics_lock:
+            if self._datasets is None or self._parameters is None:
+                self._datasets, self._parameters = self._get_statics_snapshot_datasets_parameters(refresh=self._refresh_statics)
+                self._refresh_statics = False
+                self._reset_lookups()
+
+    def preload(self, wait=True):
+        '''Loads statics, areas and areas spatial index, in background thread if not wait.'''
+
+        def _preload():
+            self._load_statics()
+            self.areas
+            self.area_index.tree
+            self.border_graph.adjacency
+
+        # Load directly.
+        if wait:
+            _preload()
+            return None
+
+        # Start background loading, accessing properties meanwhile waits on the same locks.
+        self._preload_thread = threading.Thread(target=_preload, name='EntsoeTransparencyClient-preload', daemon=True)
+        self._preload_thread.start()
+        return self._preload_thread
+
+
+    def _parse_entsoe_response_to_df(self, soup_parent, start_tag="", df=pd.DataFrame([]), c_layer=0, layer_children=None, parser='lxml'):
+        '''Helperfunction, parse entso-e api response to pd.DataFrame, streaming with lxml or recursively with parser='bs4'.'''
 
-    def _parse_entsoe_response_to_df(self, soup_parent, start_tag="", df=pd.DataFrame([]), c_layer=0, layer_children=None):
-        '''Helperfunction, recursively parse entso-e api response to pd.DataFrame.'''
+        # If first run on response, parse with streaming parser, if not xml use soup.
+        if parser == 'lxml' and start_tag is not None and isinstance(soup_parent, (str, bytes, requests.Response)):
+            try:
+                content = soup_parent.content if isinstance(soup_parent, requests.Response) else soup_parent
+                return parse_nested_xml(content, start_tag=start_tag)
+            except etree.XMLSyntaxError:
+                None
 
         # If input is not soup, make soup.
-        if isinstance(soup_parent, str):
+        if isinstance(soup_parent, (str, bytes)):
             soup_parent = bs4.BeautifulSoup(soup_parent, features="lxml")
         elif isinstance(soup_parent, requests.Response):
             soup_parent = bs4.BeautifulSoup(soup_parent.text, features="lxml")
@@ -181,29 +364,40 @@ class EntsoeTransparencyClient():
         return df
     
     def remap_df_parameters(self, df, column_type_mapping = {}):
-        '''Helperfunction for remapping response codes to meaning'''
-    
-        # Storing list of existing columns_names and api parameter_types.
-        df_cols_list = df.columns.values.tolist()
-        api_para_list = list(self.api_parameters.keys())
-    
-        # Loop on df rows by index.
-        for idx in df.index:
-        
-            # Loop on spesified columns to type mappings.
-            for column, paramtype in column_type_mapping.items():
+        '''
+        Helperfunction for remapping response codes to meaning.
 
-                # If spesified column exist in df and spesified type exist in available parameter types.
-                if column in df_cols_list and paramtype in api_para_list:
-            
-                # Make sure cell to remap has content, is not already remapped and not empty string.
-                    if pd.isnull(df.at[idx, column]) == False and len(df.at[idx, column]) > 0:
-                
-                        # Make sure cell value is not already mapped:
-                        if df.at[idx, column] not in list(self.api_parameters[paramtype].values()):
-                    
-                            # Remap cell value.
-                            df.at[idx, column] = self.api_parameters[paramtype][df.at[idx, column]]
+        :Inputs:
+            -df: Response df.
+            -column_type_mapping: Dict of column name to parameter type in .parameters, as {'businesstype': 'BusinessType'}.
+
+        :Outputs:
+            -df: With codes in mapped columns remapped to meanings, as categoricals if not lists in cells.
+             Already remapped values and unknown codes are kept.
+        '''
+
+        # Get lookups of lowered codes and meanings to meanings.
+        lookups = self._get_parameters_lookups()
+
+        # Loop on spesified columns to type mappings.
+        for column, paramtype in column_type_mapping.items():
+
+            # If spesified column exist in df and spesified type exist in available parameter types.
+            if column not in df.columns or paramtype not in lookups:
+                continue
+            series = df[column]
+
+            # If lists in cells, remap values in lists.
+            if series.dtype == object and any(isinstance(v, list) for v in series.values):
+                df[column] = self._map_series_lookup(series, lookups[paramtype])
+                continue
+
+            # Factorize column, remap unique values once and recode as categorical.
+            codes, uniques = pd.factorize(series)
+            mapped = self._map_series_lookup(pd.Series(np.asarray(uniques, dtype=object), dtype=object), lookups[paramtype])
+            mapped_codes, categories = pd.factorize(mapped)
+            codes = np.where(codes < 0, -1, mapped_codes[codes]) if len(mapped_codes) > 0 else codes
+            df[column] = pd.Categorical.from_codes(codes, categories=categories)
     
         # Return remapped df.
         return df
@@ -212,9 +406,8 @@ class EntsoeTransparencyClient():
     # Backend functions ##
     ######################
 
-    @limits(calls=399, period=60) #max 400 calls pr minute or 10min ban..
     def _call_api(self, url=None, parameters_dict=None, msg=False):
-        '''Make call to api limited to , return full respons.
+        '''Make call to api limited by .ratelimiter, return full respons.
         '''
         # if url spesified, set url directly
         if url is not None:
@@ -229,13 +422,36 @@ class EntsoeTransparencyClient():
         if msg:
             print(f'Making request at url:\n{get_url}')
 
-        #makes request
-        response = requests.get(get_url) 
+        #waits for rate limit budget, makes request on pooled session
+        self.ratelimiter.acquire()
+        response = self.session.get(get_url)
         return response, get_url
 
         #return request respons
         #return None
 
+    def _get_response(self, dataset, parameters_dict):
+        '''Returns (response, url, cached) of request, from .response_cache if cached, else calling api and caching good responses.'''
+
+        # Return cached response content as response.
+        if self.response_cache is not None:
+            content = self.response_cache.get(parameters_dict)
+            if content is not None:
+                response = requests.Response()
+                response._content = content
+                response.status_code = 200
+                response.encoding = 'utf-8'
+                return response, self._construct_api_call_url(parameters_dict=parameters_dict), True
+
+        # Call api.
+        response, url = self._call_api(parameters_dict=parameters_dict)
+
+        # Cache good responses, not acknowledgement documents of bad requests.
+        if self.response_cache is not None and response.status_code == 200 and b'Acknowledgement_MarketDocument' not in response.content[:1000]:
+            self.response_cache.put(parameters_dict, response.content, dataset=dataset)
+
+        return response, url, False
+
     def _construct_api_call_url(self, parameters_dict, api_key=None, baseurl=None):
         '''Constructs api call url from baseurl, api_key and parameters_dict.
         '''
@@ -257,21 +473,48 @@ class EntsoeTransparencyClient():
         #return call_url
         return call_url
 
-    def _get_statics_guide_soup(self, setasattr=True):
+    def _get_statics_guide_soup(self, setasattr=True, html=None):
         '''Scrape url statics guide html, return 'static-content' as soup object.'''
-        statics_soup = bs4.BeautifulSoup(requests.get('https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html').text, "lxml").find(id="static-content")
+
+        # If guide html is not spesified, get it from guide url.
+        if html is None:
+            html = self.session.get(STATICS_GUIDE_URL).text
+
+        statics_soup = bs4.BeautifulSoup(html, "lxml").find(id="static-content")
         if setasattr:
             setattr(self, 'statics_soup', statics_soup)
         return statics_soup
+
+    def _get_statics_snapshot_datasets_parameters(self, refresh=False):
+        '''Getting api statics datasets and parameters from cached snapshot, scraping guide if stale or refresh.'''
+
+        # Get snapshot, using this client's guide scraper if (re-)scrape is needed.
+        snapshot = get_statics_snapshot(
+            parse_func=lambda html: self._get_statics_datasets_parameters(html=html),
+            filepath=self.statics_filepath,
+            ttl=self.statics_ttl,
+            refresh=refresh,
+            get_func=self.session.get,
+            parser=STATICS_CLIENT_PARSER
+            )
+
+        # Store snapshot metadata.
+        self.statics_version = {key: snapshot.get(key) for key in ['version', 'content_hash', 'created', 'checked']}
+
+        return snapshot['datasets'], snapshot['parameters']
+
+    def refresh_statics(self):
+        '''Re-scrape api guide webpage, updating cached statics snapshot and client datasets and parameters.'''
+        self.datasets, self.parameters = self._get_statics_snapshot_datasets_parameters(refresh=True)
     
-    def _get_statics_datasets_parameters(self):
+    def _get_statics_datasets_parameters(self, html=None):
         '''
         Getting entsoe api service statics from the api guide webpage using webscraping.
         API guide url: https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html
         '''
 
         # Extract part of html content containing the static content.
-        content_soup = self._get_statics_guide_soup().find(id="content")
+        content_soup = self._get_statics_guide_soup(html=html).find(id="content")
         
         # Finding all headers. TODO: missing 1.4. Parameters due du it being nested in ulist. Content included in 1.3.
         headers = content_soup.find_all(lambda x: x.name in ['h2', 'h3', 'h4'] and len(x.string) > 2)
@@ -523,13 +766,13 @@ class EntsoeTransparencyClient():
         ######################################
         ######################################    
           
-    def _reason_fix_request(self, reason_str): #TODO: not created yet.
-        '''Fixes request if possible based on text in reason'''
+    def _reason_fix_request(self, reason_str, dataset=None):
+        '''Learns fix of request if possible based on text in reason, returns max allowed timeperiod as (value, unit) or None.'''
 
-        # If requested to many days:
-        if 'allowed: ' in reason_str:
-            val_unit = reason_str.split('allowed: ')[-1].split(',')[0].split(' ')
-            print(f'ALLOWED: {val_unit[0]} in unit {val_unit[-1]}')
+        # If requested to long timeperiod, learn max timeperiod of dataset.
+        if dataset is not None:
+            return self.request_planner.learn(dataset, reason_str)
+        return None
     
     def _get_dataset_mandatorys_dict(self, dataset):
         '''Creates dictionary of parameters to be included in request.'''
@@ -733,144 +976,142 @@ class EntsoeTransparencyClient():
         return d
     
 
-    def _zipfile2df(self, zipf):
-        '''Extract data from zipfile, parse all files into one df.'''
-    
-        # Create dataframe for storing zipfile content.
-        df = pd.DataFrame()
-    
-        # Loop on files in zipfile.
-        for filename in zipf.namelist():
-        
-            # Extract file xml content.
-            xml_content = zipf.read(filename).decode("utf-8") 
-        
-            # Parse into df.
-            df1 = self._response_xml_to_df(xml_content)
-        
-            # Append to main df.
-            df = df.append(df1).reset_index(drop=True)
+    def _zipfile2df(self, zipf, long_format=False):
+        '''
+        Extract data from zipfile content bytes or ZipFile, parse all files into one df.
+        Files are parsed in a process pool if many, combined once and remapped once.
+        Number of files, and total and max seconds parsing a file, are in df.attrs 'parse_files', 'parse_seconds' and 'parse_max_seconds'.
+        '''
+
+        # Parse all xml files, codes not remapped.
+        df, parse_times, failed = parse_zip_content(zipf, long_format=long_format)
+
+        # Parse files not xml with soup, files without data are skipped.
+        if len(failed) > 0 and not long_format:
+            df_list = [df]
+            for filename, content in list(failed.items()):
+                try:
+                    df_list.append(self._response_xml_to_df(content, parser='bs4'))
+                    failed.pop(filename)
+                except (AttributeError, IndexError):
+                    None
+            df_list = [df1 for df1 in df_list if len(df1) > 0]
+            df = pd.concat(df_list, ignore_index=True) if len(df_list) > 0 else pd.DataFrame()
+        if len(failed) > 0:
+            print(f'ERROR: Files not parsed in zipfile: {list(failed.keys())}')
+
+        # Remap codes by columns once for all files.
+        df = self._remap_df_codes2meanings(df)
+
+        # Parse times as scalars, attrs are compared when dfs are concatenated.
+        df.attrs['parse_files'] = len(parse_times)
+        df.attrs['parse_seconds'] = float(parse_times['seconds'].sum())
+        df.attrs['parse_max_seconds'] = float(parse_times['seconds'].max()) if len(parse_times) > 0 else 0.0
 
         # Return zipfile content in full df.
         return df
     
-    def _get_entsoe_areas(self):
-        '''Get entsoe areas GeoDataFrame'''
+    def _get_entsoe_areas(self, remote=False):
+        '''Get entsoe areas GeoDataFrame, from bundled areas dataset or if remote from entsoeapi repository.'''
+
+        # Bundled areas with precomputed representative points.
+        if not remote:
+            return self.area_index.gdf
+
         # Retrieving entsoeapi areas GeoDataFrame
+        import geopandas as gpd
         areas = gpd.read_file("https://raw.githubusercontent.com/ocrj/entsoeapi/main/data/areas/areas.geojson")
         
         # Adding representative points to entsoe areas GeoDataFrame
-        areas['coords'] = areas['geometry'].apply(lambda x: x.representative_point().coords[:])
-        areas['coords'] = [coords[0] for coords in areas['coords']]
+        points = areas['geometry'].representative_point()
+        areas['coords'] = list(zip(points.x, points.y))
 
         return areas
     
     def _merge_extend_equal_rows(self, o_df, extends=['quantity', 'start', 'end']):
-        '''Combines equal rows in df.'''
-        
-        # Create new list.
-        ex = []
+        '''
+        Combines equal rows in df.
 
-        # Loop on spesified extends.
-        for e in extends:
+        :Explained:
+            Rows with equal values in all columns except extends are merged into first of the rows, in one pass.
+            Merged 'start' is the earliest start, 'end' the latest end, other extends are concatenated as lists.
+            Rows without equal rows are kept unchanged.
+        '''
 
-            # If extend exist in o_df.columns.
-            if e in o_df.columns:
+        # Filter spesified extends to existing columns.
+        extends = [e for e in extends if e in o_df.columns]
 
-                # Append it to new list.
-                ex.append(e)
+        # If list is now empty or nothing to merge, return original df.
+        if len(extends) == 0 or len(o_df) < 2:
+            return o_df
 
-        # Set extends to new filtered list.
-        extends = ex
+        # Columns compared for equality.
+        o_df = o_df.reset_index(drop=True)
+        keys = [col for col in o_df.columns if col not in extends]
 
-        # If list is now empty.
-        if len(extends) == 0:
+        # Group rows on hashable values of compared columns, in order of first appearance.
+        groups = {}
+        for idx, row in enumerate(o_df[keys].itertuples(index=False, name=None)):
+            groups.setdefault(tuple(self._hashable_value(v) for v in row), []).append(idx)
+        groups = list(groups.values())
 
-            # Return original df.
+        # If no equal rows, return original df.
+        if len(groups) == len(o_df):
             return o_df
-        
-        
-        # Create new df.
-        n_df = []
-        o_df = o_df.reset_index(drop=True)
-        # Loop on old dataframe.
-        for o_idx, o_row in o_df.iterrows():
-        
-            # If this is first.
-            if len(n_df) == 0:
-            
-                # Make new df of this first row in old df.
-                n_df = pd.DataFrame(o_df.iloc[o_idx]).T.reset_index(drop=True)
-            
-            # Else not first
-            else:
-            
-                # Set initial flag to add this row to new df.
-                add_flag = True
-            
-                # Loop on columns in new df.
-                for n_idx, n_row in n_df.iterrows():
-            
-                    # If all columns in old equals new, except for qxtend columns.
-                    if (o_df.iloc[o_idx].drop(extends) == n_df.iloc[n_idx].drop(extends)).all():
-                        # Found matching row to extend data into, reset flag to append full row.
-                        add_flag = False
-                    
-                        # Loop on extends.
-                        for exd in extends:
-                        
-                            # If start.
-                            if 'start' in exd:
-                            
-                                # Unwrap if in list:
-                                if isinstance(o_df.at[o_idx, exd], list):
-                                    o_df.at[o_idx, exd] = o_df.at[o_idx, exd][0]
-                                if isinstance(n_df.at[n_idx, exd], list):
-                                    n_df.at[n_idx, exd] = n_df.at[n_idx, exd][0]
-                                    
-                                
-                                # If extenting start is less than existing start, add as start.
-                                ext_s = datetime.datetime.strptime(o_df.at[o_idx, exd], '%Y-%m-%dT%H:%MZ')
-                                exi_s = datetime.datetime.strptime(n_df.at[n_idx, exd], '%Y-%m-%dT%H:%MZ')
-                                if ext_s < exi_s:
-                                    n_df.at[n_idx, exd] = o_df.at[o_idx, exd]
-                            
-                            elif 'end' in exd:
-
-                                # Unwrap if in list:
-                                if isinstance(o_df.at[o_idx, exd], list):
-                                    o_df.at[o_idx, exd] = o_df.at[o_idx, exd][0]
-                                if isinstance(n_df.at[n_idx, exd], list):
-                                    n_df.at[n_idx, exd] = n_df.at[n_idx, exd][0]
-                            
-                                # If extenting end is larger than existing end, add as end
-                                ext_e = datetime.datetime.strptime(o_df.at[o_idx, exd], '%Y-%m-%dT%H:%MZ')
-                                exi_e = datetime.datetime.strptime(n_df.at[n_idx, exd], '%Y-%m-%dT%H:%MZ')
-                                if ext_s > exi_s:
-                                    n_df.at[n_idx, exd] = o_df.at[o_idx, exd]
-                                
-                            else:
-                            
-                                # Ensure cell is list
-                                if isinstance(n_df.at[n_idx, exd], list) is False:
-                                    n_df.at[n_idx, exd] = [n_df.at[n_idx, exd]]
-                        
 
-                                # Extend value_s to cell list.
-                                n_df.at[n_idx, exd].extend(o_df.at[o_idx, exd])
-                    
-                        # Extended data into existing row in new df, break loop.
-                        break
-                
-                # If not added in existing.
-                if add_flag:
-                    
-                    # Append as new row to new df.
-                    n_df = n_df.append(o_df.iloc[o_idx]).reset_index(drop=True)
-                
-    
+        # New df of first row in each group.
+        n_df = o_df.iloc[[group[0] for group in groups]].reset_index(drop=True)
+
+        # Loop on extends, merging values of groups.
+        for exd in extends:
+            values = o_df[exd].values
+            merged = []
+            for group in groups:
+
+                # Keep value of single rows.
+                if len(group) == 1:
+                    merged.append(values[group[0]])
+
+                # Earliest start, unwrapped if in list.
+                elif 'start' in exd:
+                    merged.append(min((self._unwrap_value(values[idx]) for idx in group), key=self._datetimestr2dt))
+
+                # Latest end, unwrapped if in list.
+                elif 'end' in exd:
+                    merged.append(max((self._unwrap_value(values[idx]) for idx in group), key=self._datetimestr2dt))
+
+                # Concatenate values to list.
+                else:
+                    cell = []
+                    for idx in group:
+                        if isinstance(values[idx], list):
+                            cell.extend(values[idx])
+                        else:
+                            cell.append(values[idx])
+                    merged.append(cell)
+
+            n_df[exd] = pd.Series(merged, dtype=object)
+
         # Return merged new df.
         return n_df
+
+    def _hashable_value(self, value):
+        '''Returns value as hashable, lists as tuples and nan as equal.'''
+        if isinstance(value, list):
+            return tuple(self._hashable_value(v) for v in value)
+        if isinstance(value, float) and value != value:
+            return NAN_KEY
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return repr(value)
+
+    def _unwrap_value(self, value):
+        '''Returns first value if value is list.'''
+        if isinstance(value, list):
+            return value[0]
+        return value
     
     def find_dataset_match(self, dataset, n_matches=1, accuray_matches=0.4):
         ''' Finds closest match in avaialable api_requests, returns match.
@@ -879,15 +1120,14 @@ class EntsoeTransparencyClient():
         #fix remove spaces and set all capital letters to lower
         dataset_lower = dataset.replace(' ','_')
         dataset_lower = dataset.lower()
-        datasets_list = list(self.datasets['names'])
-        datasets_list_lower = [each_string.lower() for each_string in datasets_list]
+        matcher = self._get_matcher('datasets', self.datasets['names'])
 
         #make search for request match in available requests
-        match = difflib.get_close_matches(dataset_lower, datasets_list_lower, n=n_matches, cutoff=accuray_matches)
+        match = matcher.get_close_matches(dataset_lower, n=n_matches, cutoff=accuray_matches)
 
         # if match: return single match or list of mupltiple matches, else: return None
         if len(match) == 1:
-            return datasets_list[datasets_list_lower.index(match[0])]
+            return matcher.original(match[0])
         elif len(match) > 1:
             return match
         else:
@@ -895,36 +1135,118 @@ class EntsoeTransparencyClient():
     
     def _remap_codes2meanings(self, code, name):
         '''Remaps codes to meanings'''
-    
-        # Set initialy meaning as code
-        meaning = code
-    
+
+        # If no code, nothing to remap.
+        if code is None:
+            return code
+
+        # Look up meaning in tag name parameter types, keep code if not found.
+        return self._get_tag_lookup(name).get(str(code).lower(), code)
+
+    def _reset_lookups(self):
+        '''Clears code to meaning lookups and close-matchers, rebuilt from present statics on next use.'''
+        self._parameters_lookups = None
+        self._tag_lookups = {}
+        self._matchers = {}
+
+    def _get_matcher(self, key, candidates):
+        '''Returns close-matcher of candidates, created once per key until statics are changed.'''
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = self._matchers[key] = CloseMatcher(candidates)
+        return matcher
+
+    def _get_parameters_lookups(self):
+        '''Returns dict of parameter types lookups, of lowered codes and meanings to meanings.'''
+
+        # Build lookups once from parameters.
+        lookups = self._parameters_lookups
+        if lookups is None:
+            lookups = {}
+            for paramtype, codes in self.parameters.items():
+
+                # Meanings maps to themselves, codes to meanings.
+                lookup = {str(meaning).lower(): meaning for meaning in codes.values()}
+                lookup.update({str(code).lower(): meaning for code, meaning in codes.items()})
+                lookups[paramtype] = lookup
+            self._parameters_lookups = lookups
+
+        return lookups
+
+    def _get_tag_lookup(self, name):
+        '''
+        Returns dict of lowered codes to meanings for tag name, cached by name.
+        Parameter types with fixed name in tag name are used, later types overriding earlier,
+        last type (Areas) is used for tag names with 'domain'.
+        '''
+
+        # Return cached lookup.
+        lookup = self._tag_lookups.get(name)
+        if lookup is not None:
+            return lookup
+
         # Get list of parameters and fix.
         param_list = list(self.parameters.keys())
-        param_list.pop(-1)
-        param_list.append('domain')
+        param_names = [paramtype.lower().replace('.','').replace('_','') for paramtype in param_list]
+        param_names[-1] = 'domain'
 
-        # Loop on list idx.
-        for idx in range(len(param_list)):
-        
-            # If fixed param name in value name.
-            if param_list[idx].lower().replace('.','').replace('_','') in name:
-            
-             # Get parameter type
-                paratype = list(self.parameters.keys())[idx]
+        # Combine lookups of parameter types in tag name.
+        lookups = self._get_parameters_lookups()
+        lookup = {}
+        for paramtype, param_name in zip(param_list, param_names):
+            if param_name in str(name):
+                lookup.update(lookups[paramtype])
 
-                # Look for remapped value.
-                meaning_code = self.find_parameters_match(code, paratype)
-            
-                # If found, set at meaning.
-                if meaning_code[0] is not None:
-                    meaning = meaning_code[0]
-    
-        # Return meaning.
-        return meaning
+        self._tag_lookups[name] = lookup
+        return lookup
+
+    def _remap_df_codes2meanings(self, df, skip_columns=['quantity', 'position', 'timestamp', 'start', 'end', 'resolution', 'reason']):
+        '''Remaps codes to meanings in df columns, by lookups of column names as tag names.'''
+
+        # Loop on columns, skipping measured data and numeric columns.
+        for column in df.columns:
+            if column in skip_columns or pd.api.types.is_numeric_dtype(df[column].dtype):
+                continue
+
+            # If no parameter types for column, nothing to remap.
+            lookup = self._get_tag_lookup(column)
+            if len(lookup) == 0:
+                continue
+
+            df[column] = self._map_series_lookup(df[column], lookup)
+
+        return df
+
+    def _map_series_lookup(self, series, lookup):
+        '''Returns series with values found in lookup by lowered value mapped, categoricals and lists in cells mapped by values.'''
+
+        # Categorical, map categories and recode.
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = self._map_series_lookup(pd.Series(series.cat.categories, dtype=object), lookup)
+            cat_codes, uniques = pd.factorize(categories)
+            codes = series.cat.codes.values
+            codes = np.where(codes < 0, -1, cat_codes[codes])
+            return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=series.index, name=series.name)
+
+        # Map string values.
+        values = series.to_numpy(dtype=object, copy=True)
+        is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+        if is_str.any():
+            mapped = pd.Series(values[is_str], dtype=object).str.lower().map(lookup)
+            values[is_str] = np.where(mapped.isna().values, values[is_str], mapped.values)
+
+        # Map values of lists in cells, exploded and regrouped.
+        list_idx = [idx for idx, v in enumerate(values) if isinstance(v, list) and len(v) > 0]
+        if len(list_idx) > 0:
+            exploded = pd.Series([values[idx] for idx in list_idx], dtype=object).explode()
+            grouped = self._map_series_lookup(exploded, lookup).groupby(level=0, sort=True).agg(list)
+            for idx, cell in zip(list_idx, grouped.tolist()):
+                values[idx] = cell
+
+        return pd.Series(values, index=series.index, name=series.name, dtype=object)
     
-    def _response_xml_to_df(self, response, docnames=['type', 'created', 'domain'], tagsnames=['domain', 'resource', 'type', 'start', 'end', 'resolution', 'quantity', 'amount', 'name', 'voltage', 'nominalp']):
-        '''Create dataframe from response'''
+    def _response_xml_to_df(self, response, docnames=['type', 'created', 'domain'], tagsnames=['domain', 'resource', 'type', 'start', 'end', 'resolution', 'quantity', 'amount', 'name', 'voltage', 'nominalp'], parser='lxml', long_format=False):
+        '''Create dataframe from response, streaming with lxml or with parser='bs4' from BeautifulSoup. If long_format, one row per point.'''
     
         
         # Create dataframe for storing response content.
@@ -935,7 +1257,17 @@ class EntsoeTransparencyClient():
 
             # Extract response content.
             response = response.content
-        
+
+        # Parse one row per point, with timestamps, then remap codes by columns.
+        if long_format:
+            return self._remap_df_codes2meanings(parse_response_xml_long(response, docnames=docnames, tagsnames=tagsnames))
+
+        # Parse with streaming parser, then remap codes by columns, if not xml use soup.
+        if parser == 'lxml':
+            try:
+                return self._remap_df_codes2meanings(parse_response_xml(response, docnames=docnames, tagsnames=tagsnames))
+            except etree.XMLSyntaxError:
+                None
         
         # Make soup
         soup = bs4.BeautifulSoup(response,'lxml')
@@ -1002,9 +1334,6 @@ class EntsoeTransparencyClient():
         Output: start_dt, end_dt, ts_dt
         '''
     
-        # Create list for storing timestamps
-        ts = []
-    
         # Ensure start, end as datetime.
         start = self._datetimestr2dt(start)
         end = self._datetimestr2dt(end)            
@@ -1012,24 +1341,90 @@ class EntsoeTransparencyClient():
         # Calculate quantitys timedeltas
         td = (end - start) / len(quantitys)
     
-        # Loop on quantities to add timestamps to list.
-        for idx in range(len(quantitys)):
-        
-            # If not first timestamp.
-            if len(ts) > 0:
-            
-                # Append last timestamp + timedelta.
-                ts.append(ts[-1] + td)
-            
-            # Else if first timestamp.
-            else:
-            
-                # Append start as first timestamp.
-                ts.append(start)
+        # Timestamps as start + idx * timedelta.
+        ts = [start + td * idx for idx in range(len(quantitys))]
             
         # Return list of timestamps.
         return start, end, ts
 
+    def _seq2sets_timestamps(self, start, end, quantitys):
+        '''Returns quantitys timestamps of _seq2sets, or empty string if not valid.'''
+
+        # If quantity is not np.na
+        try:
+            if isinstance(quantitys, list) or isinstance(quantitys, int):
+                return self._seq2sets(start, end, quantitys)[2]
+        except(ValueError, TypeError):
+            None
+        return ''
+
+    def _fix_long_format_df(self, df):
+        '''Returns long format response df with timestamps as index, bad responses in df.attrs['bad_responses'].'''
+
+        # If no responses.
+        if len(df) == 0 or 'reason' not in df.columns:
+            return pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC', name='timestamp'))
+
+        # Split bad and good responses.
+        bad = df['reason'].fillna('').astype(str).str.len().values > 0
+        bad_df = df.loc[bad, ['dataset', 'parameters', 'reason']].reset_index(drop=True)
+        good_df = df.loc[~bad].drop(columns=['success', 'reason'])
+
+        # Set point timestamps as index.
+        if 'timestamp' in good_df.columns:
+            good_df = good_df.set_index('timestamp')
+        else:
+            good_df = good_df.set_index(pd.DatetimeIndex([pd.NaT] * len(good_df), tz='UTC', name='timestamp'))
+
+        # Repeated strings as categoricals, responses categories differ when combined.
+        for col in good_df.columns:
+            if good_df[col].dtype == object:
+                good_df[col] = good_df[col].astype('category')
+
+        good_df.attrs['bad_responses'] = bad_df
+
+        return good_df
+
+    def _fix_wide_format_df(self, df):
+        '''Returns responses df merged to one row per TimeSeries, with all bad responses combined in first row, and timestamps added.'''
+
+        # Create dataframe for storing fixed df response.
+        df_fix = pd.DataFrame()
+
+        # Combine all bad_responses into one row in dataframe.
+        bad_df = df[df['reason'].apply(lambda x: len(str(x)) != 0)]
+
+        # If there was any bad responses.
+        if len(bad_df) > 0:
+
+            # Append as first row to df_fixed
+            bad_d = {}
+            bad_d['dataset'] = bad_df['dataset'].values.tolist()
+            bad_d['success'] = bad_df['success'].values.tolist()
+            bad_d['parameters'] = bad_df['parameters'].values.tolist()
+            bad_d['reason'] = bad_df['reason'].values.tolist()
+            df_fix = df_fix.append(pd.DataFrame([bad_d])).reset_index(drop=True)
+        
+        # Extract good responses.
+        good_df = df[df['reason'].apply(lambda x: len(str(x)) == 0)]
+
+        # Combine rows 'quantity', 'start' and 'end' if rest is equal.
+        good_df_fix = self._merge_extend_equal_rows(good_df, extends=['parameters', 'createddatetime', 'quantity', 'start', 'end'])
+        
+        # Append good_df to fixed df.
+        df_fix = df_fix.append(good_df_fix).reset_index(drop=True)
+
+        # Unpack single values wrapped in lists.
+        for col in df_fix.columns:
+            df_fix[col] = [x[0] if isinstance(x,list) and len(x) == 1 else x for x in df_fix[col]]
+
+        # Fix timestring to datetime and add timestamps
+        if 'start' in df_fix.columns and 'end' in df_fix.columns and 'quantity' in df_fix.columns:
+            df_fix['timestamp'] = [self._seq2sets_timestamps(start, end, quantity) for start, end, quantity in zip(df_fix['start'], df_fix['end'], df_fix['quantity'])]
+        
+        # Return fixed df.
+        return df_fix
+
     def _datetimestr2dt(self, timestr, dtformat='%Y-%m-%dT%H:%MZ'):
         '''If datetimestring, return as datetime.'''
 
@@ -1079,103 +1474,84 @@ class EntsoeTransparencyClient():
     #######################
 
     def _ensure_from_to_all(self, mandatorys_dict, from_to_codes):
-        '''Adds all available areas in (from, to) and (to, from) if from is not spesified.'''
-
-        from_to_fix = []
-        
-        #if isinstance(from_to_codes, str):
-            #from_to_codes = [(from_to_codes, None)]
-        #elif isinstance(from_to_codes, tuple):
-            #from_to_codes = [from_to_codes]
-        
-        # If input from_to_codes is list.
-        if isinstance(from_to_codes, list):
-
-            # If first value is not list or tuple.
-            if isinstance(from_to_codes[0], list) is False and isinstance(from_to_codes[0], tuple) is False:
-
-                # Wrap all single values in list as from_area in list tuple.
-                l = []
-                for a in from_to_codes:
-                    l.append((a, None))
-                from_to_codes = l
-        
-
-        
-        
-        
-        # Loop on mandatory parameters names.
-        for m in list(mandatorys_dict.keys()):
-            k = m.lower()
-
-            # If to_area is part of mandatory parameters.
-            if 'out_domain' in k or 'acquiring' in k:
-                    
-                # Loop on spesified from_to_codes.
-                for idx in range(len(from_to_codes)):
-
-                    # If a to_area is not spesified.
-                    if from_to_codes[idx][-1] is None or len(from_to_codes[idx][-1]) == 0:
-
-                        # Store this from_code:
-                        from_code = from_to_codes[idx][0]
-
-                        # Pop old instance
-                        #from_to_codes.pop(idx-1)
+        '''
+        Adds (from, to) and (to, from) of neighbouring areas if to is not spesified, and (to, from) of spesified (from, to).
 
-                        # Get list of all available area codes.
-                        all_to_codes = [x for x in list(self.parameters['Areas'].keys()) if x != from_code]
+        :Explained:
+            -Topology: Neighbouring areas share a border, a line or a cable, see .get_border_graph().
+             If topology of from area is not known, or it has no neighbours, all available areas are added.
+             Areas without geometry have unknown topology and are always added.
+            -Stats: Number of pairs and pairs avoided compared to all available areas are in .from_to_stats.
+        '''
 
-                        # Create list for storing new combinations.
-                        nlist = []
+        # Wrap single values as (from, None), input list is not modified.
+        from_to_codes = [tuple(x) if isinstance(x, (list, tuple)) else (x, None) for x in from_to_codes]
 
-                        # Extend list with all combinations of from_to and to_from.
-                        nlist.extend([[from_code, x] for x in all_to_codes])
-                        nlist.extend([[x, from_code] for x in all_to_codes])
+        # If to_area is part of mandatory parameters.
+        has_to_area = any('out_domain' in m.lower() or 'acquiring' in m.lower() for m in mandatorys_dict.keys())
+        if not has_to_area:
+            self.from_to_stats = {'pairs': len(set(from_to_codes)), 'pairs_all_areas': len(set(from_to_codes)), 'pairs_avoided': 0}
+            return list(dict.fromkeys(from_to_codes))
 
-                        # Insert all new combinations into main list. 
-                        [from_to_codes.append(x) for x in nlist]
+        # All available area codes.
+        all_codes = list(self.parameters['Areas'].keys())
 
-                    # Else (from, to) is spesified.
-                    else:
-                        
-                        # If not (to, from) is spesified.
-                        from_to = [from_to_codes[idx][-1], from_to_codes[idx][0]]
-                        if from_to not in from_to_codes:
+        # Pairs in order, de-duplicated by set, and pairs if expanding to all available areas.
+        res = []
+        seen = set()
+        all_pairs = set()
+        def add(pair):
+            if pair not in seen:
+                seen.add(pair)
+                res.append(pair)
+
+        # Loop on spesified from_to_codes.
+        for from_to_code in from_to_codes:
+            from_code, to_code = from_to_code[0], from_to_code[-1]
+
+            # If a to_area is not spesified, add neighbouring areas in both directions.
+            if to_code is None or len(to_code) == 0:
+                neighbours = self.border_graph.neighbours(from_code)
+
+                # If topology is not known or no neighbours, all available areas.
+                if not neighbours:
+                    to_codes = [x for x in all_codes if x != from_code]
+
+                # Else neighbours, and areas of unknown topology.
+                else:
+                    to_codes = [x for x in all_codes if x != from_code and (x in neighbours or self.border_graph.neighbours(x) is None)]
 
-                            # Insert after (to, from) in list.
-                            from_to_codes.insert((idx+1), from_to)
+                for x in to_codes:
+                    add((from_code, x))
+                for x in to_codes:
+                    add((x, from_code))
 
-           # else:
+                # Pairs of all available areas, for stats.
+                all_pairs.update((from_code, x) for x in all_codes if x != from_code)
+                all_pairs.update((x, from_code) for x in all_codes if x != from_code)
 
-        # Else not list in input:
-        #else:
+            # Else (from, to) is spesified, add (to, from).
+            else:
+                add((from_code, to_code))
+                add((to_code, from_code))
+                all_pairs.update([(from_code, to_code), (to_code, from_code)])
 
-        # remove possible duplicates in list.
-        #from_to_codes = list(dict.fromkeys(from_to_codes))
-        res = []
-        for i in from_to_codes:
-            if i not in res:
-                res.append(i)
-        from_to_codes = res
+        # Store stats of avoided pairs.
+        self.from_to_stats = {'pairs': len(res), 'pairs_all_areas': len(all_pairs), 'pairs_avoided': len(all_pairs) - len(res)}
 
-        # Ensure (from, to) and (to, from)
-        
-        return from_to_codes
+        return res
 
 
-    def _request_data(self, datasets, from_to_codes, start_end_times, msg):
-        '''Requesting data'''
+    def _build_requests_list(self, datasets, from_to_codes, start_end_times):
+        '''Returns list of (dataset, mandatorys_dict, from_to_code, start_end_time) requests, in order of datasets, from_to_codes and start_end_times.'''
 
-        response = {}
+        # Create list of all requests.
+        requests_list = []
+        requests_avoided = 0
 
-        # Create dataframe for storing dataset total data response.
-        df = pd.DataFrame()
-        
         # Loop on datasets:
         for dataset in datasets:
 
-
             # Get requesting dataset url parameters.
             mandatorys_dict = self._get_dataset_mandatorys_dict(dataset=dataset)
         
@@ -1183,150 +1559,271 @@ class EntsoeTransparencyClient():
             # Adds (from, to) and (to, from) for that are to all available areas.
             from_to_codes_fix = self._ensure_from_to_all(mandatorys_dict, from_to_codes)
 
-            
+            # Split timeperiods in max timeperiods allowed for dataset.
+            start_end_times_split = [se for start_end_time in start_end_times for se in self.request_planner.split(dataset, start_end_time[0], start_end_time[-1])]
 
-            # Loop on from_to_areas_list
+            # Add request for each from_to_code and start_end_time.
             for from_to_code in from_to_codes_fix:
+                for start_end_time in start_end_times_split:
+                    requests_list.append((dataset, mandatorys_dict, from_to_code, start_end_time))
 
+            # Count requests avoided by area topology.
+            requests_avoided += self.from_to_stats['pairs_avoided'] * len(start_end_times_split)
 
-                # Assume start_end_time is ok.
-                bad_start_end_flag = True
-                w = 0
-                while bad_start_end_flag and w < 2:
-                    w += 1
+        # Store stats of requests.
+        self.requests_stats = {'requests': len(requests_list), 'requests_avoided': requests_avoided}
 
-                
-                    # Loop on start_end_times_list.
-                    for start_end_time in start_end_times:
+        return requests_list
 
-                        # While not error in response:
-                    
-                        if 'print' in msg:
-                            # Making request
-                            print('\n********************************')
-                            print('REQUEST:')
-                            print(f'dataset = "{dataset}"')
-                            print(f'from_to = {from_to_code}')
-                            print(f'start_end = {start_end_time}')
-                        
-        
-                        parameters_dict = self._fill_mandatory_parameters_dict(mandatorys_dict, from_to_code, start_end_time)
+    def _request_data(self, datasets, from_to_codes, start_end_times, msg, max_workers=None, long_format=False):
+        '''Requesting data, dispatching the requests concurrently, returned in request order.'''
 
+        # Create list of all requests, in order of datasets, from_to_codes and start_end_times.
+        requests_list = self._build_requests_list(datasets, from_to_codes, start_end_times)
 
-                        response, url = self._call_api(parameters_dict=parameters_dict)
-
-                        if 'url' in msg:
-                                print(f'url = {url}')
-                    
-                    
-                        # Try if response is zipfile.
-                        zipfileflag = False
-                        try:
-                            # Create zipfile.
-                            zipf = zipfile.ZipFile(io.BytesIO(response.content))
-
-                            # If try success, set zipfile flag true.
-                            zipfileflag = True
-                        
-                            # Parse content in zipfile into df.
-                            df1 = self._zipfile2df(zipf)
-
-                            # Add dataset name to response.
-                            df1.insert(0, 'dataset', dataset)
-                            df1.insert(1, 'success', True)
-                            df1.insert(2, 'parameters', str(parameters_dict))
-                            if 'reason' not in df1.columns:
-                                df1.insert(3, 'reason', '')
-                        
-                        # Except error if not zipfile.
-                        except (zipfile.BadZipFile):
-                            None
-        
-                        # If bad response with reason text.
-                        if 'text' in response.text and not zipfileflag:
-                            reason_str = bs4.BeautifulSoup(response.content, 'lxml').find('text').string
-                        
-                            # Print msg.
-                            if 'print' in msg:
-                                print("RESPONSE:")
-                                #print('status = ERROR, bad request.')
-                                print(f'reason = {reason_str}')
-                                #print(f'url = {url}')
+        # If no requests, return empty df.
+        if len(requests_list) == 0:
+            return pd.DataFrame()
 
-                                
-                                # If spesified query days max in reason.
-                                if 'allowed: ' in reason_str:
-                                    val_unit = reason_str.split('allowed: ')[-1].split(',')[0].split(' ')
-                                    print(f'ALLOWED: {val_unit[0]} in unit {val_unit[-1]}')
+        # Set number of concurrent requests.
+        if max_workers is None:
+            max_workers = self.max_workers
+        max_workers = max(1, min(max_workers, len(requests_list)))
 
-                                    start = datetime.datetime.strptime(start_end_time[0], '%Y%m%d%H%M')
-                                    end = datetime.datetime.strptime(start_end_time[-1], '%Y%m%d%H%M')
+        # Dispatch requests on thread pool, rate of calls is paced in _call_api.
+        # executor.map returns responses in order of requests_list.
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='entsoe-request') as executor:
+            df_list = list(executor.map(lambda r: self._request_single(*r, msg=msg, long_format=long_format), requests_list))
 
-                                    new_start_end = []
-                                    while start < end:
+        # Combine all responses into one df.
+        df = pd.concat(df_list).reset_index(drop=True)
 
-                                        start_str = start.strftime('%Y%m%d%H%M')
+        # Return requested data.
+        return df
 
-                                        start = start+datetime.timedelta(days=1)
+    def _iter_requests(self, requests_list, msg, max_workers=None, long_format=False):
+        '''Yields response df of each request in request order, as soon as parsed, with at most 2 * max_workers responses held.'''
+
+        # Set number of concurrent requests.
+        if max_workers is None:
+            max_workers = self.max_workers
+        max_workers = max(1, min(max_workers, len(requests_list)))
+
+        # Dispatch requests on thread pool, keeping a bounded window of requests in flight.
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='entsoe-iter') as executor:
+            pending = deque()
+            requests_iter = iter(requests_list)
+            for request in requests_iter:
+                pending.append(executor.submit(self._request_single, *request, msg=msg, long_format=long_format))
+                if len(pending) >= 2 * max_workers:
+                    break
 
-                                        end_str = (start).strftime('%Y%m%d%H%M')
+            # Yield first pending response, then dispatch next request.
+            try:
+                while len(pending) > 0:
+                    df = pending.popleft().result()
+                    request = next(requests_iter, None)
+                    if request is not None:
+                        pending.append(executor.submit(self._request_single, *request, msg=msg, long_format=long_format))
+                    yield df
 
-                                        new_start_end.append((start_str, end_str))
+            # If generator is closed early, cancel requests not started.
+            finally:
+                for future in pending:
+                    future.cancel()
 
-                                    start_end_times = new_start_end
+    def _sync_data(self, datasets, from_to_codes, start_end_times, msg, max_workers=None):
+        '''Requesting timeperiods missing in .data_store, storing responses, returns all requested data from store in long format.'''
 
+        store = self.data_store
 
+        # Create list of requests of missing timeperiods, and list of stored data to return.
+        requests_list = []
+        stored_list = []
 
+        # Loop on datasets:
+        for dataset in datasets:
 
-                                    break
-                                else:
-                                    bad_start_end_flag = False
+            # Get requesting dataset url parameters, and all (from, to) of requests.
+            mandatorys_dict = self._get_dataset_mandatorys_dict(dataset=dataset)
+            from_to_codes_fix = self._ensure_from_to_all(mandatorys_dict, from_to_codes)
 
-                            # Try to fix new request from bad response reason.
-                            fix_msg = self._reason_fix_request(reason_str) #TODO: not implemented.
+            # Add request for each timeperiod missing in store.
+            for from_to_code in from_to_codes_fix:
+                for start_end_time in start_end_times:
+                    stored = (dataset, from_to_code[0], from_to_code[-1], start_end_time[0], start_end_time[-1])
+                    if stored not in stored_list:
+                        stored_list.append(stored)
+                    for gap in store.find_request_gaps(*stored):
+                        for start_end_time_split in self.request_planner.split(dataset, gap[0], gap[-1]):
+                            requests_list.append((dataset, mandatorys_dict, from_to_code, start_end_time_split))
+
+        # Dispatch requests on thread pool, storing responses as they are parsed.
+        bad_list = []
+        if len(requests_list) > 0:
+            if max_workers is None:
+                max_workers = self.max_workers
+            max_workers = max(1, min(max_workers, len(requests_list)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='entsoe-sync') as executor:
+                bad_list = list(executor.map(lambda r: self._sync_single(*r, msg=msg), requests_list))
+
+        # Read requested data from store.
+        df_list = []
+        for dataset, in_code, out_code, start, end in stored_list:
+            df = store.read_points(dataset, in_code, out_code, start, end)
+            if len(df) > 0:
+                df.insert(1, 'success', True)
+                df.insert(3, 'reason', '')
+                df_list.append(df)
+
+        # Combine stored data and bad responses.
+        df_list.extend([df for df in bad_list if len(df) > 0])
+        if len(df_list) == 0:
+            return pd.DataFrame()
+        return pd.concat(df_list, ignore_index=True)
+
+    def _sync_single(self, dataset, mandatorys_dict, from_to_code, start_end_time, msg):
+        '''Requesting single missing timeperiod, storing good response points in .data_store, returns bad responses.'''
+
+        # Request in long format.
+        df = self._request_single(dataset, mandatorys_dict, from_to_code, start_end_time, msg, long_format=True)
+
+        # Split bad and good responses.
+        bad = df['reason'].fillna('').astype(str).str.len().values > 0 if 'reason' in df.columns else np.zeros(len(df), dtype=bool)
+        bad_df = df.loc[bad, ['dataset', 'success', 'parameters', 'reason']].reset_index(drop=True)
+
+        # Timeperiod is covered if all bad responses only tells there is no data,
+        # and there are good points or a response telling there is no data.
+        empty = [any(r in str(reason) for r in DATA_STORE_EMPTY_REASONS) for reason in bad_df['reason']]
+        covered = all(empty) and (np.any(~bad) or any(empty))
+
+        # Store good response points.
+        self.data_store.append_points(dataset, from_to_code[0], from_to_code[-1], df.loc[~bad], start_end_time[0], start_end_time[-1], covered=covered)
+
+        # Return bad responses, excluding no data responses of covered timeperiods.
+        return bad_df if not covered else bad_df.iloc[0:0]
+
+    def _request_single(self, dataset, mandatorys_dict, from_to_code, start_end_time, msg, split_allowed=True, long_format=False):
+        '''Requesting data for single dataset, from_to_code and start_end_time, returns response as df, if long_format one row per point.'''
+
+        # Collect printout lines, printed at once as requests run concurrently.
+        lines = []
+
+        if 'print' in msg:
+            # Making request
+            lines.append('\n********************************')
+            lines.append('REQUEST:')
+            lines.append(f'dataset = "{dataset}"')
+            lines.append(f'from_to = {from_to_code}')
+            lines.append(f'start_end = {start_end_time}')
+
+        # Fill copy of mandatorys, the dict is shared by requests of the same dataset.
+        parameters_dict = self._fill_mandatory_parameters_dict(dict(mandatorys_dict), from_to_code, start_end_time)
+
+        response, url, cached = self._get_response(dataset, parameters_dict)
+
+        if 'url' in msg:
+            lines.append(f'url = {url}')
+        if 'print' in msg and cached:
+            lines.append('cached = True')
+
+        # Try if response is zipfile.
+        zipfileflag = False
+        try:
+            # Create zipfile, reading members from response bytes.
+            zipf = open_zip(response.content)
+            if zipf is None:
+                raise zipfile.BadZipFile
+
+            # If try success, set zipfile flag true.
+            zipfileflag = True
+        
+            # Parse content in zipfile into df.
+            df1 = self._zipfile2df(response.content, long_format=long_format)
+            if 'print' in msg:
+                lines.append(f"zipfile = {df1.attrs['parse_files']} files parsed in {df1.attrs['parse_seconds']:.3f}s, slowest {df1.attrs['parse_max_seconds']:.3f}s")
+
+            # Add dataset name to response.
+            df1.insert(0, 'dataset', dataset)
+            df1.insert(1, 'success', True)
+            df1.insert(2, 'parameters', str(parameters_dict))
+            if 'reason' not in df1.columns:
+                df1.insert(3, 'reason', '')
+        
+        # Except error if not zipfile.
+        except (zipfile.BadZipFile):
+            None
+
+        # Reason of bad response, from acknowledgement document text, else from http status of bad response.
+        reason_str = None
+        if 'text' in response.text and not zipfileflag:
+            reason_tag = bs4.BeautifulSoup(response.content, 'lxml').find('text')
+            reason_str = reason_tag.string if reason_tag is not None else None
+        if reason_str is None and not response.ok and not zipfileflag:
+            reason_str = f'Bad response, HTTP status {response.status_code}: {response.text[:200]}'
+
+        # If bad response with reason text.
+        if reason_str is not None:
+        
+            # Print msg.
+            if 'print' in msg:
+                lines.append("RESPONSE:")
+                lines.append(f'reason = {reason_str}')
 
+            # Try to fix new request from bad response reason, learning max timeperiod of dataset.
+            allowed_span = self._reason_fix_request(reason_str, dataset=dataset)
 
-                            # Add dataset name and reason to parameters_dict
-                            d = {}
-                            d['dataset'] = dataset
-                            d['success'] = False
-                            d['parameters'] = str(parameters_dict)
-                            d['reason'] = reason_str
+            # If spesified max timeperiod in reason, re-request timeperiod in max timeperiod parts, one day if not parsed.
+            if 'allowed: ' in reason_str and split_allowed:
+                if allowed_span is None:
+                    allowed_span = (1, 'day')
+                if 'print' in msg:
+                    lines.append(f'ALLOWED: {allowed_span[0]} in unit {allowed_span[-1]}')
+                    lines.append('**********************************')
+                    print('\n'.join(lines))
 
+                new_start_end = self.request_planner.split(dataset, start_end_time[0], start_end_time[-1], span=allowed_span)
 
-                            # Make this the bad response dataframe.
-                            df1 = pd.DataFrame([d])
+                # Request the parts, without splitting again.
+                df_list = [self._request_single(dataset, mandatorys_dict, from_to_code, se, msg, split_allowed=False, long_format=long_format) for se in new_start_end]
+                return pd.concat(df_list).reset_index(drop=True)
 
-                        # Else good response.
-                        elif not zipfileflag:
+            # Add dataset name and reason to parameters_dict
+            d = {}
+            d['dataset'] = dataset
+            d['success'] = False
+            d['parameters'] = str(parameters_dict)
+            d['reason'] = reason_str
 
-                            # Create dataframe from this response.
-                            df1 = self._response_xml_to_df(response)
+            # Make this the bad response dataframe.
+            df1 = pd.DataFrame([d])
 
-                            # Add dataset name to response.
-                            df1.insert(0, 'dataset', dataset)
-                            df1.insert(1, 'success', True)
-                            df1.insert(2, 'parameters', str(parameters_dict))
-                            if 'reason' not in df1.columns:
-                                df1.insert(3, 'reason', '')
+        # Else good response.
+        elif not zipfileflag:
 
+            # Create dataframe from this response.
+            df1 = self._response_xml_to_df(response, long_format=long_format)
 
-                        if 'print' in msg:
-                            print('**********************************')
+            # Add dataset name to response.
+            df1.insert(0, 'dataset', dataset)
+            df1.insert(1, 'success', True)
+            df1.insert(2, 'parameters', str(parameters_dict))
+            if 'reason' not in df1.columns:
+                df1.insert(3, 'reason', '')
 
-                        # Append this dataframe response dataframe to total dataframe.
-                        df = df.append(df1).reset_index(drop=True)
-        
+        if 'print' in msg:
+            lines.append('**********************************')
+            print('\n'.join(lines))
 
-        # Return requested data.
-        return df
+        # Return this response dataframe.
+        return df1
     
 
     def set_apikey(self, api_key):
         '''Setting entsoe-t api_key'''
         self.api_key = api_key
 
-    def get_data(self, dataset, from_to, start_end=None, msg=['print']):
+    def get_data(self, dataset, from_to, start_end=None, msg=['print'], max_workers=None, long_format=False, sync=False):
         '''
         Main frontend function for getting data from Entsoe-t platform.
         
@@ -1334,9 +1831,14 @@ class EntsoeTransparencyClient():
             -dataset: Name of dataset. Name is "close-matched" against list of available datasets in .datasets['names']
             -from_to: ('from_area', 'to_area') in request. "Close-matched" against available areas in .parameters['Areas']
             -start_stop: ('start_time','end_time') "format=yyyyddmmHHMM" in request.
+            -max_workers: Max number of concurrent requests, default .max_workers.
+            -long_format: If True, one row per point with DatetimeIndex of point timestamps.
+            -sync: If True, requests only timeperiods missing in local .data_store, and returns requested data
+             from the store in long format. Timeperiods older than .data_store.settled_after are never requested again.
         
         :Outputs:
             -df: Response content in pandas.DataFrame.
+             If long_format, bad responses are in df.attrs['bad_responses'].
 
         :Info:
             -
@@ -1369,55 +1871,104 @@ class EntsoeTransparencyClient():
                 return None
 
         
-        # Requesting data.
-        df = self._request_data(datasets_fix, from_to_codes_fix, start_end_times_fix, msg=msg)
+        # If sync, requesting missing data and returning points from local store.
+        if sync:
+            df = self._sync_data(datasets_fix, from_to_codes_fix, start_end_times_fix, msg=msg, max_workers=max_workers)
+            return self._fix_long_format_df(df)
 
+        # Requesting data.
+        df = self._request_data(datasets_fix, from_to_codes_fix, start_end_times_fix, msg=msg, max_workers=max_workers, long_format=long_format)
 
-        # Create dataframe for storing fixed df response.
-        df_fix = pd.DataFrame()
+        # Print requests avoided by area topology.
+        if 'print' in msg and self.requests_stats.get('requests_avoided', 0) > 0:
+            print(f"Requested {self.requests_stats['requests']} neighbouring area pairs and timeperiods, avoided {self.requests_stats['requests_avoided']} requests to non-neighbouring areas.")
 
-        # Combine all bad_responses into one row in dataframe.
-        bad_df = df[df['reason'].apply(lambda x: len(str(x)) != 0)]
+        # If long format, return points with timestamps as index.
+        if long_format:
+            return self._fix_long_format_df(df)
 
-        # If there was any bad responses.
-        if len(bad_df) > 0:
 
-            # Append as first row to df_fixed
-            bad_d = {}
-            bad_d['dataset'] = bad_df['dataset'].values.tolist()
-            bad_d['success'] = bad_df['success'].values.tolist()
-            bad_d['parameters'] = bad_df['parameters'].values.tolist()
-            bad_d['reason'] = bad_df['reason'].values.tolist()
-            df_fix = df_fix.append(pd.DataFrame([bad_d])).reset_index(drop=True)
+        # Merge responses, one row per TimeSeries with bad responses in first row.
+        return self._fix_wide_format_df(df)
         
-        # Extract good responses.
-        good_df = df[df['reason'].apply(lambda x: len(str(x)) == 0)]
+    def iter_data(self, dataset, from_to, start_end=None, msg=[], max_workers=None, long_format=True, sink=None):
+        '''
+        Generator of data from Entsoe-t platform, yielding each response as soon as parsed, in request order.
 
-        # Combine rows 'quantity', 'start' and 'end' if rest is equal.
-        good_df_fix = self._merge_extend_equal_rows(good_df, extends=['parameters', 'createddatetime', 'quantity', 'start', 'end'])
-        
-        # Append good_df to fixed df.
-        df_fix = df_fix.append(good_df_fix).reset_index(drop=True)
+        :Inputs:
+            -dataset, from_to, start_end, max_workers: As in .get_data().
+            -long_format: If True, yields one row per point with DatetimeIndex of point timestamps,
+             bad responses in df.attrs['bad_responses']. Else one row per TimeSeries as .get_data().
+            -sink: Csv or parquet filepath, or sink object with .write(df), written with each yielded df.
+             Filepath sinks are closed when the generator is finished.
 
-        # Unpack single values wrapped in lists.
-        for col in df_fix.columns:
-            df_fix[col] = [x[0] if isinstance(x,list) and len(x) == 1 else x for x in df_fix[col]]
+        :Outputs:
+            -df: Normalized DataFrame of each request.
 
-        # Fix timestring to datetime and add timestamps
-        if 'start' in df_fix.columns and 'end' in df_fix.columns and 'quantity' in df_fix.columns:
-            df_fix['timestamp'] = ''
-            for idx, row in df_fix.iterrows():
+        :Explained:
+            At most 2 * max_workers parsed responses are held, so arbitrarily long timeperiods are requested in bounded memory.
+            Use as: for df in client.iter_data(...): ...
+        '''
+
+        # Check if api_key is missing.
+        if self.api_key is None:
+            print('ERROR: api_key is missing. Set api_key as input to module or by function .set_apikey(api_key).')
+            return
+
+        # Finds dataset match in datasets, area match in parameters and fix time formats.
+        datasets_fix, from_to_areas_fix, from_to_codes_fix, start_end_times_fix = self._fix_get_inputs(dataset, from_to, start_end)
+
+        # If a dataset is None.
+        if any(dset is None for dset in datasets_fix):
+            print(f'ERROR:\n No matching datasets found for input "{dataset}"')
+            return
+
+        # Create requests, planned in allowed timeperiods.
+        requests_list = self._build_requests_list(datasets_fix, from_to_codes_fix, start_end_times_fix)
+        if len(requests_list) == 0:
+            return
+
+        # Open sink if filepath.
+        sink_obj = open_sink(sink) if sink is not None else None
+
+        try:
+            # Yield normalized responses as parsed.
+            for df in self._iter_requests(requests_list, msg=msg, max_workers=max_workers, long_format=long_format):
+                df = self._fix_long_format_df(df) if long_format else self._fix_wide_format_df(df)
+
+                # Write good responses to sink.
+                if sink_obj is not None:
+                    sink_obj.write(df if long_format else df[df['reason'].apply(lambda x: len(str(x)) == 0)])
+
+                yield df
+
+        # Close sinks opened from filepath.
+        finally:
+            if sink_obj is not None and isinstance(sink, str):
+                sink_obj.close()
+
+    def to_parquet(self, df, rootpath, family=None):
+        '''
+        Writes long format data as typed, compressed parquet files.
+
+        :Inputs:
+            -df: Long format data, as .get_data(long_format=True).
+            -rootpath: Root directory of files, partitioned as rootpath/family/dataset=../area=../month=YYYY-MM.
+            -family: Schema family of all data, as flows, load, generation, prices or outages, None to find by dataset names.
+
+        :Outputs:
+            -paths: List of written files.
+
+        :Info:
+            -Values as float32, repeated strings as int8 dictionary codes, widened if more than 128 strings, and timestamps as UTC.
+            -Use parquetschemas.EntsoeParquetSink(rootpath) as sink of .iter_data() to write while streaming.
+        '''
+        return export_parquet(df, rootpath, family=family)
+
+    def read_parquet(self, rootpath, family, dataset=None, area=None, start=None, end=None, columns=None):
+        '''Reads typed parquet files of family written by .to_parquet(), memory-mapped, filtered by dataset, area and timestamps in [start, end).'''
+        return read_parquet(rootpath, family, dataset=dataset, area=area, start=start, end=end, columns=columns)
 
-                # If quantity is not np.na
-                try:
-                    if isinstance(df_fix.at[idx, 'quantity'], list) or isinstance(df_fix.at[idx, 'quantity'], int):
-                        start, end, df_fix.at[idx, 'timestamp'] = self._seq2sets(df_fix.at[idx, 'start'], df_fix.at[idx, 'end'], df_fix.at[idx, 'quantity'])
-                except(ValueError, TypeError):
-                    None
-        
-        # Return fixed df.
-        return df_fix
-        
     def get_areas(self):
         '''Returns available areas as GeoDataFrame.'''
         
@@ -1435,6 +1986,27 @@ class EntsoeTransparencyClient():
         # Return available api areas as GeoDataFrame.
         return gdf
     
+    def get_border_graph(self):
+        '''
+        Returns graph of neighbouring areas, used to plan requests of unspesified to areas.
+
+        :Outputs:
+            -graph: BorderGraph with .edges, .neighbours(code), .pairs(codes) and .to_gdf() for drawing exchange maps.
+        '''
+        return self.border_graph
+
+    def locate_points(self, lons, lats):
+        '''
+        Finds areas containing points, e.g. generator coordinates.
+
+        :Inputs:
+            -lons, lats: Sequences of point longitudes and latitudes.
+
+        :Outputs:
+            -df: One row per (point, containing area) with columns point_idx, Code and Meaning.
+        '''
+        return self.area_index.locate_points(lons, lats)
+
     def show_client_summary(self):
         '''Create and printout client features summary in table.'''
 
@@ -1494,15 +2066,14 @@ class EntsoeTransparencyClient():
         #fix remove spaces and set all capital letters to lower
         parameter_type_lower = parameter_type.replace(' ','_')
         parameter_type_lower = parameter_type.lower()
-        parameter_type_list = list(self.parameters.keys())
-        parameter_type_list_lower = [each_string.lower() for each_string in parameter_type_list]
+        matcher = self._get_matcher('parameter_types', self.parameters.keys())
 
         #make search for request match in available parameter types
-        match = difflib.get_close_matches(parameter_type_lower, parameter_type_list_lower, n=n_matches, cutoff=accuracy_matches)
+        match = matcher.get_close_matches(parameter_type_lower, n=n_matches, cutoff=accuracy_matches)
 
         # if match: return single match or list of multiple matches, else: return None
         if len(match) == 1:
-            return parameter_type_list[parameter_type_list_lower.index(match[0])] #return match from original list
+            return matcher.original(match[0]) #return match from original list
         elif len(match) > 1:
             return match
         else:
@@ -1530,16 +2101,15 @@ class EntsoeTransparencyClient():
         parameter_lower = parameter.replace(' ','_')
         parameter_lower = parameter.lower()
         
-        # Store list of available parameter values in original and lowered form.
+        # Store list of available parameter values and codes in original form, and matchers of lowered forms.
         parameter_values_list = list(self.parameters[parameter_type_match].values())
-        parameter_values_list_lower = [each_string.lower() for each_string in parameter_values_list]
-        
-        # Store list of available parameter codes in original and lowered form.
         parameter_keys_list = list(self.parameters[parameter_type_match].keys())
-        parameter_keys_list_lower = [each_string.lower() for each_string in parameter_keys_list]
+        values_matcher = self._get_matcher(('parameter_values', parameter_type_match), parameter_values_list)
+        keys_matcher = self._get_matcher(('parameter_keys', parameter_type_match), parameter_keys_list)
+        parameter_values_list_lower = values_matcher.normalized
 
         # Make search for match in parameter_values:
-        match = difflib.get_close_matches(parameter_lower, parameter_values_list_lower, n=n_matches, cutoff=accuracy_matches)
+        match = values_matcher.get_close_matches(parameter_lower, n=n_matches, cutoff=accuracy_matches)
         
         # If not loose match on string, check if whole parameter word in string
         # If not match in full string search.
@@ -1563,19 +2133,19 @@ class EntsoeTransparencyClient():
         if len(match) == 1:
 
             # Return matched value and code and parametertype.
-            value = parameter_values_list[parameter_values_list_lower.index(match[0])]
-            code = parameter_keys_list[parameter_values_list_lower.index(match[0])]
+            value = parameter_values_list[values_matcher.index(match[0])]
+            code = parameter_keys_list[values_matcher.index(match[0])]
             return value, code
         
         # If not found match in values, search for match in keys:
-        match = difflib.get_close_matches(parameter_lower, parameter_keys_list_lower, n=n_matches, cutoff=accuracy_matches)
+        match = keys_matcher.get_close_matches(parameter_lower, n=n_matches, cutoff=accuracy_matches)
             
         # If match is found in parameter type codes.
         if len(match) == 1:
 
             # Return matched value and code and parametertype
-            value = parameter_values_list[parameter_keys_list_lower.index(match[0])]
-            code = parameter_keys_list[parameter_keys_list_lower.index(match[0])]
+            value = parameter_values_list[keys_matcher.index(match[0])]
+            code = parameter_keys_list[keys_matcher.index(match[0])]
             return value, code 
 
         # If no match found in either parameter type values or codes
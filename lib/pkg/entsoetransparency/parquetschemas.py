@@ -0,0 +1,171 @@
+'''Typed parquet schemas of entso-e transparency long format data, one schema per dataset family.'''
+
+import re
+import pandas as pd
+from lib.mod.parquetexport import dictionary_type, write_partitioned, read_partitioned
+
+
+# Dataset families, matched in order by patterns in lowered dataset names.
+FAMILY_PATTERNS = (
+    ('outages', r'unavailab|outage'),
+    ('prices', r'price'),
+    ('generation', r'generation|production|installed'),
+    ('flows', r'flow|exchange|transfer|capacit|commercial schedule|congestion|redispatch|counter trading'),
+    ('load', r'load'),
+    )
+
+# Columns of families, as (column, source column names in long format data, type).
+# Types are 'dictionary' of int8 codes, 'dictionary16' of int16 codes, 'float32', 'int32' and 'timestamp'.
+FAMILY_COLUMNS = {
+    'flows': (
+        ('in_area', ('in_domain.mrid',), 'dictionary'),
+        ('out_area', ('out_domain.mrid',), 'dictionary'),
+        ('businesstype', ('businesstype',), 'dictionary'),
+        ('resolution', ('resolution',), 'dictionary'),
+        ('unit', ('quantity_measure_unit.name',), 'dictionary'),
+        ('quantity', ('quantity',), 'float32'),
+        ),
+    'load': (
+        ('businesstype', ('businesstype',), 'dictionary'),
+        ('resolution', ('resolution',), 'dictionary'),
+        ('unit', ('quantity_measure_unit.name',), 'dictionary'),
+        ('quantity', ('quantity',), 'float32'),
+        ),
+    'generation': (
+        ('businesstype', ('businesstype',), 'dictionary'),
+        ('psrtype', ('mktpsrtype.psrtype', 'psrtype'), 'dictionary'),
+        ('resolution', ('resolution',), 'dictionary'),
+        ('unit', ('quantity_measure_unit.name',), 'dictionary'),
+        ('quantity', ('quantity',), 'float32'),
+        ),
+    'prices': (
+        ('businesstype', ('businesstype',), 'dictionary'),
+        ('resolution', ('resolution',), 'dictionary'),
+        ('currency', ('currency_unit.name',), 'dictionary'),
+        ('unit', ('price_measure_unit.name',), 'dictionary'),
+        ('price', ('price.amount', 'amount'), 'float32'),
+        ),
+    'outages': (
+        ('businesstype', ('businesstype',), 'dictionary'),
+        ('psrtype', ('production_registeredresource.psrtype.psrtype', 'asset_registeredresource.asset_psrtype.psrtype', 'psrtype'), 'dictionary'),
+        ('resource_name', ('production_registeredresource.name', 'asset_registeredresource.name', 'registeredresource.name'), 'dictionary16'),
+        ('voltage', ('production_registeredresource.psrtype.powersystemresources.highvoltagelimit', 'voltage_powersystemresources.highvoltagelimit'), 'float32'),
+        ('nominal_power', ('production_registeredresource.psrtype.powersystemresources.nominalp', 'nominalp'), 'float32'),
+        ('resolution', ('resolution',), 'dictionary'),
+        ('unit', ('quantity_measure_unit.name',), 'dictionary'),
+        ('quantity', ('quantity',), 'float32'),
+        ),
+    }
+
+# Area columns of data, first found is the partition area.
+AREA_COLUMNS = ('in_domain.mrid', 'outbiddingzone_domain.mrid', 'inbiddingzone_domain.mrid', 'biddingzone_domain.mrid', 'area_domain.mrid', 'controlarea_domain.mrid', 'out_domain.mrid')
+
+
+def dataset_family(dataset):
+    '''Returns family of dataset name, as flows, load, generation, prices or outages, load if not matched.'''
+    name = str(dataset).lower()
+    for family, pattern in FAMILY_PATTERNS:
+        if re.search(pattern, name):
+            return family
+    return 'load'
+
+
+def family_schema(family):
+    '''Returns arrow schema of family files, partition columns not included.'''
+    import pyarrow as pa
+
+    types = {
+        'dictionary': dictionary_type(8),
+        'dictionary16': dictionary_type(16),
+        'float32': pa.float32(),
+        'int32': pa.int32(),
+        }
+    fields = [pa.field('timestamp', pa.timestamp('ns', tz='UTC'))]
+    fields.extend(pa.field(column, types[kind]) for column, sources, kind in FAMILY_COLUMNS[family])
+    return pa.schema(fields)
+
+
+def family_frame(df, family):
+    '''Returns long format df with columns of family, named as in family schema, and dataset and area columns.'''
+
+    # Point timestamps as column.
+    if 'timestamp' not in df.columns:
+        df = df.reset_index()
+
+    # Columns of family, from first source column found, by name or name ending.
+    data = {'timestamp': df['timestamp'], 'dataset': df['dataset']}
+    for column, sources, kind in FAMILY_COLUMNS[family]:
+        source = _find_column(df.columns, sources)
+        if source is not None:
+            data[column] = df[source]
+
+    # Area of partition.
+    source = _find_column(df.columns, AREA_COLUMNS)
+    data['area'] = df[source] if source is not None else None
+
+    return pd.DataFrame(data, index=df.index)
+
+
+def export_parquet(df, rootpath, family=None, compression='zstd'):
+    '''
+    Writes long format data as typed parquet, one schema per dataset family, in rootpath/family/dataset=../area=../month=...
+
+    :Inputs:
+        -df: Long format data, as .get_data(long_format=True) or .iter_data().
+        -family: Family of all data, None to find family of each dataset by name.
+
+    :Outputs:
+        -paths: List of written files.
+    '''
+
+    # If no data.
+    if df is None or len(df) == 0 or 'dataset' not in df.columns:
+        return []
+
+    # Write each dataset with schema of its family.
+    paths = []
+    datasets = df['dataset'].astype(str)
+    for dataset in datasets.unique():
+        dataset_df = df[datasets.values == dataset]
+        dataset_df_family = family if family is not None else dataset_family(dataset)
+        paths.extend(write_partitioned(family_frame(dataset_df, dataset_df_family), f'{rootpath}/{dataset_df_family}', family_schema(dataset_df_family), compression=compression))
+
+    return paths
+
+
+def read_parquet(rootpath, family, dataset=None, area=None, start=None, end=None, columns=None):
+    '''Reads exported family data, memory-mapped, filtered by dataset, area and timestamps in [start, end).'''
+    return read_partitioned(f'{rootpath}/{family}', dataset=dataset, area=area, start=start, end=end, columns=columns)
+
+
+class EntsoeParquetSink():
+    '''Sink writing long format data as typed parquet per dataset family, for use as .iter_data(sink=EntsoeParquetSink(rootpath)).'''
+
+    def __init__(self, rootpath, family=None, compression='zstd'):
+        self.rootpath = rootpath
+        self.family = family
+        self.compression = compression
+        self.paths = []
+        self.rows = 0
+
+    def write(self, df):
+        '''Writes df partitions.'''
+        self.paths.extend(export_parquet(df, self.rootpath, family=self.family, compression=self.compression))
+        self.rows += len(df) if df is not None else 0
+
+    def close(self):
+        '''Nothing to close, each write is complete files.'''
+        None
+
+
+def _find_column(columns, sources):
+    '''Returns first column named as a source, or ending with .source, None if not found.'''
+    columns = list(columns)
+    for source in sources:
+        if source in columns:
+            return source
+    for source in sources:
+        for column in columns:
+            if str(column).endswith(f'.{source}'):
+                return column
+    return None
@@ -0,0 +1,158 @@
+'''Planner of request timeperiods, splitting into the largest timeperiods allowed per dataset, learned from api reason texts.'''
+
+import datetime
+import json
+import os
+import re
+import threading
+import pandas as pd
+from lib.mod.atomicwrite import atomic_open
+from lib.pkg.entsoetransparency.staticscache import default_cache_dirpath
+
+
+# Timeformat of timeperiods in requests.
+REQUEST_TIMEFORMAT = '%Y%m%d%H%M'
+
+# Units of allowed timeperiods in reason texts, and their iso 8601 duration designators.
+SPAN_UNITS = {'minute': 'minutes', 'hour': 'hours', 'day': 'days', 'week': 'weeks', 'month': 'months', 'year': 'years'}
+ISO_SPAN_UNITS = {'Y': 'year', 'M': 'month', 'W': 'week', 'D': 'day'}
+
+# Patterns of allowed timeperiod in reason texts, as "allowed: 1 day" or "allowed: P1Y".
+ALLOWED_SPAN_PATTERN = re.compile(r'allowed:\s*(\d+)\s*(minute|hour|day|week|month|year)s?', re.IGNORECASE)
+ALLOWED_ISO_SPAN_PATTERN = re.compile(r'allowed:\s*P(\d+)([YMWD])\b', re.IGNORECASE)
+
+
+def default_request_spans_filepath():
+    '''Returns default path to the file of learned max timeperiods per dataset.'''
+    return os.path.join(default_cache_dirpath(), 'request_spans.json')
+
+
+def parse_allowed_span(reason_str):
+    '''Returns allowed timeperiod in reason text as (value, unit), unit as in SPAN_UNITS, None if not found.'''
+
+    if not isinstance(reason_str, str):
+        return None
+
+    # Allowed as value and unit.
+    match = ALLOWED_SPAN_PATTERN.search(reason_str)
+    if match is not None:
+        return int(match.group(1)), match.group(2).lower()
+
+    # Allowed as iso 8601 duration.
+    match = ALLOWED_ISO_SPAN_PATTERN.search(reason_str)
+    if match is not None:
+        return int(match.group(1)), ISO_SPAN_UNITS[match.group(2).upper()]
+
+    return None
+
+
+def span_offset(span):
+    '''Returns (value, unit) timeperiod as pandas DateOffset, calendar aware for months and years.'''
+    value, unit = span
+    return pd.DateOffset(**{SPAN_UNITS[unit]: value})
+
+
+def split_timeperiod(start, end, span):
+    '''Returns list of (start, end) "%Y%m%d%H%M" timeperiods of [start, end), each no longer than (value, unit) span.'''
+
+    # Timeperiod as datetimes.
+    start_dt = datetime.datetime.strptime(start, REQUEST_TIMEFORMAT)
+    end_dt = datetime.datetime.strptime(end, REQUEST_TIMEFORMAT)
+
+    # No splitting if no span.
+    if span is None or start_dt >= end_dt:
+        return [(start, end)]
+
+    # Split at multiples of span from start, not drifting at month ends.
+    value, unit = span
+    timeperiods = []
+    k = 1
+    part_start_dt = start_dt
+    while part_start_dt < end_dt:
+        part_end_dt = min((pd.Timestamp(start_dt) + span_offset((value * k, unit))).to_pydatetime(), end_dt)
+        timeperiods.append((part_start_dt.strftime(REQUEST_TIMEFORMAT), part_end_dt.strftime(REQUEST_TIMEFORMAT)))
+        part_start_dt = part_end_dt
+        k += 1
+
+    return timeperiods
+
+
+def span_seconds(span):
+    '''Returns approximate seconds of (value, unit) span, used for comparing spans.'''
+    value, unit = span
+    seconds = {'minute': 60, 'hour': 3600, 'day': 86400, 'week': 7 * 86400, 'month': 28 * 86400, 'year': 365 * 86400}
+    return value * seconds[unit]
+
+
+class RequestPlanner():
+    '''
+    Plans request timeperiods within max timeperiods allowed per dataset.
+
+    :Explained:
+        -Learned: Max timeperiods are learned from "allowed: .." reason texts of bad responses, see .learn().
+        -Persisted: Learned max timeperiods are stored in json file, shared by clients and runs on this host.
+        -Pre-split: .split() splits requested timeperiods into the largest allowed timeperiods before requesting.
+    '''
+
+    def __init__(self, filepath=None, spans=None):
+
+        # File of learned max timeperiods, None uses default file.
+        self.filepath = filepath if filepath is not None else default_request_spans_filepath()
+
+        # Max timeperiods by dataset name, as (value, unit).
+        self._lock = threading.Lock()
+        self._spans = self._read_spans()
+        if spans is not None:
+            self._spans.update({dataset: tuple(span) for dataset, span in spans.items()})
+
+    def get_span(self, dataset):
+        '''Returns max timeperiod of dataset as (value, unit), None if not known.'''
+        with self._lock:
+            return self._spans.get(dataset)
+
+    def get_spans(self):
+        '''Returns dict of known max timeperiods by dataset.'''
+        with self._lock:
+            return dict(self._spans)
+
+    def learn(self, dataset, reason_str):
+        '''Learns max timeperiod of dataset from reason text, returns learned (value, unit), None if not found.'''
+
+        span = parse_allowed_span(reason_str)
+        if span is None:
+            return None
+
+        with self._lock:
+
+            # Merge with spans learned by other clients, keeping shortest span of dataset.
+            spans = self._read_spans()
+            spans.update({d: s for d, s in self._spans.items() if d not in spans or span_seconds(s) < span_seconds(spans[d])})
+            if dataset not in spans or span_seconds(span) < span_seconds(spans[dataset]):
+                spans[dataset] = span
+            self._spans = spans
+
+            # Persist learned spans.
+            try:
+                self._write_spans(spans)
+            except OSError:
+                None
+
+            return self._spans[dataset]
+
+    def split(self, dataset, start, end, span=None):
+        '''Returns list of (start, end) timeperiods of request, split in max timeperiods of dataset, or of span if spesified.'''
+        return split_timeperiod(start, end, span if span is not None else self.get_span(dataset))
+
+    def _read_spans(self):
+        '''Reads learned spans from file, empty if missing or unreadable.'''
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                spans = json.load(f)
+            return {dataset: (int(span[0]), str(span[1])) for dataset, span in spans.items() if str(span[1]) in SPAN_UNITS}
+        except (OSError, ValueError, TypeError, AttributeError, IndexError):
+            return {}
+
+    def _write_spans(self, spans):
+        '''Writes learned spans to file atomically.'''
+        with atomic_open(self.filepath, 'w', prefix='.request_spans-') as f:
+            json.dump({dataset: list(span) for dataset, span in spans.items()}, f, indent=1, sort_keys=True)
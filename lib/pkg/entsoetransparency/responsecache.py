@@ -0,0 +1,217 @@
+'''Persistent on-disk cache of entso-e transparency api responses, keyed by canonical request parameters.'''
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from lib.mod.atomicwrite import atomic_open
+from lib.pkg.entsoetransparency.staticscache import default_cache_dirpath
+
+
+# Max size in bytes of cached compressed payloads.
+RESPONSE_CACHE_MAX_BYTES = 1024 ** 3
+
+# Seconds responses of recent, not settled, timeperiods are cached.
+RESPONSE_CACHE_RECENT_TTL = 60 * 60
+
+# Age of timeperiod end after which data is settled and responses never expire.
+RESPONSE_CACHE_SETTLED_AFTER = datetime.timedelta(days=7)
+
+# Timeformat of period parameters in requests.
+PERIOD_TIMEFORMAT = '%Y%m%d%H%M'
+
+
+def default_response_cache_dirpath():
+    '''Returns default path to the response cache directory.'''
+    return os.path.join(default_cache_dirpath(), 'responses')
+
+
+def canonical_parameters_key(parameters_dict):
+    '''Returns sha256 hex key of request parameters as sorted json, without securityToken.'''
+    params = {str(k): (None if v is None else str(v)) for k, v in parameters_dict.items() if k != 'securityToken'}
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache():
+    '''
+    Cache of api response payloads, as zlib compressed files indexed in a SQLite database.
+
+    :Explained:
+        -Content-addressed: Payloads are stored by sha256 of the canonical request parameters.
+        -Settled data: Responses of timeperiods ended more than settled_after ago never expire,
+         responses of recent timeperiods expire after recent_ttl seconds.
+        -Per dataset: dataset_ttls overrides expiry in seconds by dataset name, None for never expiring.
+        -Bounded: Least recently used payloads are evicted when payloads exceed max_bytes.
+        -Stats: .get_stats() shows hits, misses, stored entries and bytes.
+    '''
+
+    def __init__(self, dirpath=None, max_bytes=RESPONSE_CACHE_MAX_BYTES, recent_ttl=RESPONSE_CACHE_RECENT_TTL, settled_after=RESPONSE_CACHE_SETTLED_AFTER, dataset_ttls=None):
+
+        # Cache directory, index database and payloads directory.
+        self.dirpath = dirpath if dirpath is not None else default_response_cache_dirpath()
+        self.dbpath = os.path.join(self.dirpath, 'index.sqlite')
+        self.payloads_dirpath = os.path.join(self.dirpath, 'payloads')
+        os.makedirs(self.payloads_dirpath, exist_ok=True)
+
+        # Expiry and size settings.
+        self.max_bytes = max_bytes
+        self.recent_ttl = recent_ttl
+        self.settled_after = settled_after
+        self.dataset_ttls = dict(dataset_ttls) if dataset_ttls is not None else {}
+
+        # Index connection, shared by threads under lock.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.dbpath, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, dataset TEXT, parameters TEXT, size INTEGER, '
+            'created REAL, expires REAL, accessed REAL)'
+            )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+
+        # Counters in this process.
+        self._counts = {'hits': 0, 'misses': 0, 'expired': 0, 'stored': 0, 'evicted': 0}
+
+    def get(self, parameters_dict):
+        '''Returns cached response content of request parameters, None if not cached or expired.'''
+
+        key = canonical_parameters_key(parameters_dict)
+        now = time.time()
+
+        # Look up entry.
+        with self._lock:
+            row = self._conn.execute('SELECT expires FROM responses WHERE key = ?', (key,)).fetchone()
+
+            # Not cached.
+            if row is None:
+                self._counts['misses'] += 1
+                return None
+
+            # Expired, remove entry.
+            if row[0] is not None and row[0] <= now:
+                self._delete(key)
+                self._counts['misses'] += 1
+                self._counts['expired'] += 1
+                return None
+
+            # Read payload, missing or corrupt payload is a miss.
+            try:
+                with open(self._payload_path(key), 'rb') as f:
+                    content = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self._delete(key)
+                self._counts['misses'] += 1
+                return None
+
+            # Mark as recently used.
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self._counts['hits'] += 1
+
+        return content
+
+    def put(self, parameters_dict, content, dataset=None):
+        '''Stores response content of request parameters, evicting least recently used if above max_bytes.'''
+
+        key = canonical_parameters_key(parameters_dict)
+        now = time.time()
+        ttl = self.get_ttl(parameters_dict, dataset=dataset)
+        expires = None if ttl is None else now + ttl
+
+        # Compress payload.
+        payload = zlib.compress(content if isinstance(content, bytes) else content.encode('utf-8'), 6)
+
+        with self._lock:
+
+            # Write payload atomically.
+            path = self._payload_path(key)
+            with atomic_open(path, 'wb', prefix='.payload-') as f:
+                f.write(payload)
+
+            # Index entry.
+            params_str = json.dumps({str(k): (None if v is None else str(v)) for k, v in parameters_dict.items() if k != 'securityToken'}, sort_keys=True)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, dataset, parameters, size, created, expires, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, dataset, params_str, len(payload), now, expires, now)
+                )
+            self._counts['stored'] += 1
+
+            # Evict if above max size.
+            self._evict()
+
+        return key
+
+    def get_ttl(self, parameters_dict, dataset=None):
+        '''Returns seconds response of request is cached, None if never expiring.'''
+
+        # Dataset spesific expiry.
+        if dataset is not None and dataset in self.dataset_ttls:
+            return self.dataset_ttls[dataset]
+
+        # Find end of requested timeperiod.
+        period_end = None
+        for key, value in parameters_dict.items():
+            if 'end' in key.lower() and value is not None:
+                try:
+                    period_end = datetime.datetime.strptime(str(value), PERIOD_TIMEFORMAT)
+                except ValueError:
+                    None
+
+        # Settled timeperiods never expires, recent or unknown timeperiods expires after recent_ttl.
+        if period_end is not None and period_end <= datetime.datetime.utcnow() - self.settled_after:
+            return None
+        return self.recent_ttl
+
+    def get_stats(self):
+        '''Returns dict of hits, misses, expired, stored and evicted counts in this process, and cached entries and bytes.'''
+        with self._lock:
+            entries, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            stats = dict(self._counts)
+        stats['entries'] = entries
+        stats['bytes'] = size
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests > 0 else 0.0
+        return stats
+
+    def clear(self):
+        '''Removes all cached responses.'''
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute('SELECT key FROM responses').fetchall()]
+            for key in keys:
+                self._delete(key)
+
+    def close(self):
+        '''Closes index database.'''
+        with self._lock:
+            self._conn.close()
+
+    def _payload_path(self, key):
+        '''Returns path of payload file, in subdirectories by first key chars.'''
+        return os.path.join(self.payloads_dirpath, key[:2], f'{key}.zlib')
+
+    def _delete(self, key):
+        '''Removes entry and payload, called under lock.'''
+        self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+        try:
+            os.remove(self._payload_path(key))
+        except OSError:
+            None
+
+    def _evict(self):
+        '''Removes least recently used entries until below max_bytes, called under lock.'''
+        if self.max_bytes is None:
+            return
+        size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        for key, entry_size in self._conn.execute('SELECT key, size FROM responses ORDER BY accessed ASC').fetchall():
+            self._delete(key)
+            self._counts['evicted'] += 1
+            size -= entry_size
+            if size <= self.max_bytes:
+                break
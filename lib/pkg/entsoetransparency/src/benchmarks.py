@@ -0,0 +1,233 @@
+# Script for benchmarking EntsoeTransparencyClient internals on synthetic responses.
+
+# Import libs.
+import datetime
+import io
+import time
+import zipfile
+import pandas as pd
+from lib.pkg.entsoetransparency.entsoetransparency import EntsoeTransparencyClient
+
+
+def make_timeseries_document(n_timeseries=10, n_points=96, resolution='PT15M', start='2021-01-01T00:00Z'):
+    '''
+    Returns synthetic GL_MarketDocument xml, formatted as api responses.
+
+        Parameters:
+            n_timeseries (int): Number of TimeSeries in document.
+            n_points (int): Number of Points in each TimeSeries Period.
+            resolution (str): Period resolution, PT15M, PT30M or PT60M.
+            start (str): Start of Periods.
+
+        Returns:
+            xml (bytes): Document content.
+
+    '''
+
+    # Period time interval.
+    minutes = {'PT15M': 15, 'PT30M': 30, 'PT60M': 60}[resolution]
+    start_dt = datetime.datetime.strptime(start, '%Y-%m-%dT%H:%MZ')
+    end = (start_dt + datetime.timedelta(minutes=minutes * n_points)).strftime('%Y-%m-%dT%H:%MZ')
+
+    # Create TimeSeries.
+    timeseries = []
+    for ts in range(n_timeseries):
+        points = ''.join(f'\n\t\t\t<Point>\n\t\t\t\t<position>{p + 1}</position>\n\t\t\t\t<quantity>{(p * 7 + ts) % 1000}</quantity>\n\t\t\t</Point>' for p in range(n_points))
+        timeseries.append(
+            f'\n\t<TimeSeries>\n\t\t<mRID>{ts + 1}</mRID>\n\t\t<businessType>A04</businessType>\n\t\t<objectAggregation>A01</objectAggregation>'
+            f'\n\t\t<outBiddingZone_Domain.mRID codingScheme="A01">10YFI-1--------U</outBiddingZone_Domain.mRID>\n\t\t<quantity_Measure_Unit.name>MAW</quantity_Measure_Unit.name>\n\t\t<curveType>A01</curveType>'
+            f'\n\t\t<Period>\n\t\t\t<timeInterval>\n\t\t\t\t<start>{start}</start>\n\t\t\t\t<end>{end}</end>\n\t\t\t</timeInterval>\n\t\t\t<resolution>{resolution}</resolution>{points}\n\t\t</Period>\n\t</TimeSeries>'
+            )
+
+    # Create document.
+    xml = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<GL_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-6:generationloaddocument:3:0">'
+        '\n\t<mRID>benchmark</mRID>\n\t<revisionNumber>1</revisionNumber>\n\t<type>A65</type>\n\t<process.processType>A16</process.processType>'
+        '\n\t<sender_MarketParticipant.mRID codingScheme="A01">10X1001A1001A450</sender_MarketParticipant.mRID>\n\t<sender_MarketParticipant.marketRole.type>A32</sender_MarketParticipant.marketRole.type>'
+        '\n\t<receiver_MarketParticipant.mRID codingScheme="A01">10X1001A1001A450</receiver_MarketParticipant.mRID>\n\t<receiver_MarketParticipant.marketRole.type>A33</receiver_MarketParticipant.marketRole.type>'
+        f'\n\t<createdDateTime>2021-08-20T10:00:00Z</createdDateTime>\n\t<time_Period.timeInterval>\n\t\t<start>{start}</start>\n\t\t<end>{end}</end>\n\t</time_Period.timeInterval>'
+        + ''.join(timeseries) + '\n</GL_MarketDocument>'
+        )
+
+    return xml.encode('utf-8')
+
+
+def _best_seconds(func, repeats):
+    '''Returns best time in seconds of repeated calls.'''
+    best = None
+    for _ in range(repeats):
+        t = time.perf_counter()
+        func()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+
+def benchmark_response_parsers(client=None, sizes=[(1, 96), (10, 96), (50, 96), (10, 2976)], repeats=3):
+    '''
+    Benchmarks response parsing throughput of lxml streaming parser against bs4 parser.
+
+        Parameters:
+            client (EntsoeTransparencyClient): Client used for parsing, default new client.
+            sizes (list): List of (n_timeseries, n_points) documents to parse.
+            repeats (int): Number of timed runs, best is reported.
+
+        Returns:
+            df (pd.DataFrame): Seconds and points per second, per parser and document size.
+
+    '''
+
+    # Create client and warm up statics used in remapping.
+    if client is None:
+        client = EntsoeTransparencyClient()
+    client._response_xml_to_df(make_timeseries_document(1, 4))
+
+    rows = []
+    for n_timeseries, n_points in sizes:
+        xml = make_timeseries_document(n_timeseries, n_points)
+        for parser in ['lxml', 'bs4']:
+            seconds = _best_seconds(lambda: client._response_xml_to_df(xml, parser=parser), repeats)
+            rows.append({
+                'parser': parser,
+                'timeseries': n_timeseries,
+                'points': n_timeseries * n_points,
+                'seconds': seconds,
+                'points_per_second': n_timeseries * n_points / seconds,
+            })
+
+    return pd.DataFrame(rows)
+
+
+def make_responses_df(n_borders=30, n_days=7, n_points=96):
+    '''
+    Returns synthetic df of parsed responses, as requested in one day parts for each border direction.
+
+        Parameters:
+            n_borders (int): Number of borders, requested in both directions.
+            n_days (int): Number of one day responses per border direction.
+            n_points (int): Number of quantitys in each response.
+
+        Returns:
+            df (pd.DataFrame): One row per response.
+
+    '''
+
+    rows = []
+    start = datetime.datetime(2021, 1, 1)
+    for border in range(n_borders):
+        for in_area, out_area in [(f'area-{border}', f'area-{border + 1}'), (f'area-{border + 1}', f'area-{border}')]:
+            for day in range(n_days):
+                rows.append({
+                    'dataset': '12.1.G Physical Flows',
+                    'success': True,
+                    'parameters': f"{{'in_Domain': '{in_area}', 'out_Domain': '{out_area}', 'day': {day}}}",
+                    'reason': '',
+                    'type': 'Aggregated energy data report',
+                    'createddatetime': '2021-08-20T10:00:00Z',
+                    'in_domain.mrid': [in_area],
+                    'out_domain.mrid': [out_area],
+                    'businesstype': ['A66'],
+                    'start': [(start + datetime.timedelta(days=day)).strftime('%Y-%m-%dT%H:%MZ')],
+                    'end': [(start + datetime.timedelta(days=day + 1)).strftime('%Y-%m-%dT%H:%MZ')],
+                    'resolution': ['PT15M'],
+                    'quantity': [str(p) for p in range(n_points)],
+                })
+
+    return pd.DataFrame(rows)
+
+
+def benchmark_merge_extend_equal_rows(client=None, sizes=[(1, 7), (10, 7), (30, 7), (30, 28)], repeats=3):
+    '''
+    Benchmarks merging of responses into one row per border direction.
+
+        Parameters:
+            client (EntsoeTransparencyClient): Client used for merging, default new lazy client.
+            sizes (list): List of (n_borders, n_days) responses to merge.
+            repeats (int): Number of timed runs, best is reported.
+
+        Returns:
+            df (pd.DataFrame): Seconds and rows per second, per number of rows.
+
+    '''
+
+    # Create client, statics are not used in merging.
+    if client is None:
+        client = EntsoeTransparencyClient(lazy=True)
+
+    rows = []
+    for n_borders, n_days in sizes:
+        df = make_responses_df(n_borders, n_days)
+        extends = ['parameters', 'createddatetime', 'quantity', 'start', 'end']
+        seconds = _best_seconds(lambda: client._merge_extend_equal_rows(df, extends=extends), repeats)
+        rows.append({
+            'rows': len(df),
+            'merged_rows': len(client._merge_extend_equal_rows(df, extends=extends)),
+            'seconds': seconds,
+            'rows_per_second': len(df) / seconds,
+        })
+
+    return pd.DataFrame(rows)
+
+
+def make_zip_content(n_files=500, n_points=96):
+    '''
+    Returns synthetic zipped response, as zipped unavailability responses of many documents.
+
+        Parameters:
+            n_files (int): Number of xml documents in zipfile.
+            n_points (int): Number of Points in each document.
+
+        Returns:
+            content (bytes): Zipfile content.
+
+    '''
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        xml = make_timeseries_document(1, n_points)
+        for i in range(n_files):
+            zipf.writestr(f'document_{i}.xml', xml)
+    return buf.getvalue()
+
+
+def benchmark_zipfile2df(client=None, sizes=[10, 100, 1000], repeats=3):
+    '''
+    Benchmarks parsing of zipped responses of many documents.
+
+        Parameters:
+            client (EntsoeTransparencyClient): Client used for parsing, default new client.
+            sizes (list): List of number of documents in zipfile.
+            repeats (int): Number of timed runs, best is reported.
+
+        Returns:
+            df (pd.DataFrame): Seconds and files per second, per number of files.
+
+    '''
+
+    # Create client and warm up statics used in remapping.
+    if client is None:
+        client = EntsoeTransparencyClient()
+    client._zipfile2df(make_zip_content(1))
+
+    rows = []
+    for n_files in sizes:
+        content = make_zip_content(n_files)
+        seconds = _best_seconds(lambda: client._zipfile2df(content), repeats)
+        rows.append({
+            'files': n_files,
+            'seconds': seconds,
+            'files_per_second': n_files / seconds,
+        })
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    '''Executing file as script.'''
+    print(benchmark_response_parsers().to_string(index=False))
+    print(benchmark_merge_extend_equal_rows().to_string(index=False))
+    print(benchmark_zipfile2df().to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Script for creating the bundled areas dataset from the raw areas geojson files.
+
+# Import libs.
+import csv
+import glob
+import pathlib
+import re
+import pandas as pd
+import geopandas as gpd
+
+
+# Corrections of codes in raw areas files, by Meaning. SE1 file has the code of SE2.
+AREAS_CODE_FIXES = {
+    'SE1 BZ / MBA': '10Y1001A1001A44P',
+}
+
+# Pattern of 16 character energy identification codes.
+EIC_CODE_PATTERN = re.compile(r'^[0-9]{2}[A-Z0-9\-]{14}$')
+
+
+def read_api_areas(filepath=None):
+    '''
+    Returns dict of api area codes and meanings, as parameters['Areas'], from bundled api-statics areas.csv.
+    Rows with code and meaning swapped, as United Kingdom in the api guide, are read with code first.
+    '''
+    if filepath is None:
+        filepath = pathlib.Path(__file__).parent.parent.joinpath('data', 'raw', 'api-statics', 'areas.csv')
+    areas = {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            code, meaning = row[:2]
+            if EIC_CODE_PATTERN.match(meaning) and not EIC_CODE_PATTERN.match(code):
+                code, meaning = meaning, code
+            areas[code] = meaning
+    return areas
+
+
+def create_areas_dataset(inputdirpath=None, outputfilepath=None, areas=None):
+    '''
+    Merges raw areas geojson files into one compact feather file, with geometry as wkb
+    and precomputed representative points, loaded by EntsoeTransparencyClient.areas.
+
+        Parameters:
+            inputdirpath (str): Directory of raw areas geojson files.
+            outputfilepath (str): Path of created feather file.
+            areas (dict): Api area codes and meanings, default read_api_areas().
+
+        Returns:
+            df (pd.DataFrame): The stored areas dataset.
+
+    '''
+
+    # If not spesified paths, set to default.
+    datadirpath = pathlib.Path(__file__).parent.parent.joinpath('data')
+    if inputdirpath is None:
+        inputdirpath = datadirpath.joinpath('raw', 'areas')
+    if outputfilepath is None:
+        outputfilepath = datadirpath.joinpath('processed', 'areas.feather')
+
+    # Read all raw areas files into one GeoDataFrame.
+    files = sorted(glob.glob(str(pathlib.Path(inputdirpath).joinpath('*.geojson'))))
+    gdf = pd.concat([gpd.read_file(f) for f in files]).reset_index(drop=True)
+    gdf = gpd.GeoDataFrame(gdf, geometry='geometry', crs='EPSG:4326')
+
+    # Correct codes of raw files.
+    gdf['Code'] = [AREAS_CODE_FIXES.get(meaning, code) for meaning, code in zip(gdf['Meaning'], gdf['Code'])]
+
+    # Check codes are unique api area codes, areas are looked up by code.
+    if areas is None:
+        areas = read_api_areas()
+    duplicated = gdf.loc[gdf['Code'].duplicated(keep=False), ['Meaning', 'Code']]
+    if len(duplicated) > 0:
+        raise ValueError(f'Duplicated area codes in raw areas files:\n{duplicated}')
+    unknown = gdf.loc[~gdf['Code'].isin(list(areas.keys())), ['Meaning', 'Code']]
+    if len(unknown) > 0:
+        raise ValueError(f'Area codes not in api areas:\n{unknown}')
+
+    # Compute representative points for all areas at once.
+    points = gdf['geometry'].representative_point()
+
+    # Store as plain DataFrame with geometry as wkb bytes.
+    df = pd.DataFrame({
+        'Meaning': gdf['Meaning'].astype(str),
+        'Code': gdf['Code'].astype(str),
+        'geometry_wkb': gdf['geometry'].to_wkb(),
+        'coords_x': points.x,
+        'coords_y': points.y,
+    })
+
+    # Write feather file.
+    pathlib.Path(outputfilepath).parent.mkdir(parents=True, exist_ok=True)
+    df.to_feather(outputfilepath, compression='zstd')
+
+    return df
+
+
+def main():
+    '''Executing file as script.'''
+    df = create_areas_dataset()
+    print(df[['Meaning', 'Code', 'coords_x', 'coords_y']])
+
+
+if __name__ == '__main__':
+    main()
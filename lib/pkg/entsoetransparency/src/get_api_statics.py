@@ -7,27 +7,30 @@ import requests
 import bs4
 import re
 import pandas as pd
+from lib.pkg.entsoetransparency.staticscache import get_statics_snapshot, STATICS_GUIDE_URL, STATICS_SNAPSHOT_TTL
 
-def get_api_statics():
+# Name of this scripts parser, its snapshots are stored apart from client snapshots.
+STATICS_PARSER = 'get_api_statics'
+
+
+def get_api_statics(html=None):
     '''
     Returns api statics from guide url through webscraoing its html content.
     url = https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html
 
         Parameters:
-            None
+            html (str): Guide html content, if None it is requested from guide url.
         
         Returns:
-            api_statics (dict): Dictionary of api available parameters and request.
+            datasets (dict): Dictionary of api available requests.
+            parameters (dict): Dictionary of api available parameters.
 
     '''
 
-    
-    
-    url = 'https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html'
-
     # Get guide html content as response.
-    response = requests.get('https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html')
-    content_soup = bs4.BeautifulSoup(response.text, "lxml").find(id="static-content").find(id='content')
+    if html is None:
+        html = requests.get(STATICS_GUIDE_URL).text
+    content_soup = bs4.BeautifulSoup(html, "lxml").find(id="static-content").find(id='content')
 
     # Create dictionary for storing api_guide content.
     api_statics = {}
@@ -249,7 +252,7 @@ def get_api_statics():
     del templist
 
     #store in api_variables as nested dict.
-    
+    parameters = {}
     for df in param_dflist:
         df_name = df.name
 
@@ -262,7 +265,6 @@ def get_api_statics():
         df_dict = dict(zip(df.iloc[:,0],df.iloc[:,1]))
 
         # Create available parameters dict as: [parameter name] = (available values as dataframe).
-        parameters = {}
         for name in df_name:
             for keys, values in df_dict.items():
                 keys = keys.replace('\xa0',' ')
@@ -274,19 +276,37 @@ def get_api_statics():
 
                 
     # Return api statics content.
-    return api_statics
     return datasets, parameters
 
-        ######################################
-        ######################################    
-   
+
+def get_cached_api_statics(filepath=None, ttl=STATICS_SNAPSHOT_TTL, refresh=False):
+    '''
+    Returns api statics from the cached statics snapshot of this scripts parser,
+    scraping guide url only if snapshot is missing, stale or refresh is spesified.
+
+        Parameters:
+            filepath (str): Path to snapshot cache file, default in users cache directory.
+            ttl (int): Seconds cached snapshot is used without revalidation.
+            refresh (bool): If True, re-scrape guide.
+
+        Returns:
+            datasets (dict): Dictionary of api available requests.
+            parameters (dict): Dictionary of api available parameters.
+
+    '''
+
+    # Get snapshot, scraping with this scripts parser if needed.
+    snapshot = get_statics_snapshot(parse_func=get_api_statics, filepath=filepath, ttl=ttl, refresh=refresh, parser=STATICS_PARSER)
+
+    # Return api statics content.
+    return snapshot['datasets'], snapshot['parameters']
 
 
 def main():
     '''Executing this file as a script.'''
 
     # Getting available api datasets and parameters.
-    ds, pr = get_api_statics()
+    ds, pr = get_cached_api_statics()
 
     print(ds)
 
@@ -0,0 +1,199 @@
+'''Persistent on-disk cache of the entso-e transparency api guide statics.'''
+
+import datetime
+import hashlib
+import json
+import os
+import requests
+from lib.mod.atomicwrite import atomic_open
+
+
+# Url of the api guide webpage the statics is scraped from.
+STATICS_GUIDE_URL = 'https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html'
+
+# Snapshot layout version, bump when the stored datasets or parameters layout changes.
+STATICS_SNAPSHOT_VERSION = 2
+
+# Name of parser of client snapshots, snapshots of other parsers are stored in own files.
+STATICS_CLIENT_PARSER = 'client'
+
+# Seconds a snapshot is trusted before revalidating it against the guide webpage.
+STATICS_SNAPSHOT_TTL = 7 * 24 * 60 * 60
+
+# Timeformat of timestamps stored in snapshot.
+STATICS_SNAPSHOT_TIMEFORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def default_cache_dirpath():
+    '''Returns path to directory for storing entsoetransparency cache files.'''
+
+    # Use directory from environment if spesified, else users cache directory.
+    dirpath = os.environ.get('ENTSOETRANSPARENCY_CACHE_DIR')
+    if dirpath is None or len(dirpath) == 0:
+        dirpath = os.path.join(os.path.expanduser('~'), '.cache', 'entsoetransparency')
+
+    return dirpath
+
+
+def default_statics_filepath(parser=STATICS_CLIENT_PARSER):
+    '''Returns default path to the statics snapshot cache file of parser.'''
+    if parser == STATICS_CLIENT_PARSER:
+        return os.path.join(default_cache_dirpath(), 'api_statics.json')
+    return os.path.join(default_cache_dirpath(), f'api_statics_{parser}.json')
+
+
+def read_statics_snapshot(filepath, parser=None):
+    '''Reads statics snapshot from file, returns None if missing, unreadable, of other version or, if spesified, of other parser.'''
+
+    # If no file, no snapshot.
+    if filepath is None or not os.path.isfile(filepath):
+        return None
+
+    # Try to read the snapshot json.
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # Snapshots of other layout versions must be re-scraped.
+    if not isinstance(snapshot, dict) or snapshot.get('version') != STATICS_SNAPSHOT_VERSION:
+        return None
+
+    # Snapshots of other parsers have other datasets and parameters layout.
+    if parser is not None and snapshot.get('parser') != parser:
+        return None
+
+    return snapshot
+
+
+def write_statics_snapshot(filepath, snapshot):
+    '''Writes statics snapshot to file atomically, readers never see a half written file.'''
+
+    # Write to temporary file in same directory, then replace.
+    with atomic_open(filepath, 'w', prefix='.api_statics-') as f:
+        json.dump(snapshot, f, default=str)
+
+
+def make_statics_snapshot(html, parse_func, etag=None, last_modified=None, content_hash=None, parser=STATICS_CLIENT_PARSER):
+    '''Parses guide html with parse_func into datasets and parameters, returns snapshot dict of parser name.'''
+
+    # Hash guide content, used to detect unchanged guide on revalidation.
+    if content_hash is None:
+        content_hash = hashlib.sha256(html.encode('utf-8') if isinstance(html, str) else html).hexdigest()
+
+    # Scrape datasets and parameters.
+    datasets, parameters = parse_func(html)
+
+    # Create snapshot.
+    now_str = datetime.datetime.utcnow().strftime(STATICS_SNAPSHOT_TIMEFORMAT)
+    snapshot = {
+        'version': STATICS_SNAPSHOT_VERSION,
+        'parser': parser,
+        'url': STATICS_GUIDE_URL,
+        'content_hash': content_hash,
+        'etag': etag,
+        'last_modified': last_modified,
+        'created': now_str,
+        'checked': now_str,
+        'datasets': datasets,
+        'parameters': parameters,
+        'areas': dict(parameters.get('Areas', {})),
+    }
+
+    # Roundtrip through json, snapshot is always made of plain python objects.
+    return json.loads(json.dumps(snapshot, default=str))
+
+
+def statics_snapshot_age(snapshot):
+    '''Returns seconds since snapshot was last checked against the guide webpage.'''
+
+    # Unparsable timestamps counts as expired.
+    try:
+        checked = datetime.datetime.strptime(snapshot['checked'], STATICS_SNAPSHOT_TIMEFORMAT)
+    except (KeyError, TypeError, ValueError):
+        return float('inf')
+
+    return (datetime.datetime.utcnow() - checked).total_seconds()
+
+
+def get_statics_snapshot(parse_func, filepath=None, ttl=STATICS_SNAPSHOT_TTL, refresh=False, get_func=None, msg=False, parser=STATICS_CLIENT_PARSER):
+    '''
+    Returns api statics snapshot, from cache file if fresh, else revalidated or re-scraped from the guide webpage.
+
+    :Inputs:
+        -parse_func: Function parsing guide html into (datasets, parameters).
+        -parser: Name of parse_func, snapshots of other parsers are not used.
+        -filepath: Path to snapshot cache file, default in users cache directory, one file per parser.
+        -ttl: Seconds a cached snapshot is used without revalidation.
+        -refresh: If True, ignore cached snapshot and re-scrape guide.
+        -get_func: Function making http get request as get_func(url, headers=headers), default requests.get.
+
+    :Outputs:
+        -snapshot: Dict with 'datasets', 'parameters', 'areas' and cache metadata.
+    '''
+
+    # Set defaults.
+    if filepath is None:
+        filepath = default_statics_filepath(parser)
+    if get_func is None:
+        get_func = requests.get
+
+    # Read cached snapshot, unless refresh is forced.
+    snapshot = None if refresh else read_statics_snapshot(filepath, parser=parser)
+
+    # If cached snapshot is still fresh, use directly.
+    if snapshot is not None and ttl is not None and statics_snapshot_age(snapshot) < ttl:
+        return snapshot
+
+    # Make conditional request if having a snapshot to revalidate.
+    headers = {}
+    if snapshot is not None:
+        if snapshot.get('etag'):
+            headers['If-None-Match'] = snapshot['etag']
+        if snapshot.get('last_modified'):
+            headers['If-Modified-Since'] = snapshot['last_modified']
+
+    if msg:
+        print(f'Revalidating api statics at url:\n{STATICS_GUIDE_URL}')
+
+    # Try to get guide webpage, on connection errors fall back to stale snapshot.
+    try:
+        response = get_func(STATICS_GUIDE_URL, headers=headers)
+    except requests.exceptions.RequestException:
+        if snapshot is not None:
+            print('WARNING: Could not revalidate api statics, using cached snapshot.')
+            return snapshot
+        raise
+
+    # If guide is not modified, mark snapshot as checked.
+    if response.status_code == 304 and snapshot is not None:
+        snapshot['checked'] = datetime.datetime.utcnow().strftime(STATICS_SNAPSHOT_TIMEFORMAT)
+        write_statics_snapshot(filepath, snapshot)
+        return snapshot
+
+    # If bad response, fall back to stale snapshot or raise.
+    if not response.ok:
+        if snapshot is not None:
+            print(f'WARNING: Api statics revalidation failed with status {response.status_code}, using cached snapshot.')
+            return snapshot
+        response.raise_for_status()
+
+    # Store validators from response.
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+
+    # If guide content is unchanged, keep parsed content and only update metadata.
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    if snapshot is not None and snapshot.get('content_hash') == content_hash:
+        snapshot['etag'] = etag
+        snapshot['last_modified'] = last_modified
+        snapshot['checked'] = datetime.datetime.utcnow().strftime(STATICS_SNAPSHOT_TIMEFORMAT)
+        write_statics_snapshot(filepath, snapshot)
+        return snapshot
+
+    # Else scrape guide into new snapshot.
+    snapshot = make_statics_snapshot(response.text, parse_func, etag=etag, last_modified=last_modified, content_hash=content_hash, parser=parser)
+    write_statics_snapshot(filepath, snapshot)
+
+    return snapshot
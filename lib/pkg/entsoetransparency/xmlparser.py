@@ -0,0 +1,539 @@
+'''Streaming lxml parsers of entso-e api response documents, building DataFrames once from columnar arrays.'''
+
+import io
+import re
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+
+# Measured data tags, collected with duplicates.
+MEASURED_TAGS = ('quantity', 'position')
+
+
+def _localname(tag):
+    '''Returns lowered tag name without namespace, as tag names in bs4 soups.'''
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def _to_bytes(content):
+    '''Returns response content as bytes.'''
+    if isinstance(content, str):
+        return content.encode('utf-8')
+    return content
+
+
+def _iterparse(content):
+    '''Iterparse (event, element) of xml content with start and end events.'''
+    return etree.iterparse(io.BytesIO(_to_bytes(content)), events=('start', 'end'), remove_comments=True, remove_pis=True, huge_tree=True)
+
+
+def _release(elem):
+    '''Frees parsed element and its already parsed siblings.'''
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def parse_response_xml(content, docnames=('type', 'created', 'domain'), tagsnames=('domain', 'resource', 'type', 'start', 'end', 'resolution', 'quantity', 'amount', 'name', 'voltage', 'nominalp'), remap_func=None):
+    '''
+    Parses entso-e response document to one row per TimeSeries, streaming with lxml iterparse.
+
+    :Inputs:
+        -content: Response xml as bytes or str.
+        -docnames: Tag subnames of document data, found in sequence through document.
+        -tagsnames: Tag subnames collected from each TimeSeries, as lists per tag name.
+        -remap_func: Function(code, tagname) returning meaning of code, None to keep codes.
+
+    :Outputs:
+        -df: Document data and TimeSeries data, or reason of bad response in column 'reason'.
+
+    :Explained:
+        Same content as the bs4 parser: Document data is the next tag after previous match with name
+        containing docname. TimeSeries columns are leaf tags with name containing tagsnames, in order of tagsnames,
+        measured data with duplicates and other data without. Raises lxml.etree.XMLSyntaxError if not xml.
+    '''
+
+    # Cache remapped codes, same codes repeats through document.
+    remapped = {}
+    def remap(code, name):
+        if remap_func is None or code is None:
+            return code
+        key = (code, name)
+        if key not in remapped:
+            remapped[key] = remap_func(code, name)
+        return remapped[key]
+
+    # Compile subname patterns.
+    docpatterns = [re.compile(dname) for dname in docnames]
+    tagpatterns = [re.compile(tname) for tname in tagsnames]
+
+    # Document data, filled in order of docpatterns.
+    docdict = {}
+    doc_idx = 0
+    doc_elems = {}
+
+    # Columnar TimeSeries data.
+    columns = {}
+    n_rows = 0
+
+    # Leaf tags texts by name of present TimeSeries.
+    ts_leaves = None
+    ts_depth = 0
+
+    # Reason of bad response.
+    reason_found = False
+    reason_text = None
+
+    # Stack of open tag names.
+    depth = 0
+
+    # Cache of local names by tag.
+    names = {}
+
+    for event, elem in _iterparse(content):
+        name = names.get(elem.tag)
+        if name is None:
+            name = names[elem.tag] = _localname(elem.tag)
+
+        if event == 'start':
+            depth += 1
+
+            # Next document data tag, searched from previous match.
+            if doc_idx < len(docpatterns) and docpatterns[doc_idx].search(name):
+                doc_elems[elem] = name
+                doc_idx += 1
+
+            # Start of TimeSeries.
+            if name == 'timeseries' and ts_leaves is None:
+                ts_leaves = {}
+                ts_depth = depth
+
+            if name == 'reason':
+                reason_found = True
+            continue
+
+        # End event, element content is parsed.
+        is_leaf = len(elem) == 0
+        text = elem.text if is_leaf else None
+
+        # Document data value.
+        if elem in doc_elems:
+            docdict[name] = remap(text, name)
+            del doc_elems[elem]
+
+        # First text tag of bad responses.
+        if name == 'text' and reason_text is None and is_leaf:
+            reason_text = text
+
+        # Collect leaf tags within TimeSeries, grouped by name in order of first appearance.
+        if ts_leaves is not None and is_leaf and text is not None:
+            if name not in ts_leaves:
+                ts_leaves[name] = []
+            ts_leaves[name].append(text)
+
+        # End of TimeSeries, add tags as new row.
+        if name == 'timeseries' and ts_leaves is not None and depth == ts_depth:
+            d = {}
+            for pattern in tagpatterns:
+                for tname, texts in ts_leaves.items():
+                    if not pattern.search(tname):
+                        continue
+                    if tname not in d:
+                        d[tname] = []
+                    if tname in MEASURED_TAGS:
+                        d[tname].extend(remap(ttext, tname) for ttext in texts)
+                    else:
+                        for ttext in texts:
+                            if ttext not in d[tname]:
+                                d[tname].append(remap(ttext, tname))
+
+            # Add row to columns, padding missing values with None.
+            for key, val in d.items():
+                if key not in columns:
+                    columns[key] = [None] * n_rows
+                columns[key].append(val)
+            n_rows += 1
+            for values in columns.values():
+                if len(values) < n_rows:
+                    values.append(None)
+
+            ts_leaves = None
+
+        # Free parsed TimeSeries content.
+        if ts_leaves is not None or name == 'timeseries':
+            _release(elem)
+
+        depth -= 1
+
+    # If bad response, return reason.
+    if reason_found and reason_text is not None:
+        return pd.DataFrame([reason_text], columns=['reason'])
+
+    # If no TimeSeries, return empty df.
+    if n_rows == 0:
+        return pd.DataFrame()
+
+    # Document data columns first, filling TimeSeries missing values, then TimeSeries data.
+    data = {}
+    for key, val in docdict.items():
+        data[key] = [val if v is None else v for v in columns[key]] if key in columns else [val] * n_rows
+    for key, values in columns.items():
+        if key not in data:
+            data[key] = [np.nan if v is None else v for v in values]
+    df = pd.DataFrame(data)
+
+    return df
+
+
+def parse_response_xml_long(content, docnames=('type', 'created', 'domain'), tagsnames=('domain', 'resource', 'type', 'start', 'end', 'resolution', 'quantity', 'amount', 'name', 'voltage', 'nominalp'), remap_func=None):
+    '''
+    Parses entso-e response document to one row per Point, streaming with lxml iterparse.
+
+    :Inputs:
+        -content: Response xml as bytes or str.
+        -docnames: Tag subnames of document data, found in sequence through document.
+        -tagsnames: Tag subnames of TimeSeries data, outside Periods.
+        -remap_func: Function(code, tagname) returning meaning of code, None to keep codes.
+
+    :Outputs:
+        -df: Document, TimeSeries and Period data as categoricals, Point position and values, and timestamp
+         of each Point. Or reason of bad response in column 'reason'.
+
+    :Explained:
+        Points refer to their Period and Periods to their TimeSeries by index, repeated data is
+        taken by index once at the end. Timestamps are start + (position - 1) * resolution of the Period.
+    '''
+
+    # Cache remapped codes, same codes repeats through document.
+    remapped = {}
+    def remap(code, name):
+        if remap_func is None or code is None:
+            return code
+        key = (code, name)
+        if key not in remapped:
+            remapped[key] = remap_func(code, name)
+        return remapped[key]
+
+    # Compile subname patterns.
+    docpatterns = [re.compile(dname) for dname in docnames]
+    tagpatterns = [re.compile(tname) for tname in tagsnames]
+
+    # Document data, filled in order of docpatterns.
+    docdict = {}
+    doc_idx = 0
+    doc_elems = {}
+
+    # Columnar TimeSeries data.
+    ts_columns = {}
+    n_ts = 0
+
+    # Columnar Period data, with index of TimeSeries.
+    period_ts = []
+    period_columns = {'start': [], 'end': [], 'resolution': []}
+
+    # Columnar Point data, with index of Period.
+    point_period = []
+    point_columns = {}
+    n_points = 0
+
+    # Leaf tags of present TimeSeries, Period and Point.
+    ts_leaves = None
+    period = None
+    point = None
+
+    # Reason of bad response.
+    reason_found = False
+    reason_text = None
+
+    # Cache of local names by tag.
+    names = {}
+
+    for event, elem in _iterparse(content):
+        name = names.get(elem.tag)
+        if name is None:
+            name = names[elem.tag] = _localname(elem.tag)
+
+        if event == 'start':
+
+            # Next document data tag, searched from previous match.
+            if doc_idx < len(docpatterns) and docpatterns[doc_idx].search(name):
+                doc_elems[elem] = name
+                doc_idx += 1
+
+            # Start of TimeSeries, Period or Point.
+            if name == 'timeseries' and ts_leaves is None:
+                ts_leaves = {}
+            elif name == 'period' and ts_leaves is not None and period is None:
+                period = {}
+                period_ts.append(n_ts)
+            elif name == 'point' and period is not None and point is None:
+                point = {}
+
+            if name == 'reason':
+                reason_found = True
+            continue
+
+        # End event, element content is parsed.
+        is_leaf = len(elem) == 0
+        text = elem.text if is_leaf else None
+
+        # Document data value.
+        if elem in doc_elems:
+            docdict[name] = remap(text, name)
+            del doc_elems[elem]
+
+        # First text tag of bad responses.
+        if name == 'text' and reason_text is None and is_leaf:
+            reason_text = text
+
+        # Collect leaf tags of innermost Point, Period or TimeSeries.
+        if is_leaf and text is not None:
+            if point is not None:
+                point[name] = text
+            elif period is not None:
+                period.setdefault(name, text)
+            elif ts_leaves is not None:
+                ts_leaves.setdefault(name, text)
+
+        # End of Point, add values to columns, padding missing values with None.
+        if name == 'point' and point is not None:
+            point_period.append(len(period_ts) - 1)
+            for key, val in point.items():
+                if key not in point_columns:
+                    point_columns[key] = [None] * n_points
+                point_columns[key].append(val)
+            n_points += 1
+            for values in point_columns.values():
+                if len(values) < n_points:
+                    values.append(None)
+            point = None
+
+        # End of Period, add time interval and resolution.
+        elif name == 'period' and period is not None:
+            for key, values in period_columns.items():
+                values.append(period.get(key))
+            period = None
+
+        # End of TimeSeries, add tags matching tagsnames as new row.
+        elif name == 'timeseries' and ts_leaves is not None:
+            d = {}
+            for pattern in tagpatterns:
+                for tname, ttext in ts_leaves.items():
+                    if tname not in d and pattern.search(tname):
+                        d[tname] = remap(ttext, tname)
+            for key, val in d.items():
+                if key not in ts_columns:
+                    ts_columns[key] = [None] * n_ts
+                ts_columns[key].append(val)
+            n_ts += 1
+            for values in ts_columns.values():
+                if len(values) < n_ts:
+                    values.append(None)
+            ts_leaves = None
+
+        # Free parsed TimeSeries content.
+        if ts_leaves is not None or name == 'timeseries':
+            _release(elem)
+
+    # If bad response, return reason.
+    if reason_found and reason_text is not None:
+        return pd.DataFrame([reason_text], columns=['reason'])
+
+    # If no Points, return empty df.
+    if n_points == 0:
+        return pd.DataFrame()
+
+    # Index of Period and TimeSeries of each Point.
+    point_period = np.asarray(point_period, dtype=np.int64)
+    point_ts = np.asarray(period_ts, dtype=np.int64)[point_period]
+
+    # Document data, filling TimeSeries missing values.
+    data = {}
+    for key, val in docdict.items():
+        values = [val if v is None else v for v in ts_columns[key]] if key in ts_columns else [val] * n_ts
+        data[key] = _take_categorical(values, point_ts)
+
+    # TimeSeries data and Period data, taken by index.
+    for key, values in ts_columns.items():
+        if key not in data:
+            data[key] = _take_categorical(values, point_ts)
+    for key, values in period_columns.items():
+        data[key] = _take_categorical(values, point_period)
+
+    # Point position and values, as numbers if valid.
+    positions = pd.to_numeric(pd.Series(point_columns.pop('position', [None] * n_points), dtype=object), errors='coerce')
+    data['position'] = positions.values
+    for key, values in point_columns.items():
+        try:
+            data[key] = pd.to_numeric(pd.Series(values, dtype=object)).values
+        except (ValueError, TypeError):
+            data[key] = np.asarray(values, dtype=object)
+
+    # Timestamps of Points.
+    starts = np.asarray(period_columns['start'], dtype=object)[point_period]
+    resolutions = np.asarray(period_columns['resolution'], dtype=object)[point_period]
+    data['timestamp'] = period_timestamps(starts, resolutions, data['position'])
+
+    return pd.DataFrame(data)
+
+
+def _take_categorical(values, idx):
+    '''Returns categorical of values taken by idx, values are factorized once.'''
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    return pd.Categorical.from_codes(codes[idx], categories=uniques)
+
+
+def resolution_offset(resolution):
+    '''
+    Returns (months, timedelta) of ISO 8601 duration resolution, as PT15M, PT60M, P1D, P7D, P1M or P1Y.
+    Returns None if not valid duration.
+    '''
+    match = re.fullmatch(r'P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?', str(resolution))
+    if match is None or resolution in ('P', 'PT'):
+        return None
+    years, months, weeks, days, hours, minutes, seconds = [int(g) if g else 0 for g in match.groups()]
+    return 12 * years + months, pd.Timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def period_timestamps(starts, resolutions, positions):
+    '''
+    Returns DatetimeIndex in UTC of points start + (position - 1) * resolution.
+
+    :Inputs:
+        -starts: Array of period start times, as '%Y-%m-%dT%H:%MZ' strings.
+        -resolutions: Array of period resolutions, as ISO 8601 durations.
+        -positions: Array of point positions, starting at 1.
+    '''
+
+    # Parse each unique start once.
+    starts_codes, starts_uniques = pd.factorize(pd.Series(starts, dtype=object))
+    try:
+        starts_uniques = pd.to_datetime(starts_uniques, format='%Y-%m-%dT%H:%MZ', utc=True)
+    except ValueError:
+        starts_uniques = pd.to_datetime(starts_uniques, utc=True, errors='coerce')
+    start_ns = starts_uniques.tz_convert(None).values.astype('datetime64[ns]')[starts_codes]
+    start_ns[starts_codes < 0] = np.datetime64('NaT')
+
+    # Steps from start.
+    steps = np.asarray(positions, dtype=float) - 1
+
+    # Calculate timestamps per resolution.
+    timestamps = np.full(len(steps), np.datetime64('NaT'), dtype='datetime64[ns]')
+    resolutions = pd.Series(resolutions, dtype=object)
+    for resolution in resolutions.dropna().unique():
+        offset = resolution_offset(resolution)
+        if offset is None:
+            continue
+        months, td = offset
+        mask = (resolutions == resolution).values & ~np.isnan(steps)
+
+        # Fixed length resolutions, vectorized.
+        if months == 0:
+            timestamps[mask] = start_ns[mask] + (steps[mask].astype(np.int64) * td.value).astype('timedelta64[ns]')
+
+        # Calendar resolutions, calculated for each unique start and step.
+        else:
+            pairs = pd.DataFrame({'start': start_ns[mask], 'step': steps[mask].astype(np.int64)})
+            uniques = pairs.drop_duplicates()
+            values = [pd.Timestamp(s) + pd.DateOffset(months=months * k) + td * k if not pd.isnull(s) else pd.NaT for s, k in zip(uniques['start'], uniques['step'])]
+            uniques = uniques.assign(timestamp=pd.to_datetime(values))
+            timestamps[mask] = pairs.merge(uniques, on=['start', 'step'], how='left')['timestamp'].values
+
+    return pd.DatetimeIndex(timestamps).tz_localize('UTC')
+
+
+def parse_nested_xml(content, start_tag=''):
+    '''
+    Parses xml to DataFrame of all leaf tags with columns named "parent-tag", streaming with lxml iterparse.
+
+    :Inputs:
+        -content: Xml as bytes or str.
+        -start_tag: Parse from first tag with this name, default document root.
+
+    :Outputs:
+        -df: Each repeated column starts a new row, copying values of columns before it from previous row.
+    '''
+
+    # Lower start_tag as parsed tag names.
+    start_tag = start_tag.lower() if start_tag else ''
+
+    # Rows of values in order of columns.
+    columns = []
+    col_idx = {}
+    rows = []
+
+    # Stack of open tag names, and depth of start tag.
+    stack = []
+    start_depth = None
+
+    # Cache of local names by tag.
+    names = {}
+
+    for event, elem in _iterparse(content):
+        name = names.get(elem.tag)
+        if name is None:
+            name = names[elem.tag] = _localname(elem.tag)
+
+        if event == 'start':
+            stack.append(name)
+            if start_depth is None and (start_tag == '' or name == start_tag):
+                start_depth = len(stack)
+            continue
+
+        # Leaf tag within start tag.
+        if start_depth is not None and len(stack) > start_depth and len(elem) == 0:
+            column = stack[-2] + '-' + name
+            value = str(elem.text)
+
+            # New column, empty in previous rows.
+            if column not in col_idx:
+                col_idx[column] = len(columns)
+                columns.append(column)
+                for row in rows:
+                    row.append('')
+                if len(rows) == 0:
+                    rows.append([value])
+                else:
+                    rows[-1][-1] = value
+
+            # Column already has value in last row, start new row copying previous columns.
+            elif rows[-1][col_idx[column]] is not np.nan:
+                idx = col_idx[column]
+                rows.append(rows[-1][:idx] + [value] + [np.nan] * (len(columns) - idx - 1))
+
+            # Else add to empty cell.
+            else:
+                rows[-1][col_idx[column]] = value
+
+        # End of start tag.
+        if start_depth is not None and len(stack) == start_depth:
+            stack.pop()
+            break
+
+        # Free parsed children of elements below start tag.
+        if start_depth is not None and len(stack) > start_depth + 1:
+            _release(elem)
+        stack.pop()
+
+    # Create DataFrame once.
+    df = pd.DataFrame(rows, columns=columns)
+    df.replace('', np.nan, inplace=True)
+    df.drop_duplicates(inplace=True)
+
+    # Set columns as float or int if valid in first row.
+    for column in df.columns:
+        try:
+            float(df.at[0, column])
+            df[column] = df[column].astype(float)
+        except ValueError:
+            None
+        try:
+            int(df.at[0, column])
+            df[column] = df[column].astype(int)
+        except ValueError:
+            None
+
+    return df
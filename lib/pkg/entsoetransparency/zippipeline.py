@@ -0,0 +1,218 @@
+'''Parsing of zipped entso-e response documents, members streamed from response bytes and parsed in a process pool when many.'''
+
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from lxml import etree
+from lib.pkg.entsoetransparency.xmlparser import parse_response_xml, parse_response_xml_long
+
+
+# Number of zip members from which members are parsed in a process pool.
+ZIP_PROCESS_POOL_MIN_FILES = 64
+
+# Max number of processes parsing zip members, None for number of cpus.
+ZIP_MAX_PROCESSES = None
+
+# Process pool parsing zip members, shared by all requests and created on first use.
+_PROCESS_POOL = None
+_PROCESS_POOL_LOCK = threading.Lock()
+
+
+def get_process_pool(max_processes=None):
+    '''
+    Returns process pool shared by all requests, created on first use with max_processes, default ZIP_MAX_PROCESSES.
+    Workers are started by forkserver, or spawn if not available, as forking a process running request threads may deadlock.
+    '''
+    global _PROCESS_POOL
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is None:
+            if max_processes is None:
+                max_processes = ZIP_MAX_PROCESSES
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _PROCESS_POOL = ProcessPoolExecutor(max_workers=max_processes or os.cpu_count() or 1, mp_context=multiprocessing.get_context(method))
+        return _PROCESS_POOL
+
+
+def _reset_process_pool(pool):
+    '''Discards broken process pool, a new pool is created on next use.'''
+    global _PROCESS_POOL
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is pool:
+            _PROCESS_POOL = None
+    pool.shutdown(wait=False)
+
+
+def open_zip(content):
+    '''Returns ZipFile of response content bytes or zipfile path, None if not a zipfile.'''
+    if isinstance(content, zipfile.ZipFile):
+        return content
+    try:
+        if isinstance(content, str):
+            return zipfile.ZipFile(content)
+        # BytesIO shares the buffer of immutable bytes, members are read without copying the zipfile.
+        return zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        return None
+
+
+def parse_zip_members(content, names, long_format=False, docnames=None, tagsnames=None):
+    '''
+    Parses zip members to DataFrames with codes not remapped, run in worker processes.
+
+    :Inputs:
+        -content: Zipped content as bytes, ZipFile, or path of zipfile, workers are given a path so zip bytes are not pickled.
+        -names: Names of members to parse.
+
+    :Outputs:
+        -results: List of (name, df, seconds), df is None if member is not xml.
+    '''
+
+    # Parser keyword arguments, parser defaults if not spesified.
+    kwargs = {}
+    if docnames is not None:
+        kwargs['docnames'] = docnames
+    if tagsnames is not None:
+        kwargs['tagsnames'] = tagsnames
+    parse = parse_response_xml_long if long_format else parse_response_xml
+
+    # Parse members, streaming each member from the zipfile.
+    results = []
+    zipf = open_zip(content)
+    try:
+        for name in names:
+            t = time.perf_counter()
+            try:
+                df = parse(zipf.read(name), **kwargs)
+            except etree.XMLSyntaxError:
+                df = None
+            results.append((name, df, time.perf_counter() - t))
+    finally:
+        # Close zipfile opened from path here.
+        if isinstance(content, str):
+            zipf.close()
+
+    return results
+
+
+def parse_zip_content(content, long_format=False, docnames=None, tagsnames=None, max_processes=None, min_files_process_pool=None):
+    '''
+    Parses all xml members of zipped response content into one DataFrame, with codes not remapped.
+
+    :Inputs:
+        -content: Zipped response content as bytes, or ZipFile.
+        -long_format: If True, one row per point.
+        -max_processes: Max worker processes, default ZIP_MAX_PROCESSES.
+        -min_files_process_pool: Number of members from which members are parsed in a process pool, default ZIP_PROCESS_POOL_MIN_FILES.
+
+    :Outputs:
+        -df: All members parsed, concatenated once, in member order.
+        -parse_times: DataFrame of filename, rows and seconds parsing each member, rows None if member is not xml.
+        -failed: Dict of names and content of members not parsed as xml.
+
+    :Explained:
+        Members are split in one chunk per process, each process opens the zipfile by path and reads and parses its members,
+        so members are decompressed in parallel, zip bytes are not pickled to each process, and only DataFrames are returned.
+        Zip bytes not opened from a file are written once to a temporary file, removed after parsing.
+        Processes are of one pool shared by all requests, see get_process_pool(). If the pool is broken, members are parsed in this process.
+    '''
+
+    # Members in zipfile, excluding directories.
+    zipf = open_zip(content)
+    names = [info.filename for info in zipf.infolist() if not info.is_dir()]
+
+    # Parse in shared process pool if many members, else in this process.
+    if max_processes is None:
+        max_processes = ZIP_MAX_PROCESSES
+    if min_files_process_pool is None:
+        min_files_process_pool = ZIP_PROCESS_POOL_MIN_FILES
+    n_processes = min(max_processes or os.cpu_count() or 1, len(names))
+    results = None
+    if len(names) >= min_files_process_pool and n_processes > 1:
+        chunks = [names[i::n_processes] for i in range(n_processes)]
+        zip_path, temp_path = _zipfile_path(content, zipf)
+        pool = get_process_pool(max_processes)
+        try:
+            futures = [pool.submit(parse_zip_members, zip_path, chunk, long_format, docnames, tagsnames) for chunk in chunks]
+            results = {name: (df, seconds) for future in futures for name, df, seconds in future.result()}
+            results = [(name, *results[name]) for name in names]
+        except BrokenProcessPool:
+            print('ERROR:\n\tZip parsing process pool is broken, parsing members in this process.')
+            _reset_process_pool(pool)
+            results = None
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+    if results is None:
+        results = parse_zip_members(zipf, names, long_format, docnames, tagsnames)
+
+    # Members not parsed as xml.
+    failed = {name: zipf.read(name) for name, df, seconds in results if df is None}
+
+    # Combine once.
+    df = concat_frames([df for name, df, seconds in results if df is not None and len(df) > 0])
+    parse_times = pd.DataFrame(
+        [(name, None if df1 is None else len(df1), seconds) for name, df1, seconds in results],
+        columns=['filename', 'rows', 'seconds']
+        )
+
+    return df, parse_times, failed
+
+
+def concat_frames(df_list):
+    '''
+    Returns DataFrames concatenated by columns, categorical columns as union of categories.
+    Concatenating categoricals of differing categories in pd.concat falls back to slow object columns.
+    '''
+
+    if len(df_list) == 0:
+        return pd.DataFrame()
+    if len(df_list) == 1:
+        return df_list[0].reset_index(drop=True)
+
+    # Columns in order of first appearance.
+    columns = list(dict.fromkeys(c for df in df_list for c in df.columns))
+
+    # Concatenate each column, missing columns as missing values.
+    data = {}
+    for column in columns:
+        parts = [df[column] if column in df.columns else pd.Series([None] * len(df), dtype=object) for df in df_list]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            data[column] = pd.Series(pd.api.types.union_categoricals([part.values for part in parts], ignore_order=True))
+        else:
+            data[column] = pd.concat(parts, ignore_index=True)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+def _zipfile_path(content, zipf):
+    '''
+    Returns (path, temp_path) of zipfile for worker processes, temp_path is None if zipfile was opened from a file,
+    else zip bytes are written to a temporary file to be removed by caller.
+    '''
+
+    # Zipfile opened from a file.
+    if isinstance(content, str):
+        return content, None
+    if isinstance(zipf.filename, str) and os.path.isfile(zipf.filename):
+        return zipf.filename, None
+
+    # Zip bytes, or bytes of zipfile opened from file object.
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        zip_bytes = content
+    else:
+        fp = zipf.fp
+        fp.seek(0)
+        zip_bytes = fp.read()
+
+    # Write once to temporary file.
+    fd, temp_path = tempfile.mkstemp(prefix='entsoe-zip-', suffix='.zip')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(zip_bytes)
+    return temp_path, temp_path
@@ -1 +1,3 @@
-from fingridopendataclient import FingridOpenDataClient
\ No newline at end of file
+from .fingridopendataclient import FingridOpenDataClient
+from .asyncfingridopendataclient import AsyncFingridOpenDataClient
+from .fingridpoller import FingridPoller
@@ -0,0 +1,140 @@
+# Import libraries
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from .fingridopendataclient import FingridOpenDataClient
+
+
+class AsyncFingridOpenDataClient(FingridOpenDataClient):
+    '''
+    Fingrid Open Data client making timeperiod requests for many datasets and sub-periods concurrently.
+
+    :How to use:
+    - In async code or notebooks: df_dict = await client.get_data_async(datasets, start_time, end_time)
+    - In scripts: df_dict = client.get_data_concurrent(datasets, start_time, end_time)
+    - Returns the same dict of DataFrames as .get_data().
+    - Concurrency is capped by max_concurrency, calls are paced by the daily quota .ratelimiter.
+
+    :Explained:
+    - Thread pool: This is not non-blocking asyncio I/O. Requests are the blocking requests of the parent client,
+      run on a thread pool of max_concurrency threads behind coroutines, so concurrency is limited by the pool size,
+      and each request holds a thread while waiting on the rate limiter and the response.
+    - Awaitable: The event loop is not blocked while requests run, other coroutines keep running.
+    '''
+
+    def __init__(self, api_key, session=None, ratelimiter=None, max_concurrency=8, subperiod=None):
+
+        # Initialise parent client.
+        super().__init__(api_key, session=session, ratelimiter=ratelimiter)
+
+        # Max concurrent requests and max length of each requested sub-period,
+        # if None sub-periods are planned from dataset resolution and max rows per request.
+        self.max_concurrency = max_concurrency
+        self.subperiod = subperiod
+
+    ################################################################
+    ############## Frontend functions.
+    ################################################################
+
+    async def get_data_async(self, datasets, start_time=None, end_time=None, formatstr="json", n_closematched_datasets=1, closematched_cutoff=0.5, max_concurrency=None):
+        '''
+        Requesting data from Fingrid Api Service concurrently, see .get_data().
+        '''
+
+        # If start time is spesified but end_time is not spesified, set end_time to now.
+        if start_time is not None and end_time is None:
+            end_time = datetime.datetime.now()
+
+        # Get datasets and variableids, matched to spesified requested datasets.
+        datasets, variableids = self._get_datasets_variableids_matches(
+            datasets=datasets,
+            n_closematched_datasets=n_closematched_datasets,
+            closematched_cutoff=closematched_cutoff
+            )
+
+        # If no matches found in datasets.
+        if variableids is None:
+            print("ERROR:\n\tNo matches found in in available databases.\n")
+            return {'ErrorMessage': 'No matches found in databases'}
+
+        # If start_time and end_time is not spesified, get last events for all requesting datasets in one blocking call on default thread pool.
+        if start_time is None and end_time is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self._get_all_requests_last_events, variableids, formatstr)
+
+        # Making concurrent timeperiod requests.
+        df_dict = await self._get_all_requests_timeperiod_events_async(variableids, start_time, end_time, formatstr=formatstr, max_concurrency=max_concurrency)
+
+        # If response is empty, return empty dict with key "No data in requests responses."
+        if df_dict is None:
+            return {'ErrorMessage': 'No data in requests responses'}
+
+        return df_dict
+
+    def get_data_concurrent(self, datasets, start_time=None, end_time=None, formatstr="json", n_closematched_datasets=1, closematched_cutoff=0.5, max_concurrency=None):
+        '''
+        Blocking wrapper of .get_data_async(), for use outside running event loops.
+        '''
+        return asyncio.run(self.get_data_async(datasets, start_time, end_time, formatstr, n_closematched_datasets, closematched_cutoff, max_concurrency))
+
+    ################################################################
+    ############## Backend functions.
+    ################################################################
+
+    def _split_timeperiod(self, variableid, start_time, end_time):
+        '''Splits timeperiod into list of (start, end) sub-periods, planned windows below max rows or no longer than .subperiod.'''
+
+        # Ensure datetimes.
+        start_datetime = datetime.datetime.strptime(self._fixed_datetimestr(start_time), self.static_datetimeformat_str)
+        end_datetime = datetime.datetime.strptime(self._fixed_datetimestr(end_time), self.static_datetimeformat_str)
+
+        # Split into sub-periods.
+        return self._plan_timeperiod_windows(variableid, start_datetime, end_datetime, max_window=self.subperiod)
+
+    async def _get_all_requests_timeperiod_events_async(self, variableids, start_time, end_time, formatstr="json", max_concurrency=None):
+        '''
+        Returns dict of DataFrames containting requesting datasets events in the spesified timeperiod,
+        all datasets and sub-periods requested concurrently.
+        '''
+
+        # If requesting variableids is not list, wrap in list used for looping.
+        if isinstance(variableids, list) == False:
+            variableids = [variableids]
+
+        # Set max concurrent requests.
+        if max_concurrency is None:
+            max_concurrency = self.max_concurrency
+
+        # Create list of (variableid, sub-period start, sub-period end) requests.
+        requests_list = []
+        for variableid in variableids:
+            for sub_start, sub_end in self._split_timeperiod(variableid, start_time, end_time):
+                requests_list.append((variableid, sub_start, sub_end))
+
+        # Dispatch requests on bounded thread pool, each waits on the shared rate limiter.
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix='fingrid-request') as executor:
+            futures = [
+                loop.run_in_executor(executor, self._get_single_request_timeperiod_events, variableid, sub_start, sub_end, formatstr)
+                for variableid, sub_start, sub_end in requests_list
+                ]
+            dfs = await asyncio.gather(*futures)
+
+        # Collect sub-period DataFrames per variableid, in order of requests.
+        df_lists = {variableid: [] for variableid in variableids}
+        for (variableid, sub_start, sub_end), df in zip(requests_list, dfs):
+            if df is not None and len(df) > 0:
+                df_lists[variableid].append(df)
+
+        # Adding requested dataset Name and combined DataFrame response to total request dict,
+        # dropping events at sub-period boundaries requested twice.
+        df_dict = {}
+        for variableid in variableids:
+            name = self.static_datasets_names_by_variableid[variableid]
+            df = pd.concat(df_lists[variableid], ignore_index=True) if len(df_lists[variableid]) > 0 else pd.DataFrame()
+            if 'start_time' in df.columns:
+                df = df.drop_duplicates(subset=['start_time'], keep='first').reset_index(drop=True)
+            df_dict[name] = df
+
+        # Return total request dict of DataFrames.
+        return df_dict
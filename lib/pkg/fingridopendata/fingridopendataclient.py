@@ -2,11 +2,17 @@
 #from statics import FingridApiStatics
 
 # Import libraries 
-from ratelimit import limits
 import datetime
-import difflib
+import os
+import re
+from collections import deque
 import requests
 import pandas as pd
+from lib.mod.apisession import ApiSession
+from lib.mod.timeseriesstore import TimeSeriesStore, find_gaps
+from lib.mod.parquetexport import write_partitioned, read_partitioned
+from lib.mod.ratelimiter import TokenBucket
+from lib.mod.closematcher import CloseMatcher
 
 class FingridOpenDataClient():
     '''
@@ -17,10 +23,15 @@ class FingridOpenDataClient():
     - Request free api_key from the Fingrid Open Data platform, include in this module initialization.
     - Show list of available datasets using the function .show_available_datasets().
     - Extract datasets using the function .get_data(). Returns a dictionary containing the requested data responses.
+    - Requests use a pooled keep-alive session with retries, shared with other clients if spesified as session.
+    - Requests are paced within the daily api quota by a token bucket shared on this host, see .ratelimiter.get_stats().
+    - Keep a local store of datasets up to date using the function .sync(), fetching only timeperiods not already stored.
+    - Get most recent values of many datasets as one wide DataFrame using the function .get_latest_values().
+    - Poll datasets live using the function .poll(), emitting only new events to a callback, file or queue sink.
     
     
     '''
-    def __init__(self, api_key):
+    def __init__(self, api_key, session=None, ratelimiter=None):
 
         # Statics
         self.static_datetimeformat_str = "%Y-%m-%dT%H:%M:%SZ"
@@ -29,8 +40,23 @@ class FingridOpenDataClient():
 
         self.static_datasets_names_list, self.static_datasets_variableids_list, self.static_datasets_formats_list, self.static_datasets_infos_list = self._datasets_values_to_lists()
 
+        # Close-matcher of lowered datasets names.
+        self.static_datasets_names_matcher = CloseMatcher(self.static_datasets_names_list)
+
+        # Datasets names by variableid, and variableids by name, for constant time lookups.
+        self.static_datasets_names_by_variableid = dict(zip(self.static_datasets_variableids_list, self.static_datasets_names_list))
+        self.static_datasets_variableids_by_name = dict(zip(self.static_datasets_names_list, self.static_datasets_variableids_list))
+
+        # Max rows in each timeperiod request, per api restrictions, and estimated datasets time resolutions.
+        self.static_max_rows_per_request = 20000
+        self.static_datasets_resolutions_list = [self._estimate_resolution(name, info) for name, info in zip(self.static_datasets_names_list, self.static_datasets_infos_list)]
+        self.static_datasets_resolutions_by_variableid = dict(zip(self.static_datasets_variableids_list, self.static_datasets_resolutions_list))
+
         self.static_baseurl = 'https://api.fingrid.fi/v1'
 
+        # Max length of request urls, last events of many variableids are requested in batches of urls below this length.
+        self.static_max_url_length = 2000
+
 
         # Initialise inherance from all parent classes, setting fingridapi static data attributes.
         #super().__init__()
@@ -38,6 +64,16 @@ class FingridOpenDataClient():
         # Store users api key.
         self.api_key = api_key
 
+        # Pooled http session used for all requests.
+        self.session = session if session is not None else ApiSession()
+
+        # Rate limiter pacing calls below 10000calls / 24h, per api restrictions,
+        # shared by all threads and processes on this host.
+        # Max calls in any 24h is capacity + rate * 24h = 2000 + 8000 calls, allowing bursts of 2000 calls.
+        if ratelimiter is None:
+            ratelimiter = TokenBucket.shared('fingridopendata', rate=8000/(60*60*24), capacity=2000)
+        self.ratelimiter = ratelimiter
+
     
     ################################################################
     ############## Static Data.
@@ -1369,7 +1405,7 @@ class FingridOpenDataClient():
         if return_df: return df
         else: return None
 
-    def get_data(self, datasets, start_time=None, end_time=None, formatstr="json", n_closematched_datasets=1, closematched_cutoff=0.5, savefolderpath=""):
+    def get_data(self, datasets, start_time=None, end_time=None, formatstr="json", n_closematched_datasets=1, closematched_cutoff=0.5, savefolderpath="", saveformat="csv"):
         '''
         Requesting data from Fingrid Api Service.
 
@@ -1379,6 +1415,7 @@ class FingridOpenDataClient():
             - If start_time and/or end_time is spesified, returns one DataFrame for the timeperiod for each requesting dataset. 
             - If start_time and end_time is not spesified, returns one DataFrame with most recent available values for all requesting datasets.
             - If savefolderpath is spesified, saves requested data responses in this folder in format {DataSetName}_{FromDatetime}_{ToDatetime}.csv 
+            - If saveformat is "parquet", saves typed parquet in savefolderpath/dataset=../area=FI/month=YYYY-MM, read with .read_parquet().
 
         '''
 
@@ -1420,9 +1457,152 @@ class FingridOpenDataClient():
             if df_dict is None: 
                 return {'ErrorMessage': 'No data in requests responses'}
             
+        # If savefolderpath is spesified, save responses.
+        if savefolderpath is not None and len(savefolderpath) > 0:
+            self._save_df_dict(df_dict, savefolderpath, saveformat, start_time, end_time)
+
         # If data in response, return requested datasets Name and Responses as Dict of DataFrames
         return df_dict
 
+    def get_latest_values(self, datasets, n_closematched_datasets=1, closematched_cutoff=0.5):
+        '''
+        Requesting most recent values of many datasets, as one typed wide DataFrame.
+
+        :How to use:
+            - Spesify dataset names or variableids, as in .get_data(). Variableids are looked up directly, without close matching.
+            - Last events are requested in batches of urls below .static_max_url_length, one call per batch.
+            - Returns DataFrame with UTC DatetimeIndex of events start_time, one float64 column per dataset name.
+              Datasets with different start_time are on different rows, latest of all is .ffill().iloc[-1].
+        '''
+
+        # Get variableids, matched to spesified requested datasets.
+        datasets, variableids = self._get_datasets_variableids_matches(
+            datasets=datasets,
+            n_closematched_datasets=n_closematched_datasets,
+            closematched_cutoff=closematched_cutoff
+            )
+
+        # If no matches found in datasets.
+        if variableids is None:
+            print("ERROR:\n\tNo matches found in in available databases.\n")
+            return pd.DataFrame()
+
+        # Get last events in batches.
+        df_dict = self._get_all_requests_last_events(variableids if isinstance(variableids, list) else [variableids])
+        if "Datasets Last Events" not in df_dict:
+            return pd.DataFrame()
+        df = df_dict["Datasets Last Events"]
+
+        # Pivot to one column per dataset, in requested order.
+        df = df.assign(start_time=pd.to_datetime(df['start_time'], utc=True), value=df['value'].astype('float64'))
+        wide = df.pivot_table(index='start_time', columns='dataset_name', values='value', aggfunc='last')
+        wide = wide.reindex(columns=[c for c in dict.fromkeys(datasets if isinstance(datasets, list) else [datasets]) if c in wide.columns])
+        wide.columns.name = None
+
+        return wide.sort_index()
+
+    def sync(self, datasets, start_time, end_time=None, store=None, formatstr="json", n_closematched_datasets=1, closematched_cutoff=0.5, settle_lag=datetime.timedelta(hours=1), subperiod=None):
+        '''
+        Incrementally updates local store of datasets timeperiod events, requesting only timeperiods not already stored.
+
+        :Inputs:
+            -datasets: Dataset names or variableids, close matched as in .get_data().
+            -start_time, end_time: Timeperiod to sync, as in .get_data(), times in UTC. end_time defaults to now.
+            -store: TimeSeriesStore or directory path, defaults to ~/.cache/fingridopendata/store.
+            -settle_lag: Data newer than now - settle_lag is stored, but not marked as covered, and requested again on next sync.
+            -subperiod: Max length of each requested timeperiod, default planned from dataset resolution and max rows per request.
+
+        :Outputs:
+            -df_dict: Dict of dataset name and DataFrame of stored events in the timeperiod, as .get_data().
+             If requests failed, df_dict['FailedWindows'] is DataFrame of dataset_name, variable_id, start_time and end_time of failed windows.
+
+        :Explained:
+            -Gaps: Timeperiods missing in the store coverage index are split in subperiods and requested.
+            -Atomic: Each requested subperiod is written and marked as covered after its response is stored.
+            -Failed: Windows of bad responses are not marked as covered, and requested again on next sync.
+        '''
+
+        # Open store.
+        if store is None:
+            store = os.path.join(os.path.expanduser('~'), '.cache', 'fingridopendata', 'store')
+        if not isinstance(store, TimeSeriesStore):
+            store = TimeSeriesStore(store, time_column='start_time')
+
+        # Timeperiod as UTC datetimes.
+        now = datetime.datetime.utcnow()
+        if end_time is None:
+            end_time = now
+        start_datetime = datetime.datetime.strptime(self._fixed_datetimestr(start_time), self.static_datetimeformat_str)
+        end_datetime = datetime.datetime.strptime(self._fixed_datetimestr(end_time), self.static_datetimeformat_str)
+        settled_datetime = now - settle_lag
+
+        # Get datasets and variableids, matched to spesified requested datasets.
+        datasets, variableids = self._get_datasets_variableids_matches(
+            datasets=datasets,
+            n_closematched_datasets=n_closematched_datasets,
+            closematched_cutoff=closematched_cutoff
+            )
+
+        # If no matches found in datasets.
+        if variableids is None:
+            print("ERROR:\n\tNo matches found in in available databases.\n")
+            return {'ErrorMessage': 'No matches found in databases'}
+
+        # Wrap in list used for looping.
+        if isinstance(variableids, list) == False:
+            variableids = [variableids]
+
+        # Loop on variableids, requesting gaps in store.
+        df_dict = {}
+        failed_list = []
+        for variableid in variableids:
+            name = self.static_datasets_names_by_variableid[variableid]
+            for gap_start, gap_end in store.find_gaps(variableid, start_datetime, end_datetime):
+
+                # Request gap in subperiods.
+                gap_start = gap_start.tz_convert(None).to_pydatetime()
+                gap_end = gap_end.tz_convert(None).to_pydatetime()
+                for sub_start, sub_end in self._plan_timeperiod_windows(variableid, gap_start, gap_end, max_window=subperiod):
+                    failed = []
+                    df = self._get_single_request_timeperiod_events(variableid, sub_start, sub_end, formatstr, failed=failed)
+
+                    # Store subperiod events.
+                    store.write(variableid, self._store_events_df(df))
+
+                    # Mark subperiod as covered until settled, except failed windows.
+                    covered_end = max(sub_start, min(sub_end, settled_datetime))
+                    for ok_start, ok_end in find_gaps(sub_start, covered_end, failed):
+                        store.add_coverage(variableid, ok_start, ok_end)
+                    failed_list.extend((name, variableid, window[0], window[1]) for window in failed)
+
+            # Read stored timeperiod.
+            df_dict[name] = store.read(variableid, start_datetime, end_datetime)
+
+        # Failed windows, requested again on next sync.
+        if len(failed_list) > 0:
+            print(f"ERROR:\n\t{len(failed_list)} windows failed and are not marked as stored, see df_dict['FailedWindows'].")
+            df_dict['FailedWindows'] = pd.DataFrame(failed_list, columns=['dataset_name', 'variable_id', 'start_time', 'end_time'])
+
+        return df_dict
+
+    def poll(self, datasets, sink, interval=None, start=True, **kwargs):
+        '''
+        Returns FingridPoller polling last events of datasets, emitting only new events to sink, started if start.
+        Sink is a callback, a queue.Queue, a csv or parquet filepath, or an object with .write(df) and .close().
+        Datasets are polled at their resolution, or at interval if spesified, within the daily api quota.
+        '''
+        from lib.pkg.fingridopendata.fingridpoller import FingridPoller
+        poller = FingridPoller(self, datasets, sink, interval=interval, **kwargs)
+        return poller.start() if start else poller
+
+    def read_parquet(self, rootpath, datasets=None, start_time=None, end_time=None):
+        '''
+        Reads typed parquet files saved by .get_data(saveformat="parquet"), memory-mapped.
+        Filtered by dataset names and start_time in [start_time, end_time), times in UTC.
+        '''
+        df = read_partitioned(rootpath, dataset=datasets, start=start_time, end=end_time)
+        return df.rename(columns={'timestamp': 'start_time'})
+
     def set_apikey(self, api_key):
         self.api_key = api_key
     
@@ -1482,40 +1662,46 @@ class FingridOpenDataClient():
 
     def _url_commaseparatedvariableids_substr(self, variableids):
         '''
-        Create url substring of multiple variableids used in get_latest request.
+        Create url substring of multiple variableids used in get_latest request, variableids separated by url encoded comma.
         '''
-         # Create empty string to contain requests variableids substring.
-        url_substr = ""
 
-        # If variableids is list of multiple ids.
-        if isinstance(variableids, list):
+        # If variableids is not multiple ids.
+        if not isinstance(variableids, list):
 
-            # Loop on requesting VariaBleIds.
-            for variableid in variableids:
+            # If variableids is None, return None
+            if variableids is None: return None
 
-                # If variableid is None, skip.
-                if variableid is None: continue
-            
-                # Add variableid to url string.
-                url_substr = url_substr + str(variableid)
+            return str(variableids)
 
-                # If not last VariableId in list, add stringpart between VariableIds in url.
-                if variableid != variableids[-1] and variableids[-1] is not None:
+        # Join requesting variableids, skipping None.
+        return "%2C".join(str(variableid) for variableid in variableids if variableid is not None)
 
-                    # Add stringpart between VariableIds in url.
-                    url_substr = url_substr + "%2C"
-        
-        # If variableids is not multiple ids.
-        else:
+    def _batch_variableids(self, variableids, formatstr='json', max_url_length=None):
+        '''Splits variableids into batches, each batch in a last events request url not longer than max_url_length.'''
 
-            # If variableids is None, return None
-            if variableids is None: return None
-            
-            # Add to single variableid to url str.
-            url_substr = url_substr + str(variableids)
+        if max_url_length is None:
+            max_url_length = self.static_max_url_length
+
+        # Length of url without variableids.
+        base_length = len(f"{self.static_baseurl}/variable/event/{formatstr}/")
+
+        # Fill batches until url is full, each variableid adds its length and a separator.
+        batches = []
+        batch = []
+        length = base_length
+        for variableid in dict.fromkeys(v for v in variableids if v is not None):
+            add_length = len(str(variableid)) + (3 if len(batch) > 0 else 0)
+            if len(batch) > 0 and length + add_length > max_url_length:
+                batches.append(batch)
+                batch = []
+                length = base_length
+                add_length = len(str(variableid))
+            batch.append(variableid)
+            length += add_length
+        if len(batch) > 0:
+            batches.append(batch)
 
-        # Return request url variable substring.
-        return url_substr   
+        return batches
 
     def _get_datasets_variableids_matches(self, datasets, n_closematched_datasets=1, closematched_cutoff=0.5):
         '''Returns spesified datasets variableids'''
@@ -1543,23 +1729,21 @@ class FingridOpenDataClient():
             except ValueError:
                 None
                 #dset = str(dset)
-            # If spesified dataset exist in list of available variable ids.
-            if dset in self.static_datasets_variableids_list:
+            # If spesified dataset exist in available variable ids.
+            if dset in self.static_datasets_names_by_variableid:
 
                 # Spesified dataset is variableid, append to variableids directly.
                 matched_variableids.append(dset)
 
                 # Append matched dataset to list of matched datasets.
-                matched_list_idx = self.static_datasets_variableids_list.index(dset)
-                matched_dataset = self.static_datasets_names_list[matched_list_idx]
-                matched_datasets.append(matched_dataset)
+                matched_datasets.append(self.static_datasets_names_by_variableid[dset])
             
             # If spesified dataset was not found direclty in list of available variableids.
             elif isinstance(dset, str):
 
                 # Search list of available dataset names for match on spesified dataset.
-                avail_data_list_lowered = [each_string.lower() for each_string in self.static_datasets_names_list]
-                matches = difflib.get_close_matches(dset.lower(), avail_data_list_lowered, n=n_closematched_datasets, cutoff=closematched_cutoff)
+                avail_data_list_lowered = self.static_datasets_names_matcher.normalized
+                matches = self.static_datasets_names_matcher.get_close_matches(dset.lower(), n=n_closematched_datasets, cutoff=closematched_cutoff)
 
                 # If matches on spesified dataset was found in list of available datasets.
                 if len(matches) > 0:
@@ -1568,7 +1752,7 @@ class FingridOpenDataClient():
                     for match in matches:
 
                         # Append matched dataset and variableid to lists.
-                        matched_list_idx = avail_data_list_lowered.index(match)
+                        matched_list_idx = self.static_datasets_names_matcher.index(match)
                         matched_variableid = self.static_datasets_variableids_list[matched_list_idx]
                         matched_dataset = self.static_datasets_names_list[matched_list_idx]
                         matched_variableids.append(matched_variableid)
@@ -1596,7 +1780,7 @@ class FingridOpenDataClient():
                         for name_match in keyword_matched_list:
 
                             # Append as matched dataset.
-                            matched_list_idx = avail_data_list_lowered.index(name_match)
+                            matched_list_idx = self.static_datasets_names_matcher.index(name_match)
                             matched_variableid = self.static_datasets_variableids_list[matched_list_idx]
                             matched_dataset = self.static_datasets_names_list[matched_list_idx]
                             matched_variableids.append(matched_variableid)
@@ -1620,100 +1804,189 @@ class FingridOpenDataClient():
         # Return the matched datasets and variableids
         return matched_datasets, matched_variableids
 
-    # Limit calls to 10000calls / 24h, per api restrictions.
-    @limits(calls=10000, period=60*60*24) 
-    def _call_api(self, url):
+    def _call_api(self, url, headers=None):
         '''
         Makes request call to Fingrid Api, returns response.
+        Calls are limited to 10000calls / 24h, per api restrictions, by waiting on .ratelimiter.
+        Extra headers, as If-None-Match of conditional requests, are added to the api key header.
         '''
         #print(url)
-        headers = {'x-api-key': self.api_key }
-        response = requests.get(url, headers=headers)
+        self.ratelimiter.acquire()
+        request_headers = {'x-api-key': self.api_key }
+        if headers is not None:
+            request_headers.update(headers)
+        response = self.session.get(url, headers=request_headers)
         return response
 
-    def _get_single_request_timeperiod_events(self, variableid, start_time, end_time, formatstr):
+    def _estimate_resolution(self, name, info):
         '''
-        Requests all data in timeperiod for single dataset.
+        Estimates time resolution of dataset from its name and info text, as timedelta.
+        Finest resolution mentioned is used, unknown resolutions are taken as 3 minutes as real time data.
         '''
 
-        # Create DataFrame for storing all requested data.
-        df = pd.DataFrame()
+        text = f'{name} {info}'.lower()
 
-        # Construct timeperiod baseurl.
-        baseurl = f"{self.static_baseurl}/variable/{variableid}/events/{formatstr}?" 
+        # Explicit update interval in minutes.
+        minutes = [int(m) for m in re.findall(r'(\d+)[ -]min', text)]
+        if len(minutes) > 0:
+            return datetime.timedelta(minutes=min(minutes))
 
-        # Store start_time and end_time as list of tuples
-        start_datetime = datetime.datetime.strptime(self._fixed_datetimestr(start_time), self.static_datetimeformat_str)
-        end_datetime = datetime.datetime.strptime(self._fixed_datetimestr(end_time), self.static_datetimeformat_str)
+        # Real time data is updated every 3 minutes.
+        if 'real time' in text or 'real-time' in text or 'every minute' in text:
+            return datetime.timedelta(minutes=3)
 
-        timeperiods = [(start_datetime, end_datetime)]
-        
-        # Create boolean flag for possible multiple request to obtain data for full timeperiod in large requests.
-        request_more_data_bool = True
-        
-        # Begin while loop, looping until finished or worst case 1000 loops.
-        c = 0
-        while request_more_data_bool:
+        # Hourly, daily and weekly data.
+        if 'hourly' in text or re.search(r'\bhour\b', text):
+            return datetime.timedelta(hours=1)
+        if 'daily' in text:
+            return datetime.timedelta(days=1)
+        if 'weekly' in text:
+            return datetime.timedelta(weeks=1)
 
-            # Loop on list of requesting timeperiods.
-            for timeperiod in timeperiods:
+        return datetime.timedelta(minutes=3)
 
-        
-                # Adding timeperiod substr to create full request url.
-                timevariables_str = self._url_timeparameter_substr(timeperiod[0], timeperiod[1])
-                url = f'{baseurl}{timevariables_str}'
+    def _get_resolution(self, variableid):
+        '''Returns estimated time resolution of dataset variableid, 3 minutes if not known.'''
+        return self.static_datasets_resolutions_by_variableid.get(variableid, datetime.timedelta(minutes=3))
+
+    def _plan_timeperiod_windows(self, variableid, start_datetime, end_datetime, max_window=None, fill=0.9):
+        '''
+        Splits timeperiod into list of (start, end) windows with estimated rows just under max rows per request.
+        Rows are estimated from dataset resolution, filling windows to fill fraction of the max rows, or max_window if spesified.
+        '''
+
+        # Window length of estimated rows.
+        if max_window is None:
+            max_window = self._get_resolution(variableid) * int(self.static_max_rows_per_request * fill)
+
+        # Split timeperiod into windows.
+        windows = []
+        while start_datetime < end_datetime:
+            window_end = min(start_datetime + max_window, end_datetime)
+            windows.append((start_datetime, window_end))
+            start_datetime = window_end
+
+        return windows
+
+    def _get_single_request_timeperiod_events(self, variableid, start_time, end_time, formatstr, failed=None):
+        '''
+        Requests all data in timeperiod for single dataset, in planned windows below max rows per request.
+        If a window still has too many rows, only that window is bisected, completed windows are kept.
+        Returns one DataFrame of all windows, in time order.
+        Windows of bad responses are skipped, and appended as (start, end) datetimes to failed if spesified.
+        '''
 
-                # Perform timeperiod request.
-                response = self._call_api(url)
+        # Construct timeperiod baseurl.
+        baseurl = f"{self.static_baseurl}/variable/{variableid}/events/{formatstr}?"
 
-                # If response dont contain requested data.
-                if response.ok == False:
+        # Store start_time and end_time as datetimes.
+        start_datetime = datetime.datetime.strptime(self._fixed_datetimestr(start_time), self.static_datetimeformat_str)
+        end_datetime = datetime.datetime.strptime(self._fixed_datetimestr(end_time), self.static_datetimeformat_str)
 
-                    # If message that requested row count is too large.
-                    if "Requested row count is too large" in response.text:
+        # Queue of windows to request, in time order.
+        windows = deque(self._plan_timeperiod_windows(variableid, start_datetime, end_datetime))
 
-                        # Split all timeperiods in list of timeperiods at periods centerdatetime.
-                        # Loop on list of requesting timeperiods.
-                        new_timeperiods = []
-                        for timeperiod in timeperiods:
+        # Smallest window bisected, requests are made in whole seconds.
+        min_window = datetime.timedelta(minutes=1)
 
+        # Request windows until all done.
+        df_list = []
+        while len(windows) > 0:
+            window = windows.popleft()
 
+            # Adding timeperiod substr to create full request url.
+            url = f'{baseurl}{self._url_timeparameter_substr(window[0], window[1])}'
 
-                            # Split timeperiod at centerdatetime, adding the two subtimeperiods to the new timeperiodslist.
-                            centertime = timeperiod[0] + (timeperiod[1] - timeperiod[0]) / 2
-                            new_timeperiods.append((timeperiod[0], centertime))
-                            new_timeperiods.append((centertime, timeperiod[1]))
-                        
-                        # Setting new list of timeperiods as timeperiods.
-                        timeperiods = new_timeperiods
-                        
-                        # Increment loop counter
-                        c += 1
+            # Perform timeperiod request.
+            response = self._call_api(url)
 
-                        # Stop this for loop, starts new loop with new list of timeperiods.
-                        break
-                
-                # If response contains requested data.
+            # If response contains requested data, keep window data.
+            if response.ok:
+                df_list.append(pd.DataFrame(response.json()))
+
+            # If requested row count is too large, bisect this window and request halves next.
+            elif "Requested row count is too large" in response.text and window[1] - window[0] > min_window:
+                centertime = window[0] + (window[1] - window[0]) / 2
+                centertime = centertime.replace(microsecond=0)
+                windows.appendleft((centertime, window[1]))
+                windows.appendleft((window[0], centertime))
+
+            # Else bad response, print message and skip window.
+            else:
+                print(f"ERROR:\n\tBad response for variableid {variableid} in {window[0]} - {window[1]}:\n\t{response.text}\n")
+                if failed is not None:
+                    failed.append(window)
+
+        # If no data, return empty DataFrame.
+        df_list = [df for df in df_list if len(df) > 0]
+        if len(df_list) == 0:
+            return pd.DataFrame()
+
+        # Combine windows once, dropping events at window boundaries requested twice.
+        df = pd.concat(df_list, ignore_index=True)
+        if 'start_time' in df.columns:
+            df = df.drop_duplicates(subset=['start_time'], keep='first').reset_index(drop=True)
+
+        # Return total requests DataFrame.
+        return df
+
+    def _parquet_schema(self):
+        '''Returns arrow schema of saved parquet files, values as float32 and times as UTC.'''
+        import pyarrow as pa
+        return pa.schema([
+            pa.field('timestamp', pa.timestamp('ns', tz='UTC')),
+            pa.field('end_time', pa.timestamp('ns', tz='UTC')),
+            pa.field('variable_id', pa.int32()),
+            pa.field('value', pa.float32()),
+            ])
+
+    def _save_df_dict(self, df_dict, savefolderpath, saveformat="csv", start_time=None, end_time=None):
+        '''Saves requested DataFrames in savefolderpath, as csv files per dataset or typed partitioned parquet.'''
+
+        # Ensure folder exists.
+        os.makedirs(savefolderpath, exist_ok=True)
+
+        # Loop on requested datasets.
+        for name, df in df_dict.items():
+
+            # Skip if no data.
+            if not isinstance(df, pd.DataFrame) or len(df) == 0:
+                continue
+
+            # Save as typed parquet, partitioned by dataset and month of start_time.
+            if saveformat == "parquet":
+                if 'dataset_name' in df.columns:
+                    frame = df.rename(columns={'dataset_name': 'dataset', 'start_time': 'timestamp'})
                 else:
+                    frame = self._store_events_df(df).rename(columns={'start_time': 'timestamp'})
+                    frame['dataset'] = name
+                    frame['variable_id'] = self.static_datasets_variableids_by_name[name]
+                frame['area'] = 'FI'
+                write_partitioned(frame, savefolderpath, self._parquet_schema())
 
-                    # Append DataFrame from response dict json to total request response DataFrame.
-                    df = df.append(pd.DataFrame(response.json()))
+            # Save as csv, in format {DataSetName}_{FromDatetime}_{ToDatetime}.csv.
+            else:
+                from_str = self._fixed_datetimestr(start_time).replace(':', '') if start_time is not None else datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+                to_str = self._fixed_datetimestr(end_time).replace(':', '') if end_time is not None else from_str
+                filename = re.sub(r'[\\/:*?"<>|]+', '_', f'{name}_{from_str}_{to_str}.csv')
+                df.to_csv(os.path.join(savefolderpath, filename), index=False)
 
-            # If current timeperiod is last in list of timeperiods.
-            #if timeperiod == timeperiods[-1]:
+    def _store_events_df(self, df):
+        '''Returns timeperiod events df with typed value and UTC datetime columns, as stored by .sync().'''
 
-                # Timeperiods request is finished, convert datetime strings to datetime objects.
-                #df["start_time"] = pd.to_datetime(df["start_time"])
-                #df["end_time"] = pd.to_datetime(df["end_time"])
-                
-                # return total requests DataFrame
-                return df
+        # Keep only event columns.
+        if df is None or len(df) == 0:
+            return pd.DataFrame(columns=['value', 'start_time', 'end_time'])
+        df = df[[c for c in ['value', 'start_time', 'end_time'] if c in df.columns]].copy()
 
+        # Convert types.
+        df['value'] = pd.to_numeric(df['value'], errors='coerce').astype('float64')
+        for column in ['start_time', 'end_time']:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], utc=True)
 
+        return df.reset_index(drop=True)
 
-            # Increment loop counter
-            c += 1
-                    
     def _get_all_requests_timeperiod_events(self, variableids, start_time, end_time, formatstr="json"):
         '''
         Returns dict of DataFrames containting requesting datasets events in the spesified timeperiod.
@@ -1735,57 +2008,75 @@ class FingridOpenDataClient():
             df = self._get_single_request_timeperiod_events(variableid, start_time, end_time, formatstr)
             
             # Adding requested dataset Name and DataFrame response to total request dict.
-            df_dict[self.static_datasets_names_list[self.static_datasets_variableids_list.index(variableid)]] = df
+            df_dict[self.static_datasets_names_by_variableid[variableid]] = df
             
         # Return total request dict of DataFrames.
         return df_dict
 
+    def _last_events_df(self, df):
+        '''Returns last events df with dataset names looked up by variableid, and typed columns.'''
+
+        columns = ['dataset_name', 'variable_id', 'start_time', 'end_time', 'value']
+        if df is None or len(df) == 0:
+            df = pd.DataFrame(columns=columns[1:])
+
+        # Add column of dataset names, looked up by variableid.
+        df['variable_id'] = pd.to_numeric(df['variable_id'], errors='coerce').astype('Int64')
+        df['dataset_name'] = df['variable_id'].map(self.static_datasets_names_by_variableid)
+
+        # Rearrange order of columns.
+        df = df[columns].copy()
+
+        # Convert datetime strings to datetime objects, and values to numbers.
+        df['start_time'] = pd.to_datetime(df['start_time'])
+        df['end_time'] = pd.to_datetime(df['end_time'])
+        df['value'] = pd.to_numeric(df['value'], errors='coerce')
+
+        return df
+
     def _get_all_requests_last_events(self, variableids, formatstr='json'):
         '''
         Returns dict of single DataFrame containting all requesting datasets last registered events.
+        Many variableids are requested in batches of urls below .static_max_url_length.
         '''
 
-        # Create DataFrame for storing all requested data.
-        df = pd.DataFrame()
+        # Wrap single variableid in list.
+        if not isinstance(variableids, list):
+            variableids = [variableids]
 
-        # Construct last event request url.
-        url = f"{self.static_baseurl}/variable/event/{formatstr}/{self._url_commaseparatedvariableids_substr(variableids)}"
+        # Perform last events request of each batch.
+        df_list = []
+        errors = []
+        for batch in self._batch_variableids(variableids, formatstr=formatstr):
 
-        # Perform last events request.
-        response = self._call_api(url)
+            # Construct last event request url.
+            url = f"{self.static_baseurl}/variable/event/{formatstr}/{self._url_commaseparatedvariableids_substr(batch)}"
+            response = self._call_api(url)
 
-        # If response is bad, return dict with DataFrame cintaining errormessage.
-        if response.ok == False:
-            errordict = {}
-            errordict["ErrorMessage"] = pd.DataFrame([response.json()])
-            return response.json()
-        
-        # If response is OK.
-        else:
+            # If response is bad, print errormessage and continue with next batch.
+            if response.ok == False:
+                print(f"ERROR:\n\tLast events request of {len(batch)} variableids failed: {response.status_code} {response.text[:200]}")
+                errors.append(response)
+                continue
 
-            # Create DataFrame from response dict.
-            df = pd.DataFrame(response.json())
+            df_list.append(pd.DataFrame(response.json()))
 
-            # Add column of dataset names
-            ds_names = []
-            
-            for idx, row in df.iterrows():
-                ds_names.append(self.static_datasets_names_list[self.static_datasets_variableids_list.index(row["variable_id"])])
-            df["dataset_name"] = ds_names
+        # If all responses are bad, return errormessage of first response.
+        if len(df_list) == 0 and len(errors) > 0:
+            try:
+                return errors[0].json()
+            except ValueError:
+                return {'ErrorMessage': errors[0].text}
 
-            # Rearrange order of columns.
-            df = df[['dataset_name', 'variable_id', 'start_time', 'end_time', 'value']]
+        # Combine batches once.
+        df = self._last_events_df(pd.concat(df_list, ignore_index=True) if len(df_list) > 0 else None)
 
-            # Convert datetime strings to datetime objects.
-            df['start_time'] = pd.to_datetime(df['start_time'])
-            df['end_time'] = pd.to_datetime(df['end_time'])
-            
-            # Create response dict containing DataFrame.
-            df_dict = {}
-            df_dict["Datasets Last Events"] = df
+        # Create response dict containing DataFrame.
+        df_dict = {}
+        df_dict["Datasets Last Events"] = df
 
-            # Return dict containing DataFrame of datasets last events.
-            return df_dict 
+        # Return dict containing DataFrame of datasets last events.
+        return df_dict
 
 
 ################################################################
@@ -0,0 +1,289 @@
+'''Live poller of Fingrid Open Data datasets, emitting only new events to a sink.'''
+
+import datetime
+import math
+import queue
+import threading
+import time
+import pandas as pd
+from lib.mod.sinks import open_sink
+
+
+# Api quota of calls per 24h, per api restrictions.
+POLLER_DAILY_QUOTA = 10000
+
+# Share of daily quota planned for polling, leaving calls for other requests on this host.
+POLLER_QUOTA_SHARE = 0.5
+
+# Min and max interval between polls of a dataset, datasets are polled at their resolution within these.
+POLLER_MIN_INTERVAL = datetime.timedelta(minutes=1)
+POLLER_MAX_INTERVAL = datetime.timedelta(hours=1)
+
+
+class CallbackSink():
+    '''Sink calling callback with each DataFrame of new events.'''
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, df):
+        self.callback(df)
+
+    def close(self):
+        None
+
+
+class QueueSink():
+    '''Sink putting each DataFrame of new events in queue, for consumers in other threads.'''
+
+    def __init__(self, q=None):
+        self.queue = q if q is not None else queue.Queue()
+
+    def write(self, df):
+        self.queue.put(df)
+
+    def close(self):
+        None
+
+
+def open_poller_sink(sink):
+    '''Returns sink of callable, queue, filepath (csv, or parquet for .parquet and .pq) or sink with .write(df).'''
+    if isinstance(sink, queue.Queue):
+        return QueueSink(sink)
+    if isinstance(sink, str):
+        return open_sink(sink, index=False)
+    if callable(sink) and not hasattr(sink, 'write'):
+        return CallbackSink(sink)
+    return sink
+
+
+class FingridPoller():
+    '''
+    Polls last events of Fingrid datasets, emitting only new or changed events to sink.
+
+    :How to use:
+        - poller = FingridPoller(client, datasets, sink).start(), stop with poller.stop(), or use as context manager.
+        - Sink is a callback, a queue.Queue, a csv or parquet filepath, or an object with .write(df) and .close().
+        - poller.poll_once() polls all due datasets once in the calling thread, returns new events.
+
+    :Explained:
+        -Scheduled: Datasets are grouped by resolution, each group polled at its resolution within POLLER_MIN_INTERVAL and POLLER_MAX_INTERVAL.
+        -Batched: Each group is requested in last events batches of urls below client .static_max_url_length.
+        -Conditional: Requests send If-None-Match of last response ETag, not modified responses are skipped.
+        -Change-only: Events are emitted only if start_time is newer, or value changed, since last emitted event of dataset.
+         Last events and ETags are kept only after events are written to sink, if sink fails the events are emitted again on next poll.
+        -Quota: Planned calls per 24h are kept below quota_share of daily_quota by widening intervals, calls are also paced by client .ratelimiter.
+    '''
+
+    def __init__(self, client, datasets, sink, interval=None, quota_share=POLLER_QUOTA_SHARE, daily_quota=POLLER_DAILY_QUOTA, formatstr='json'):
+
+        # Responses are parsed as json.
+        if formatstr != 'json':
+            raise ValueError(f'Polling supports only json format, not {formatstr}')
+
+        # Client making requests, and sink of new events.
+        self.client = client
+        self.sink = open_poller_sink(sink)
+        self.formatstr = formatstr
+
+        # Variableids of datasets.
+        names, variableids = client._get_datasets_variableids_matches(datasets)
+        if variableids is None:
+            raise ValueError(f'No matching datasets found for {datasets}')
+        variableids = variableids if isinstance(variableids, list) else [variableids]
+        self.variableids = list(dict.fromkeys(variableids))
+
+        # Schedule of groups, as interval and variableids batches.
+        self.daily_quota = daily_quota
+        self.quota_share = quota_share
+        self.schedule = self._plan_schedule(interval)
+
+        # Last emitted (start_time, value) per variableid, and ETag per batch url.
+        self._last = {}
+        self._etags = {}
+
+        # Next poll time of each group, all due at start.
+        self._next = {i: 0.0 for i in range(len(self.schedule))}
+
+        # Thread and stop event, and if thread closes sink when finished, as stop timed out.
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._close_when_finished = False
+
+        # Counters.
+        self._counts = {'polls': 0, 'calls': 0, 'not_modified': 0, 'errors': 0, 'events': 0, 'emitted': 0}
+
+    def start(self):
+        '''Starts polling in background thread, returns self.'''
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._running = True
+        self._close_when_finished = False
+        self._thread = threading.Thread(target=self._run, name='fingrid-poller', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        '''Stops polling thread, waiting for running poll to finish, and closes sink. Returns False if poll is still running after timeout.'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+        # If poll is still running, sink is closed by polling thread when finished.
+        with self._lock:
+            if self._running:
+                self._close_when_finished = True
+                print(f'WARNING: Fingrid poll still running after {timeout}s, sink is closed when it finishes.')
+                return False
+        self.sink.close()
+        return True
+
+    def is_running(self):
+        '''Returns True if polling thread is running.'''
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll_once(self, force=False):
+        '''Polls groups due now, or all groups if force, emits and returns DataFrame of new events.'''
+
+        now = time.monotonic()
+        df_list = []
+        last = {}
+        etags = {}
+        for i, (interval, batches) in enumerate(self.schedule):
+            if not force and self._next[i] > now:
+                continue
+            self._next[i] = now + interval.total_seconds()
+            for batch in batches:
+                df = self._poll_batch(batch, last, etags)
+                if df is not None and len(df) > 0:
+                    df_list.append(df)
+
+        with self._lock:
+            self._counts['polls'] += 1
+
+        # Emit new events, kept as last events when written.
+        df = pd.concat(df_list, ignore_index=True) if len(df_list) > 0 else pd.DataFrame()
+        if len(df) > 0:
+            self.sink.write(df)
+        self._last.update(last)
+        self._etags.update(etags)
+        with self._lock:
+            self._counts['emitted'] += len(df)
+        return df
+
+    def get_planned_calls_per_day(self):
+        '''Returns number of calls per 24h planned by schedule.'''
+        return sum(len(batches) * 86400 / interval.total_seconds() for interval, batches in self.schedule)
+
+    def get_stats(self):
+        '''Returns dict of polls, calls, not modified responses, errors, received and emitted events, and planned calls per 24h.'''
+        with self._lock:
+            stats = dict(self._counts)
+        stats['planned_calls_per_day'] = self.get_planned_calls_per_day()
+        return stats
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        '''Polls due groups until stopped, sleeping until next group is due, and closes sink if stop timed out.'''
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f'ERROR:\n\tFingrid poll failed: {e}')
+                with self._lock:
+                    self._counts['errors'] += 1
+            wait = max(0.0, min(self._next.values()) - time.monotonic())
+            self._stop.wait(wait)
+
+        # Close sink if stop timed out waiting for this poll.
+        with self._lock:
+            self._running = False
+            close = self._close_when_finished
+        if close:
+            self.sink.close()
+
+    def _poll_batch(self, batch, last, etags):
+        '''
+        Requests last events of batch, conditional on ETag, returns DataFrame of new events, None if not modified or bad.
+        Last events and ETag of response are added to last and etags dicts, kept by poll_once() when events are written.
+        '''
+
+        # Conditional request on last ETag of url.
+        url = f"{self.client.static_baseurl}/variable/event/{self.formatstr}/{self.client._url_commaseparatedvariableids_substr(batch)}"
+        etag = self._etags.get(url)
+        response = self.client._call_api(url, headers={'If-None-Match': etag} if etag is not None else None)
+        with self._lock:
+            self._counts['calls'] += 1
+
+        # Not modified.
+        if response.status_code == 304:
+            with self._lock:
+                self._counts['not_modified'] += 1
+            return None
+
+        # Bad response.
+        if not response.ok:
+            print(f"ERROR:\n\tLast events request of {len(batch)} variableids failed: {response.status_code} {response.text[:200]}")
+            with self._lock:
+                self._counts['errors'] += 1
+            return None
+
+        # ETag of response.
+        if response.headers.get('ETag') is not None:
+            etags[url] = response.headers['ETag']
+
+        # Events of response.
+        df = self.client._last_events_df(pd.DataFrame(response.json()))
+        with self._lock:
+            self._counts['events'] += len(df)
+
+        # Keep only events newer, or changed, since last emitted event of dataset.
+        new = []
+        for variableid, start_time, value in zip(df['variable_id'], df['start_time'], df['value']):
+            previous = last.get(variableid, self._last.get(variableid))
+            is_new = previous is None or start_time > previous[0] or (start_time == previous[0] and not _equal_values(value, previous[1]))
+            new.append(is_new)
+            if is_new:
+                last[variableid] = (start_time, value)
+
+        return df[new].reset_index(drop=True)
+
+    def _plan_schedule(self, interval=None):
+        '''
+        Returns list of (interval, batches) groups of variableids polled at same interval.
+        If planned calls per 24h exceeds quota_share of daily_quota, all intervals are widened by same factor.
+        '''
+
+        # Group variableids by interval, resolution within min and max interval if interval not spesified.
+        groups = {}
+        for variableid in self.variableids:
+            group_interval = interval if interval is not None else min(max(self.client._get_resolution(variableid), POLLER_MIN_INTERVAL), POLLER_MAX_INTERVAL)
+            groups.setdefault(group_interval, []).append(variableid)
+
+        # Batches of each group.
+        schedule = [(group_interval, self.client._batch_variableids(group, formatstr=self.formatstr)) for group_interval, group in sorted(groups.items())]
+
+        # Widen intervals to stay within quota.
+        budget = self.daily_quota * self.quota_share
+        calls = sum(len(batches) * 86400 / group_interval.total_seconds() for group_interval, batches in schedule)
+        if calls > budget:
+            factor = calls / budget
+            schedule = [(datetime.timedelta(seconds=math.ceil(group_interval.total_seconds() * factor)), batches) for group_interval, batches in schedule]
+            print(f'WARNING: Polling would make {calls:.0f} calls per 24h, above {budget:.0f} calls budget, intervals are widened by {factor:.2f}.')
+
+        return schedule
+
+
+def _equal_values(a, b):
+    '''Returns True if values are equal, also when both are missing.'''
+    if pd.isna(a) and pd.isna(b):
+        return True
+    return a == b
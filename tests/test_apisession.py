@@ -0,0 +1,77 @@
+'''Tests of pooled api session retries and backoff, with fake responses and sleeps.'''
+
+import pytest
+import requests
+from lib.mod import apisession
+from lib.mod.apisession import ApiSession
+
+
+def fake_response(status=200, headers=None):
+    '''Returns requests.Response of status.'''
+    response = requests.Response()
+    response._content = b''
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+def make_session(monkeypatch, results, **kwargs):
+    '''Returns session answering calls with results in order, raising exceptions, and list of slept seconds.'''
+    session = ApiSession(**kwargs)
+    results = list(results)
+    sleeps = []
+
+    def get(url, headers=None, **kw):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(session.session, 'get', get)
+    monkeypatch.setattr(apisession.time, 'sleep', sleeps.append)
+    return session, sleeps
+
+
+def test_retries_status_codes_with_backoff(monkeypatch):
+    session, sleeps = make_session(monkeypatch, [fake_response(503), fake_response(500), fake_response(200)], backoff_factor=1, backoff_max=60)
+    assert session.get('url').status_code == 200
+    assert session.get_stats()['retries'] == 2
+
+    # Exponential backoff, half fixed and half random.
+    assert 0.5 <= sleeps[0] <= 1
+    assert 1 <= sleeps[1] <= 2
+
+
+def test_backoff_max(monkeypatch):
+    session, sleeps = make_session(monkeypatch, [fake_response(503)] * 6, backoff_factor=1, backoff_max=4, max_retries=5)
+    assert session.get('url').status_code == 503
+    assert len(sleeps) == 5
+    assert all(s <= 4 for s in sleeps)
+
+
+def test_retry_after(monkeypatch):
+    session, sleeps = make_session(monkeypatch, [fake_response(429, {'Retry-After': '7'}), fake_response(200)])
+    assert session.get('url').status_code == 200
+    assert sleeps == [7.0]
+
+    # Longer Retry-After than max_retry_after is returned without waiting.
+    session, sleeps = make_session(monkeypatch, [fake_response(429, {'Retry-After': '600'})], max_retry_after=300)
+    assert session.get('url').status_code == 429
+    assert sleeps == []
+
+
+def test_connection_errors_retried_then_raised(monkeypatch):
+    session, sleeps = make_session(monkeypatch, [requests.exceptions.ConnectionError(), fake_response(200)])
+    assert session.get('url').status_code == 200
+    assert len(sleeps) == 1
+
+    session, sleeps = make_session(monkeypatch, [requests.exceptions.Timeout()] * 3, max_retries=2)
+    with pytest.raises(requests.exceptions.Timeout):
+        session.get('url')
+    assert session.get_stats()['errors'] == 3
+
+
+def test_not_retryable_status_returned(monkeypatch):
+    session, sleeps = make_session(monkeypatch, [fake_response(400)])
+    assert session.get('url').status_code == 400
+    assert sleeps == []
@@ -0,0 +1,19 @@
+'''Tests of bundled areas dataset and area index.'''
+
+from lib.pkg.entsoetransparency.areaindex import AreaIndex
+from lib.pkg.entsoetransparency.src.create_areas_dataset import read_api_areas
+
+
+def test_areas_codes_unique_api_codes():
+    gdf = AreaIndex().gdf
+    assert gdf['Code'].is_unique
+    assert set(gdf['Code']) <= set(read_api_areas())
+
+
+def test_locate_points_in_bidding_zones():
+    df = AreaIndex().locate_points([22.15, 17.30], [65.58, 62.39])
+
+    # Lulea in SE1, Sundsvall in SE2.
+    assert '10Y1001A1001A44P' in df.loc[df['point_idx'] == 0, 'Code'].tolist()
+    assert '10Y1001A1001A45N' not in df.loc[df['point_idx'] == 0, 'Code'].tolist()
+    assert '10Y1001A1001A45N' in df.loc[df['point_idx'] == 1, 'Code'].tolist()
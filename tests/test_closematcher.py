@@ -0,0 +1,51 @@
+'''Tests of close-matcher against difflib, on bundled dataset and area names.'''
+
+import difflib
+import random
+import pytest
+from lib.mod.closematcher import CloseMatcher
+from lib.pkg.entsoetransparency.src.create_areas_dataset import read_api_areas
+from lib.pkg.fingridopendata import FingridOpenDataClient
+
+
+def bundled_names():
+    '''Returns lists of bundled Fingrid dataset names and entso-e area meanings.'''
+    return [
+        FingridOpenDataClient(api_key='key').static_datasets_names_list,
+        list(read_api_areas().values()),
+        ]
+
+
+def queries(names, n=50, seed=0):
+    '''Returns queries of names with typos, cut and joined, and unrelated words.'''
+    rng = random.Random(seed)
+    result = ['wind power', 'Finland', 'SE1', 'elspot', 'frequency', 'xyz', '', 'day-ahead price']
+    for _ in range(n):
+        name = rng.choice(names)
+        chars = list(name)
+        for _ in range(rng.randint(0, 3)):
+            i = rng.randrange(max(1, len(chars)))
+            chars[i:i + 1] = rng.choice(['', rng.choice('abcdefghijklmnopqrstuvwxyz '), chars[i:i + 1] * 2])
+        query = ''.join(chars)
+        result.append(query[:rng.randint(3, max(3, len(query)))] if rng.random() < 0.3 else query)
+    return result
+
+
+@pytest.mark.parametrize('names', bundled_names(), ids=['fingrid_datasets', 'entsoe_areas'])
+def test_matches_equal_difflib(names):
+    matcher = CloseMatcher(names)
+    normalized = [name.lower() for name in names]
+    for query in queries(names):
+        for n, cutoff in ((1, 0.5), (3, 0.6), (5, 0.3)):
+            assert matcher.get_close_matches(query, n=n, cutoff=cutoff) == difflib.get_close_matches(query.lower(), normalized, n=n, cutoff=cutoff)
+
+
+def test_original_and_cache():
+    matcher = CloseMatcher(['Wind Power', 'Solar Power'])
+    match = matcher.get_close_matches('wind powr')[0]
+    assert matcher.original(match) == 'Wind Power'
+    assert matcher.index(match) == 0
+    matcher.get_close_matches('wind powr')
+    assert matcher.cache_info().hits == 1
+    with pytest.raises(ValueError):
+        matcher.get_close_matches('wind', n=0)
@@ -0,0 +1,230 @@
+'''Tests of Entsoe transparency client, with fake api responses and statics snapshot of bundled api statics.'''
+
+import csv
+import datetime
+import io
+import os
+import zipfile
+import pytest
+import requests
+from lib.mod.ratelimiter import TokenBucket
+from lib.pkg.entsoetransparency import staticscache
+from lib.pkg.entsoetransparency.areaindex import AreaIndex
+from lib.pkg.entsoetransparency.bordergraph import BorderGraph, get_border_graph
+from lib.pkg.entsoetransparency.entsoetransparency import EntsoeTransparencyClient
+from lib.pkg.entsoetransparency.requestplanner import RequestPlanner
+from lib.pkg.entsoetransparency import zippipeline
+from lib.pkg.entsoetransparency.zippipeline import get_process_pool, parse_zip_content
+
+
+# Bundled api statics, and parameter name of each file.
+API_STATICS_DIRPATH = os.path.join(os.path.dirname(__file__), '..', 'lib', 'pkg', 'entsoetransparency', 'data', 'raw', 'api-statics')
+API_STATICS_NAMES = {
+    'areas': 'Areas',
+    'documenttype': 'DocumentType',
+    'processtype': 'ProcessType',
+    'businesstype': 'BusinessType',
+    'psrtype': 'PsrType',
+    'docstatus': 'DocStatus',
+}
+
+# Datasets of statics snapshot.
+DATASETS = {
+    'names': ['12.1.G Physical Flows'],
+    'get': [''],
+    'get_mandatorys': [['documentType', 'in_Domain', 'out_Domain', 'periodStart', 'periodEnd']],
+    'get_constants': [['documentType=A11']],
+}
+
+FI = '10YFI-1--------U'
+SE1 = '10Y1001A1001A44P'
+SE2 = '10Y1001A1001A45N'
+FLOWS = '12.1.G Physical Flows'
+
+
+def flow_xml(in_code, out_code, start, hours=24):
+    '''Returns publication document of one hourly flow TimeSeries.'''
+    start = datetime.datetime.strptime(start, '%Y%m%d%H%M')
+    end = start + datetime.timedelta(hours=hours)
+    points = ''.join(f'<Point><position>{i + 1}</position><quantity>{i}</quantity></Point>' for i in range(hours))
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:0"><mRID>1</mRID><revisionNumber>1</revisionNumber><type>A11</type>
+<period.timeInterval><start>{start:%Y-%m-%dT%H:%MZ}</start><end>{end:%Y-%m-%dT%H:%MZ}</end></period.timeInterval>
+<TimeSeries><mRID>1</mRID><businessType>A66</businessType><in_Domain.mRID codingScheme="A01">{in_code}</in_Domain.mRID><out_Domain.mRID codingScheme="A01">{out_code}</out_Domain.mRID>
+<quantity_Measure_Unit.name>MAW</quantity_Measure_Unit.name><curveType>A01</curveType>
+<Period><timeInterval><start>{start:%Y-%m-%dT%H:%MZ}</start><end>{end:%Y-%m-%dT%H:%MZ}</end></timeInterval><resolution>PT60M</resolution>{points}</Period></TimeSeries>
+</Publication_MarketDocument>'''
+
+
+def acknowledgement_xml(text):
+    '''Returns acknowledgement document of bad request with reason text.'''
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<Acknowledgement_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-1:acknowledgementdocument:7:0"><mRID>1</mRID>
+<Reason><code>999</code><text>{text}</text></Reason></Acknowledgement_MarketDocument>'''
+
+
+def fake_response(content, status=200):
+    '''Returns requests.Response of content.'''
+    response = requests.Response()
+    response._content = content if isinstance(content, bytes) else content.encode()
+    response.status_code = status
+    response.encoding = 'utf-8'
+    return response
+
+
+def make_client(tmp_path, handler=None):
+    '''Returns client of statics snapshot in tmp_path, calling handler(parameters_dict) instead of api, flows by default.'''
+
+    # Statics snapshot of bundled api statics.
+    parameters = {}
+    for filename, name in API_STATICS_NAMES.items():
+        with open(os.path.join(API_STATICS_DIRPATH, f'{filename}.csv'), encoding='utf-8') as f:
+            parameters[name] = dict(row[:2] for row in csv.reader(f) if len(row) >= 2)
+    statics_filepath = str(tmp_path / 'statics.json')
+    staticscache.write_statics_snapshot(statics_filepath, staticscache.make_statics_snapshot('<html/>', lambda html: (DATASETS, parameters)))
+
+    client = EntsoeTransparencyClient(
+        api_key='key', statics_filepath=statics_filepath, statics_ttl=1e12, data_store=str(tmp_path / 'store'),
+        request_planner=RequestPlanner(filepath=str(tmp_path / 'spans.json')), ratelimiter=TokenBucket(rate=1e6, capacity=1e6))
+
+    # Fake api calls.
+    if handler is None:
+        handler = lambda p: fake_response(flow_xml(p['in_Domain'], p['out_Domain'], p['periodStart']))
+    calls = []
+
+    def call_api(url=None, parameters_dict=None, msg=False):
+        calls.append(dict(parameters_dict))
+        return handler(parameters_dict), 'url'
+
+    client._call_api = call_api
+    client.calls = calls
+    return client
+
+
+def test_sync_does_not_cover_server_errors(tmp_path):
+    mandatorys = {'documentType': 'A11', 'in_Domain': None, 'out_Domain': None, 'periodStart': None, 'periodEnd': None}
+    start_end = ('202101010000', '202101020000')
+    responses = [
+        fake_response('<html><head><meta content="text/html"></head><body>Service Unavailable</body></html>', status=503),
+        fake_response(b'', status=500),
+    ]
+    client = make_client(tmp_path, handler=lambda p: responses.pop(0))
+
+    # Server errors are bad responses, and timeperiod is not covered.
+    for _ in range(2):
+        bad_df = client._sync_single(FLOWS, mandatorys, (FI, SE1), start_end, msg=[])
+        assert len(bad_df) == 1
+        assert 'HTTP status 50' in bad_df['reason'][0]
+        assert client.data_store.find_request_gaps(FLOWS, FI, SE1, *start_end) == [start_end]
+
+    # No data response covers timeperiod.
+    client._call_api = lambda url=None, parameters_dict=None, msg=False: (fake_response(acknowledgement_xml('No matching data found for Data item')), 'url')
+    bad_df = client._sync_single(FLOWS, mandatorys, (FI, SE1), start_end, msg=[])
+    assert len(bad_df) == 0
+    assert client.data_store.find_request_gaps(FLOWS, FI, SE1, *start_end) == []
+
+
+def zip_response(parameters_dict, n_files=2):
+    '''Returns zipped response of n_files flow documents.'''
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for i in range(n_files):
+            zipf.writestr(f'flows_{i}.xml', flow_xml(parameters_dict['in_Domain'], parameters_dict['out_Domain'], parameters_dict['periodStart']))
+    return fake_response(buffer.getvalue())
+
+
+def test_get_data_concatenates_zipped_responses(tmp_path):
+    client = make_client(tmp_path, handler=zip_response)
+    start_end = ('202101010000', '202101020000')
+
+    # Responses of both area pairs are combined.
+    df = client.get_data(FLOWS, [(FI, SE1), (SE1, FI)], start_end, msg=[], long_format=True)
+    assert len(client.calls) == 2
+    assert len(df) == 2 * 2 * 24
+
+    df = client.get_data(FLOWS, [(FI, SE1), (SE1, FI)], start_end, msg=[])
+    assert len(client.calls) == 4
+    assert len(df) > 0
+
+
+def test_parse_zip_content_in_process_pool():
+    content = zip_response({'in_Domain': FI, 'out_Domain': SE1, 'periodStart': '202101010000'}, n_files=4).content
+
+    # Parsed in shared process pool, same as in this process.
+    df_pool, parse_times, failed = parse_zip_content(content, long_format=True, max_processes=2, min_files_process_pool=2)
+    df, parse_times, failed = parse_zip_content(content, long_format=True, min_files_process_pool=len(parse_times) + 1)
+    assert len(parse_times) == 4
+    assert len(failed) == 0
+    assert df_pool.equals(df)
+    assert get_process_pool() is get_process_pool()
+
+
+def test_parse_zip_content_workers_read_zip_path(tmp_path, monkeypatch):
+    content = zip_response({'in_Domain': FI, 'out_Domain': SE1, 'periodStart': '202101010000'}, n_files=4).content
+    monkeypatch.setattr(zippipeline.tempfile, 'tempdir', str(tmp_path))
+
+    # Workers are given temporary zipfile path, not zip bytes, removed after parsing.
+    submitted = []
+    pool = get_process_pool()
+    submit = pool.submit
+    monkeypatch.setattr(pool, 'submit', lambda fn, *args: submitted.append(args[0]) or submit(fn, *args))
+    df, parse_times, failed = parse_zip_content(content, long_format=True, max_processes=2, min_files_process_pool=2)
+    assert len(submitted) == 2 and all(isinstance(path, str) for path in submitted)
+    assert list(tmp_path.iterdir()) == []
+
+    # Zipfile opened from file is given by its path.
+    filepath = tmp_path / 'response.zip'
+    filepath.write_bytes(content)
+    df_path, parse_times, failed = parse_zip_content(str(filepath), long_format=True, max_processes=2, min_files_process_pool=2)
+    assert submitted[-1] == str(filepath)
+    assert df_path.equals(df)
+
+
+def test_from_area_expanded_to_areas_without_geometry(tmp_path):
+    client = make_client(tmp_path)
+    client.border_graph = BorderGraph(area_index=client.area_index, filepath=str(tmp_path / 'border_graph.json'))
+    mandatorys = {'documentType': 'A11', 'in_Domain': None, 'out_Domain': None, 'periodStart': None, 'periodEnd': None}
+    all_codes = list(client.parameters['Areas'].keys())
+
+    # SE1 is a neighbour by border in areas geometries, SE2 is not a neighbour.
+    edges = client.border_graph.edges
+    fi_se1 = edges[(edges['from_code'] == min(FI, SE1)) & (edges['to_code'] == max(FI, SE1))]
+    assert len(fi_se1) == 1 and 'border' in fi_se1['sources'].iloc[0]
+    assert SE2 not in client.border_graph.neighbours(FI)
+    pairs = client._ensure_from_to_all(mandatorys, [FI])
+    assert (FI, SE1) in pairs and (SE1, FI) in pairs
+    assert (FI, SE2) not in pairs
+
+    # Sweden has no geometry, it is kept as neighbour of unknown topology.
+    assert (FI, '10YSE-1--------K') in pairs
+    assert client.from_to_stats['pairs_avoided'] > 0
+
+    # Non-neighbouring areas with geometry are avoided.
+    assert (FI, '10YGB----------A') not in pairs
+
+    # Area without neighbours is expanded to all areas.
+    pairs = client._ensure_from_to_all(mandatorys, ['10Y1001A1001A92E'])
+    assert len(pairs) == 2 * len([code for code in all_codes if code != '10Y1001A1001A92E'])
+
+
+def test_border_graph_fails_on_duplicated_codes(tmp_path):
+    area_index = AreaIndex()
+    area_index._gdf = area_index.gdf.assign(Code=area_index.gdf['Code'].replace({SE2: SE1}))
+
+    # Areas of same code are not merged into one area.
+    with pytest.raises(ValueError, match='Duplicated area codes'):
+        BorderGraph(area_index=area_index, filepath=str(tmp_path / 'border_graph.json'), cable_datasets=()).refresh()
+
+
+def test_border_graph_lines_not_snapped_to_nearest_area(tmp_path):
+    graph = BorderGraph(filepath=str(tmp_path / 'border_graph.json'))
+    edges = graph.edges
+
+    # Letsi end of line is outside all areas, the line is not an edge.
+    lines = edges[edges['sources'].str.contains('line')]
+    assert not lines['names'].str.contains('LETSI').any()
+    assert lines['names'].str.contains('VARANGERBOTN').any()
+    assert graph.endpoints['snapped'].dtype == bool
+
+    # Clients share one graph.
+    assert make_client(tmp_path).border_graph is get_border_graph()
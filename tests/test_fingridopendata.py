@@ -0,0 +1,143 @@
+'''Tests of Fingrid Open Data client and poller, with fake api responses.'''
+
+import datetime
+import json
+import pytest
+import requests
+from urllib.parse import urlparse, parse_qs, unquote
+from lib.mod.ratelimiter import TokenBucket
+from lib.mod.timeseriesstore import TimeSeriesStore
+from lib.pkg.fingridopendata import FingridOpenDataClient
+from lib.pkg.fingridopendata.fingridpoller import FingridPoller
+
+
+def fake_response(obj, status=200, headers=None):
+    '''Returns requests.Response of json obj.'''
+    response = requests.Response()
+    response._content = json.dumps(obj).encode()
+    response.status_code = status
+    response.encoding = 'utf-8'
+    response.headers['Content-Type'] = 'application/json'
+    response.headers.update(headers or {})
+    return response
+
+
+def events_response(url, step_minutes=60):
+    '''Returns response of hourly events in timeperiod of url.'''
+    query = parse_qs(urlparse(url).query)
+    start = datetime.datetime.strptime(query['start_time'][0], '%Y-%m-%dT%H:%M:%SZ')
+    end = datetime.datetime.strptime(query['end_time'][0], '%Y-%m-%dT%H:%M:%SZ')
+    n = int((end - start).total_seconds() // (step_minutes * 60))
+    return fake_response([{
+        'value': float(i),
+        'start_time': (start + datetime.timedelta(minutes=step_minutes * i)).strftime('%Y-%m-%dT%H:%M:%S+0000'),
+        'end_time': (start + datetime.timedelta(minutes=step_minutes * (i + 1))).strftime('%Y-%m-%dT%H:%M:%S+0000'),
+    } for i in range(n)])
+
+
+def make_client(handler):
+    '''Returns client calling handler(url, headers) instead of api.'''
+    client = FingridOpenDataClient(api_key='key', ratelimiter=TokenBucket(rate=1e6, capacity=1e6))
+    calls = []
+
+    def call_api(url, headers=None):
+        calls.append(url)
+        return handler(url, headers)
+
+    client._call_api = call_api
+    client.calls = calls
+    return client
+
+
+def test_sync_retries_failed_window(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    variableid = 245
+    start = datetime.datetime(2021, 1, 1)
+    end = datetime.datetime(2021, 1, 3)
+    failing = {'on': True}
+
+    # First window fails with server error.
+    def handler(url, headers):
+        if failing['on'] and parse_qs(urlparse(url).query)['start_time'][0] == '2021-01-01T00:00:00Z':
+            return fake_response({'message': 'Internal server error'}, status=500)
+        return events_response(url)
+
+    client = make_client(handler)
+    df_dict = client.sync(variableid, start, end, store=store, subperiod=datetime.timedelta(days=1))
+    assert 'FailedWindows' in df_dict
+    assert len(df_dict['FailedWindows']) == 1
+    assert df_dict['FailedWindows']['start_time'][0] == start
+
+    # Failed window is not covered.
+    gaps = store.find_gaps(variableid, start, end)
+    assert len(gaps) == 1
+    assert gaps[0][0].tz_convert(None) == start
+    assert gaps[0][1].tz_convert(None) == datetime.datetime(2021, 1, 2)
+
+    # Next sync requests only failed window.
+    failing['on'] = False
+    n_calls = len(client.calls)
+    df_dict = client.sync(variableid, start, end, store=store, subperiod=datetime.timedelta(days=1))
+    assert 'FailedWindows' not in df_dict
+    assert len(client.calls) == n_calls + 1
+    assert parse_qs(urlparse(client.calls[-1]).query)['start_time'][0] == '2021-01-01T00:00:00Z'
+    assert store.find_gaps(variableid, start, end) == []
+    assert len(df_dict[client.static_datasets_names_by_variableid[variableid]]) == 48
+
+
+def test_poller_emits_only_new_events(tmp_path):
+    state = {'etag': '"1"', 'value': 1.0}
+
+    # Last events, not modified if ETag matches.
+    def handler(url, headers):
+        if headers is not None and headers.get('If-None-Match') == state['etag']:
+            return fake_response(None, status=304)
+        ids = unquote(urlparse(url).path.split('/')[-1]).split(',')
+        return fake_response([{
+            'variable_id': int(i), 'value': state['value'],
+            'start_time': '2021-01-01T00:00:00+0000', 'end_time': '2021-01-01T01:00:00+0000',
+        } for i in ids], headers={'ETag': state['etag']})
+
+    client = make_client(handler)
+    emitted = []
+    poller = FingridPoller(client, [245, 75], emitted.append)
+    assert len(poller.poll_once(force=True)) == 2
+
+    # Not modified, nothing emitted.
+    assert len(poller.poll_once(force=True)) == 0
+    assert poller.get_stats()['not_modified'] == 1
+
+    # Changed ETag of same events, nothing emitted.
+    state['etag'] = '"2"'
+    assert len(poller.poll_once(force=True)) == 0
+
+    # Changed value is emitted.
+    state['etag'], state['value'] = '"3"', 2.0
+    assert poller.poll_once(force=True)['value'].tolist() == [2.0, 2.0]
+    assert [len(df) for df in emitted] == [2, 2]
+
+
+def test_poller_emits_events_again_if_sink_fails():
+    client = make_client(lambda url, headers: fake_response([
+        {'variable_id': 245, 'value': 1.0, 'start_time': '2021-01-01T00:00:00+0000', 'end_time': '2021-01-01T01:00:00+0000'},
+        ], headers={'ETag': '"1"'}))
+    failing = {'on': True}
+    emitted = []
+
+    def sink(df):
+        if failing['on']:
+            raise OSError('Sink is not writable')
+        emitted.append(df)
+
+    poller = FingridPoller(client, [245], sink)
+    with pytest.raises(OSError):
+        poller.poll_once(force=True)
+
+    # Events not written are emitted again.
+    failing['on'] = False
+    assert len(poller.poll_once(force=True)) == 1
+    assert len(emitted) == 1
+
+    # Only json is parsed.
+    with pytest.raises(ValueError):
+        FingridPoller(client, [245], sink, formatstr='csv')
@@ -0,0 +1,23 @@
+'''Tests of typed parquet export.'''
+
+import pandas as pd
+import pyarrow as pa
+from lib.mod.parquetexport import dictionary_type, read_partitioned, to_typed_table, write_partitioned
+
+
+def test_dictionary_index_widened_for_many_strings(tmp_path):
+    schema = pa.schema([pa.field('timestamp', pa.timestamp('ns', tz='UTC')), pa.field('name', dictionary_type(8))])
+    df = pd.DataFrame({
+        'dataset': 'outages',
+        'area': 'FI',
+        'timestamp': pd.date_range('2021-01-01', periods=300, freq='H', tz='UTC'),
+        'name': [f'unit {i}' for i in range(300)],
+        })
+
+    # Few strings keep int8 codes, many are widened.
+    assert to_typed_table(df.iloc[:128], schema).schema.field('name').type.index_type == pa.int8()
+    assert to_typed_table(df.iloc[:129], schema).schema.field('name').type.index_type == pa.int16()
+
+    # Written and read back.
+    write_partitioned(df, str(tmp_path), schema)
+    assert read_partitioned(str(tmp_path))['name'].astype(str).tolist() == df['name'].tolist()
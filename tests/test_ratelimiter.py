@@ -0,0 +1,71 @@
+'''Tests of token bucket rate limiter, with fake clock.'''
+
+import pytest
+from lib.mod import ratelimiter
+from lib.mod.ratelimiter import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    '''Fake clock, advanced by sleeps, with list of slept seconds.'''
+    clock = {'now': 1000.0, 'sleeps': []}
+
+    def sleep(seconds):
+        clock['sleeps'].append(seconds)
+        clock['now'] += seconds
+
+    monkeypatch.setattr(ratelimiter.time, 'time', lambda: clock['now'])
+    monkeypatch.setattr(ratelimiter.time, 'sleep', sleep)
+    return clock
+
+
+def test_refill_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert all(bucket.acquire(block=False) for _ in range(4))
+    assert not bucket.acquire(block=False)
+
+    # Refilled at rate, not above capacity.
+    clock['now'] += 1
+    assert bucket.get_budget() == pytest.approx(2)
+    clock['now'] += 10
+    assert bucket.get_budget() == pytest.approx(4)
+
+
+def test_acquire_waits_for_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=1)
+    assert bucket.acquire()
+    assert bucket.get_wait_time() == pytest.approx(0.5)
+
+    # Blocks until token is refilled.
+    assert bucket.acquire()
+    assert sum(clock['sleeps']) == pytest.approx(0.5)
+    stats = bucket.get_stats()
+    assert stats['acquired'] == 2
+    assert stats['waits'] == 1
+    assert stats['waited_seconds'] == pytest.approx(0.5)
+
+    # Not taken within timeout.
+    assert not bucket.acquire(timeout=0.1)
+
+
+def test_state_shared_by_file(clock, tmp_path):
+    statepath = str(tmp_path / 'bucket.json')
+    a = TokenBucket(rate=1, capacity=2, statepath=statepath)
+    b = TokenBucket(rate=1, capacity=2, statepath=statepath)
+
+    # Tokens taken by one bucket are not available to the other.
+    assert a.acquire(block=False) and a.acquire(block=False)
+    assert not b.acquire(block=False)
+
+    # Refill is shared.
+    clock['now'] += 1
+    assert b.acquire(block=False)
+    assert not a.acquire(block=False)
+    assert b.get_budget() == pytest.approx(0)
+
+
+def test_shared_buckets_of_same_name(tmp_path):
+    a = TokenBucket.shared('test', rate=1, capacity=1, dirpath=str(tmp_path))
+    b = TokenBucket.shared('test', rate=1, capacity=1, dirpath=str(tmp_path))
+    assert a.statepath == b.statepath
+    assert TokenBucket.shared('other', rate=1, capacity=1, dirpath=str(tmp_path)).statepath != a.statepath
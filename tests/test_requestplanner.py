@@ -0,0 +1,72 @@
+'''Tests of request planner learning and splitting timeperiods.'''
+
+import json
+import pytest
+from lib.pkg.entsoetransparency.requestplanner import RequestPlanner, parse_allowed_span, split_timeperiod
+
+
+@pytest.mark.parametrize('reason_str, span', [
+    ('The amount of requested data exceeds allowed limit. Max allowed: 1 day', (1, 'day')),
+    ('Maximum allowed: 1 YEARS', (1, 'year')),
+    ('Time interval too large, allowed: P1Y', (1, 'year')),
+    ('allowed: P7D', (7, 'day')),
+    ('No matching data found', None),
+    (None, None),
+    ])
+def test_parse_allowed_span(reason_str, span):
+    assert parse_allowed_span(reason_str) == span
+
+
+def test_split_timeperiod():
+    assert split_timeperiod('202001010000', '202001030000', None) == [('202001010000', '202001030000')]
+    assert split_timeperiod('202001010000', '202001021200', (1, 'day')) == [
+        ('202001010000', '202001020000'),
+        ('202001020000', '202001021200'),
+        ]
+
+    # Months split at month ends from start, not drifting.
+    assert split_timeperiod('202001310000', '202004300000', (1, 'month')) == [
+        ('202001310000', '202002290000'),
+        ('202002290000', '202003310000'),
+        ('202003310000', '202004300000'),
+        ]
+
+
+def test_learns_and_shrinks_spans(tmp_path):
+    planner = RequestPlanner(filepath=str(tmp_path / 'spans.json'))
+    assert planner.get_span('load') is None
+    assert planner.split('load', '202001010000', '202101010000') == [('202001010000', '202101010000')]
+
+    # Learned span splits requests.
+    assert planner.learn('load', 'allowed: P1Y') == (1, 'year')
+    assert planner.split('load', '202001010000', '202201010000') == [
+        ('202001010000', '202101010000'),
+        ('202101010000', '202201010000'),
+        ]
+
+    # Shorter span shrinks, longer span does not grow, no span is ignored.
+    assert planner.learn('load', 'allowed: 1 month') == (1, 'month')
+    assert planner.learn('load', 'allowed: 2 years') == (1, 'month')
+    assert planner.learn('load', 'No matching data found') is None
+    assert len(planner.split('load', '202001010000', '202101010000')) == 12
+
+    # Span of call overrides learned span.
+    assert len(planner.split('load', '202001010000', '202101010000', span=(1, 'week'))) == 53
+
+
+def test_spans_persisted_and_merged(tmp_path):
+    filepath = str(tmp_path / 'spans.json')
+    planner = RequestPlanner(filepath=filepath)
+    other = RequestPlanner(filepath=filepath)
+    planner.learn('load', 'allowed: 1 year')
+
+    # Other planner merges spans learned by first planner when learning.
+    assert other.learn('prices', 'allowed: 1 day') == (1, 'day')
+    with open(filepath, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'load': [1, 'year'], 'prices': [1, 'day']}
+
+    # New planner reads persisted spans, unreadable file is empty.
+    assert RequestPlanner(filepath=filepath).get_spans() == {'load': (1, 'year'), 'prices': (1, 'day')}
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('not json')
+    assert RequestPlanner(filepath=filepath, spans={'load': [1, 'day']}).get_spans() == {'load': (1, 'day')}
@@ -0,0 +1,110 @@
+'''Tests of on-disk response cache, with fake clock.'''
+
+import pytest
+from lib.pkg.entsoetransparency import responsecache
+from lib.pkg.entsoetransparency.responsecache import ResponseCache, canonical_parameters_key
+
+
+# Parameters of recent and settled timeperiods.
+RECENT = {'documentType': 'A11', 'periodStart': '209901010000', 'periodEnd': '209901020000', 'securityToken': 'a'}
+SETTLED = {'documentType': 'A11', 'periodStart': '202001010000', 'periodEnd': '202001020000', 'securityToken': 'a'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    '''Fake clock of the cache.'''
+    clock = {'now': 1000.0}
+    monkeypatch.setattr(responsecache.time, 'time', lambda: clock['now'])
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = ResponseCache(dirpath=str(tmp_path / 'responses'), recent_ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_key_ignores_token_and_order():
+    reordered = dict(reversed(list(RECENT.items())))
+    assert canonical_parameters_key(RECENT) == canonical_parameters_key(reordered)
+    assert canonical_parameters_key(RECENT) == canonical_parameters_key({**RECENT, 'securityToken': 'b'})
+    assert canonical_parameters_key(RECENT) != canonical_parameters_key(SETTLED)
+
+
+def test_miss_then_hit(cache):
+    assert cache.get(RECENT) is None
+    cache.put(RECENT, '<xml/>')
+
+    # Hit of same parameters with other token, miss of other parameters.
+    assert cache.get({**RECENT, 'securityToken': 'b'}) == b'<xml/>'
+    assert cache.get(SETTLED) is None
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['stored'], stats['entries']) == (1, 2, 1, 1)
+    assert stats['hit_rate'] == pytest.approx(1 / 3)
+
+
+def test_recent_expires_settled_not(cache, clock):
+    cache.put(RECENT, b'recent')
+    cache.put(SETTLED, b'settled')
+    assert cache.get_ttl(RECENT) == 60
+    assert cache.get_ttl(SETTLED) is None
+
+    # Recent expires after ttl and is removed, settled never expires.
+    clock['now'] += 59
+    assert cache.get(RECENT) == b'recent'
+    clock['now'] += 1
+    assert cache.get(RECENT) is None
+    clock['now'] += 10 ** 9
+    assert cache.get(SETTLED) == b'settled'
+
+    stats = cache.get_stats()
+    assert (stats['expired'], stats['entries']) == (1, 1)
+
+
+def test_dataset_ttl_overrides(tmp_path, clock):
+    cache = ResponseCache(dirpath=str(tmp_path), recent_ttl=60, dataset_ttls={'load': 5, 'areas': None})
+    cache.put(SETTLED, b'load', dataset='load')
+    cache.put(RECENT, b'areas', dataset='areas')
+
+    clock['now'] += 5
+    assert cache.get(SETTLED) is None
+    clock['now'] += 10 ** 9
+    assert cache.get(RECENT) == b'areas'
+    cache.close()
+
+
+def test_persisted_and_corrupt_payload_is_miss(tmp_path, clock):
+    cache = ResponseCache(dirpath=str(tmp_path))
+    key = cache.put(SETTLED, b'settled')
+    cache.close()
+
+    # Hit from other cache of same directory.
+    cache = ResponseCache(dirpath=str(tmp_path))
+    assert cache.get(SETTLED) == b'settled'
+
+    # Corrupt payload is a miss and removed.
+    with open(cache._payload_path(key), 'wb') as f:
+        f.write(b'not zlib')
+    assert cache.get(SETTLED) is None
+    assert cache.get_stats()['entries'] == 0
+    cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = ResponseCache(dirpath=str(tmp_path), max_bytes=None)
+    cache.put(RECENT, b'recent')
+    clock['now'] += 1
+    cache.put(SETTLED, b'settled')
+    size = cache.get_stats()['bytes']
+
+    # Recent accessed last, settled is evicted.
+    clock['now'] += 1
+    assert cache.get(RECENT) == b'recent'
+    cache.max_bytes = size - 1
+    cache.put({**RECENT, 'periodEnd': '209901030000'}, b'other')
+    assert cache.get(SETTLED) is None
+    assert cache.get(RECENT) == b'recent'
+    assert cache.get_stats()['evicted'] == 1
+    cache.close()
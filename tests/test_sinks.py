@@ -0,0 +1,39 @@
+'''Tests of csv and parquet sinks.'''
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from lib.mod.sinks import CsvSink, ParquetSink
+
+
+def test_parquet_sink_promotes_drifting_types(tmp_path, capsys):
+    filepath = str(tmp_path / 'events.parquet')
+    with ParquetSink(filepath, index=False) as sink:
+        sink.write(pd.DataFrame({'value': [1, 2], 'reason': [None, None], 'area': ['FI', 'SE1']}))
+        sink.write(pd.DataFrame({'value': [1.5], 'reason': ['No matching data found'], 'area': ['SE2'], 'extra': [1]}))
+        sink.write(pd.DataFrame({'value': [3], 'area': [None]}))
+
+    # Floats are not truncated, values of all null first column are kept.
+    table = pq.read_table(filepath)
+    assert table.schema.field('value').type == pa.float64()
+    assert table.schema.field('reason').type == pa.string()
+    df = table.to_pandas()
+    assert df['value'].tolist() == [1.0, 2.0, 1.5, 3.0]
+    assert df['reason'].tolist() == [None, None, 'No matching data found', None]
+    assert df['area'].tolist() == ['FI', 'SE1', 'SE2', None]
+
+    # Columns not in first DataFrame are dropped, with a warning.
+    assert 'extra' not in df.columns
+    assert "['extra']" in capsys.readouterr().out
+    assert list(tmp_path.iterdir()) == [tmp_path / 'events.parquet']
+
+
+def test_csv_sink_warns_of_dropped_columns(tmp_path, capsys):
+    filepath = str(tmp_path / 'events.csv')
+    with CsvSink(filepath, index=False) as sink:
+        sink.write(pd.DataFrame({'value': [1]}))
+        sink.write(pd.DataFrame({'value': [2], 'extra': [3]}))
+        sink.write(pd.DataFrame({'value': [4], 'extra': [5]}))
+
+    assert pd.read_csv(filepath)['value'].tolist() == [1, 2, 4]
+    assert capsys.readouterr().out.count("['extra']") == 1
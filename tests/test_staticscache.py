@@ -0,0 +1,42 @@
+'''Tests of api statics snapshot cache.'''
+
+import requests
+from lib.pkg.entsoetransparency import staticscache
+
+
+def guide_response(html='<html>guide</html>'):
+    '''Returns response of guide webpage.'''
+    response = requests.Response()
+    response._content = html.encode()
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    return response
+
+
+def test_snapshots_of_other_parser_not_used(tmp_path):
+    filepath = str(tmp_path / 'api_statics.json')
+    calls = []
+
+    def get_func(url, headers=None):
+        calls.append(url)
+        return guide_response()
+
+    # Client snapshot.
+    snapshot = staticscache.get_statics_snapshot(lambda html: ({'names': ['client']}, {}), filepath=filepath, get_func=get_func)
+    assert snapshot['datasets'] == {'names': ['client']}
+    assert len(calls) == 1
+
+    # Fresh snapshot of other parser is a cache miss, re-scraped with its parser.
+    snapshot = staticscache.get_statics_snapshot(lambda html: ({'names': ['script']}, {}), filepath=filepath, get_func=get_func, parser='script')
+    assert snapshot['datasets'] == {'names': ['script']}
+    assert len(calls) == 2
+
+    # Fresh snapshot of same parser is used.
+    snapshot = staticscache.get_statics_snapshot(lambda html: ({'names': ['script2']}, {}), filepath=filepath, get_func=get_func, parser='script')
+    assert snapshot['datasets'] == {'names': ['script']}
+    assert len(calls) == 2
+
+
+def test_default_snapshot_file_per_parser():
+    assert staticscache.default_statics_filepath() != staticscache.default_statics_filepath('get_api_statics')
+    assert staticscache.default_statics_filepath().endswith('api_statics.json')